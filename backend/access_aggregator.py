@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+access_aggregator.py - Registro de Acessos Agregado
+
+Durante um ataque cada tentativa falhada virava uma linha em
+registros_acesso ('Usuário não encontrado', 'Senha inválida'): milhões de
+linhas quase idênticas inchando a tabela e seus quatro índices. No modo
+agregado, tentativas repetidas com a mesma chave (tipo de evento, IP,
+usuario_id, sucesso, mensagem) dentro de uma janela viram UMA linha com
+contagem, primeiro_em e ultimo_em (migração 0003).
+
+Regras (ACCESS_LOG_MODE=agregado):
+- A primeira ocorrência de cada chave na janela é SEMPRE gravada exata, na
+  hora, por db.log_access: primeiro erro de um IP, primeiro email
+  inexistente, primeiro login vindo de um IP novo
+- Repetições de falhas dentro de ACCESS_LOG_WINDOW_SECONDS só incrementam
+  um contador em memória
+- Logins bem-sucedidos repetidos são gravados exatos com probabilidade
+  ACCESS_LOG_SUCCESS_SAMPLE_RATE; os demais entram no contador
+- Janela encerrada com repetições → uma linha agregada (contagem = número
+  de repetições) gravada em lote por db.log_access_batch numa thread em
+  segundo plano; a próxima ocorrência abre nova janela (e é exata)
+- Mais de ACCESS_LOG_MAX_KEYS chaves abertas: novas chaves são gravadas
+  exatas sem abrir janela (memória limitada)
+- Lote com falha fica em memória e é reenviado no próximo ciclo (como em
+  last_access.py), com os horários originais; só o excedente de
+  ACCESS_LOG_MAX_KEYS linhas retidas é descartado e contado em perdidos
+
+Totais continuam exatos: SUM(contagem) conta todas as tentativas, no
+minuto de primeiro_em (rollup_acessos.py agrega assim). Tentativas em memória se perdem se o
+processo morrer sem shutdown limpo; parar() grava tudo no encerramento
+(atexit / worker_exit do Gunicorn).
+
+ACCESS_LOG_MODE=exato (padrão) mantém uma linha por tentativa.
+
+Configuração (.env):
+- ACCESS_LOG_MODE, ACCESS_LOG_WINDOW_SECONDS, ACCESS_LOG_SUCCESS_SAMPLE_RATE,
+  ACCESS_LOG_MAX_KEYS, ACCESS_LOG_FLUSH_SECONDS
+"""
+
+import os
+import time
+import atexit
+import random
+import logging
+import threading
+from flask import jsonify
+from config import Config
+from debug_api import debug
+import db
+
+logger = logging.getLogger('access_aggregator')
+
+MODOS = ('exato', 'agregado')
+
+class Janela:
+    """Repetições de uma chave desde a sua primeira ocorrência exata."""
+
+    __slots__ = ('aberta_em', 'repeticoes', 'primeira', 'ultima')
+
+    def __init__(self, aberta_em):
+        self.aberta_em = aberta_em
+        self.repeticoes = 0
+        self.primeira = None
+        self.ultima = None
+
+class AgregadorAcessos:
+    """
+    Janelas de agregação por chave com thread de gravação em lotes.
+
+    Uso:
+        agregador = AgregadorAcessos()
+        agregador.registrar(None, 'login', ip, False, 'Usuário não encontrado')
+        agregador.parar()                            # grava as janelas abertas
+    """
+
+    def __init__(self):
+        self._janelas = {}
+        self._nao_gravadas = []
+        self._thread = None
+        self._pid = None
+        self._parando = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_thread = threading.Lock()
+        self.exatos = 0
+        self.agregados = 0
+        self.perdidos = 0
+
+    @property
+    def modo(self):
+        modo = Config.ACCESS_LOG_MODE
+        return modo if modo in MODOS else 'exato'
+
+    def registrar(self, usuario_id, tipo_evento, ip_address, sucesso, mensagem):
+        """
+        Registra uma tentativa de acesso (mesma assinatura de db.log_access).
+
+        Returns:
+            bool: Se gravada (exata) ou contabilizada numa janela
+        """
+        if self.modo == 'exato':
+            return db.log_access(usuario_id, tipo_evento, ip_address, sucesso, mensagem)
+
+        self._garantir_thread()
+        chave = (usuario_id, tipo_evento, ip_address, bool(sucesso), mensagem)
+        with self._lock:
+            janela = self._janelas.get(chave)
+            if janela is None:
+                if len(self._janelas) < Config.ACCESS_LOG_MAX_KEYS:
+                    self._janelas[chave] = Janela(time.monotonic())
+                exato = True
+            else:
+                exato = sucesso and random.random() < Config.ACCESS_LOG_SUCCESS_SAMPLE_RATE
+                if not exato:
+                    agora = time.time()
+                    if janela.repeticoes == 0:
+                        janela.primeira = agora
+                    janela.ultima = agora
+                    janela.repeticoes += 1
+                    self.agregados += 1
+            if exato:
+                self.exatos += 1
+        if exato:
+            return db.log_access(usuario_id, tipo_evento, ip_address, sucesso, mensagem)
+        return True
+
+    def _garantir_thread(self):
+        """Inicia a thread de gravação neste processo (também após fork)."""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock_thread:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Janelas herdadas do master pertencem ao processo pai
+                self._janelas = {}
+                self._nao_gravadas = []
+            self._parando.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._executar, name='agregador-acessos', daemon=True)
+            self._thread.start()
+            atexit.register(self.parar)
+
+    def _executar(self):
+        """Loop da thread: fecha janelas vencidas e grava as repetições."""
+        while not self._parando.wait(Config.ACCESS_LOG_FLUSH_SECONDS):
+            self._descarregar()
+        self._descarregar(todas=True)
+        with self._lock:
+            perdidos = sum(linha[5] for linha in self._nao_gravadas)
+            self._nao_gravadas = []
+        if perdidos:
+            self.perdidos += perdidos
+            logger.error("%d tentativa(s) agregada(s) perdida(s) no encerramento", perdidos)
+
+    def _descarregar(self, todas=False):
+        """
+        Remove janelas vencidas (ou todas) e grava as que têm repetições,
+        junto com as linhas de lotes anteriores que falharam.
+        """
+        limite = time.monotonic() - Config.ACCESS_LOG_WINDOW_SECONDS
+        with self._lock:
+            vencidas = [chave for chave, janela in self._janelas.items() if todas or janela.aberta_em <= limite]
+            fechadas = [(chave, self._janelas.pop(chave)) for chave in vencidas]
+            linhas, self._nao_gravadas = self._nao_gravadas, []
+        linhas += [(*chave, janela.repeticoes, janela.primeira, janela.ultima)
+                   for chave, janela in fechadas if janela.repeticoes]
+        if not linhas:
+            return
+        agora = time.time()
+        lote = [(*linha[:6], max(0.0, agora - linha[6]), max(0.0, agora - linha[7])) for linha in linhas]
+        if db.log_access_batch(lote):
+            return
+        with self._lock:
+            # Volta para o próximo ciclo; retenção limitada a ACCESS_LOG_MAX_KEYS linhas
+            retidas = self._nao_gravadas + linhas
+            excedente = max(0, len(retidas) - Config.ACCESS_LOG_MAX_KEYS)
+            descartadas, self._nao_gravadas = retidas[:excedente], retidas[excedente:]
+            perdidos = sum(linha[5] for linha in descartadas)
+            self.perdidos += perdidos
+        logger.error("Falha ao gravar lote de %d linha(s) agregada(s); %d retida(s) para o próximo ciclo, "
+                     "%d tentativa(s) descartada(s)", len(lote), len(self._nao_gravadas), perdidos)
+
+    def parar(self, timeout=10.0):
+        """Grava as janelas abertas e encerra a thread (shutdown do worker)."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._parando.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Agregador de acessos não terminou em %.0fs", timeout)
+
+    def resumo(self):
+        """Estado para diagnóstico."""
+        with self._lock:
+            abertas = len(self._janelas)
+            pendentes = (sum(janela.repeticoes for janela in self._janelas.values())
+                         + sum(linha[5] for linha in self._nao_gravadas))
+        return {'modo': self.modo, 'janelas_abertas': abertas, 'repeticoes_pendentes': pendentes,
+                'exatos': self.exatos, 'agregados': self.agregados, 'perdidos': self.perdidos}
+
+# Instância única por processo
+agregador_acessos = AgregadorAcessos()
+
+@debug.route('/acessos', methods=['GET'])
+def acessos_resumo():
+    return jsonify({'pid': os.getpid(), **agregador_acessos.resumo()}), 200
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+admission.py - Controle de Admissão (Load Shedding) do Login
+
+Sob sobrecarga todo worker aceitava logins, cada um rodava o bcrypt e
+terminava depois que o cliente já tinha desistido: o throughput útil caía
+em vez de estabilizar. ControleAdmissao limita quantos logins rodam ao
+mesmo tempo no processo e rejeita rápido o que não vai caber no prazo.
+
+Algoritmo (AIMD sobre a latência de serviço, sem contar a espera na fila):
+- latência <= ADMISSION_TARGET_LATENCY_MS: aumento aditivo, +1 no limite
+  a cada "limite" requisições concluídas (≈ +1 por janela)
+- latência acima do alvo: redução multiplicativa (x ADMISSION_DECREASE_FACTOR),
+  no máximo uma vez por janela de latência-alvo
+- limite entre ADMISSION_MIN_CONCURRENCY e ADMISSION_MAX_CONCURRENCY
+
+Fila com prazo:
+- Sem vaga, a requisição espera até ADMISSION_QUEUE_TIMEOUT_MS
+- Fila com ADMISSION_MAX_QUEUE requisições esperando → rejeição imediata
+- Rejeitada: 503 com Retry-After, sem tocar no banco nem no bcrypt
+
+Threads reservadas: no gthread quem espera na fila também ocupa uma
+thread do worker. Logins em execução + na fila nunca passam de
+GUNICORN_THREADS - ADMISSION_RESERVED_THREADS (padrão: sobra 1 thread),
+e o teto padrão do limite é esse mesmo número. Assim /api/auth/verify e
+/health, que não passam por aqui, sempre têm thread para rodar.
+Com workers sync (1 requisição por vez) o limite não tem efeito; use
+threads no Gunicorn (GUNICORN_THREADS, ver gunicorn.conf.py).
+
+Uso:
+    controle_login = ControleAdmissao('login')
+
+    @api.route('/api/auth/login', methods=['POST'])
+    @controle_login.limitar(ao_rejeitar=lambda e: resposta_503(e.retry_after))
+    def login(): ...
+"""
+
+import os
+import time
+import logging
+import threading
+from functools import wraps
+from flask import jsonify
+from config import Config
+from debug_api import debug
+import deadline
+
+logger = logging.getLogger('admission')
+
+class Sobrecarga(Exception):
+    """Requisição rejeitada pelo controle de admissão (responder 503)."""
+
+    def __init__(self, motivo, retry_after=1):
+        super().__init__(motivo)
+        self.retry_after = max(1, int(retry_after))
+
+def threads_login():
+    """Threads do worker que logins (em execução ou na fila) podem ocupar."""
+    return max(1, Config.GUNICORN_THREADS - Config.ADMISSION_RESERVED_THREADS)
+
+class ControleAdmissao:
+    """
+    Limite de concorrência adaptativo (AIMD) com fila e prazo.
+
+    Args:
+        nome (str): Identificação nos logs/diagnóstico
+    """
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.limite = float(Config.ADMISSION_MAX_CONCURRENCY)
+        self.em_uso = 0
+        self.esperando = 0
+        self.admitidas = 0
+        self.rejeitadas = 0
+        self._concluidas_na_janela = 0
+        self._ultima_reducao = 0.0
+        self._cond = threading.Condition()
+
+    def entrar(self):
+        """
+        Ocupa uma vaga, esperando no máximo ADMISSION_QUEUE_TIMEOUT_MS.
+
+        Returns:
+            float: Instante de admissão (passar para sair())
+
+        Raises:
+            Sobrecarga: Fila cheia ou prazo de espera esgotado
+        """
+        with self._cond:
+            if self.em_uso < int(self.limite):
+                return self._admitir()
+            if self.esperando >= Config.ADMISSION_MAX_QUEUE:
+                self.rejeitadas += 1
+                raise Sobrecarga('fila cheia')
+            if self.em_uso + self.esperando >= threads_login():
+                self.rejeitadas += 1
+                raise Sobrecarga('sem thread livre para esperar')
+            # A espera também não passa do prazo da requisição (deadline.py)
+            espera_ms = Config.ADMISSION_QUEUE_TIMEOUT_MS
+            restante = deadline.restante_ms()
+            if restante is not None:
+                espera_ms = min(espera_ms, restante)
+            prazo = time.monotonic() + espera_ms / 1000
+            self.esperando += 1
+            try:
+                while self.em_uso >= int(self.limite):
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        self.rejeitadas += 1
+                        raise Sobrecarga('prazo de espera esgotado')
+                    self._cond.wait(restante)
+                return self._admitir()
+            finally:
+                self.esperando -= 1
+
+    def _admitir(self):
+        self.em_uso += 1
+        self.admitidas += 1
+        return time.monotonic()
+
+    def sair(self, admitida_em):
+        """Libera a vaga e ajusta o limite pela latência de serviço observada."""
+        agora = time.monotonic()
+        latencia_ms = (agora - admitida_em) * 1000
+        with self._cond:
+            self.em_uso -= 1
+            if latencia_ms <= Config.ADMISSION_TARGET_LATENCY_MS:
+                self._concluidas_na_janela += 1
+                if self._concluidas_na_janela >= int(self.limite):
+                    self._concluidas_na_janela = 0
+                    self.limite = min(float(Config.ADMISSION_MAX_CONCURRENCY), self.limite + 1)
+            elif agora - self._ultima_reducao >= Config.ADMISSION_TARGET_LATENCY_MS / 1000:
+                self._ultima_reducao = agora
+                self._concluidas_na_janela = 0
+                anterior = self.limite
+                self.limite = max(float(Config.ADMISSION_MIN_CONCURRENCY),
+                                  self.limite * Config.ADMISSION_DECREASE_FACTOR)
+                if int(self.limite) < int(anterior):
+                    logger.warning("Limite de '%s' reduzido para %d (latência %.0f ms)",
+                                   self.nome, int(self.limite), latencia_ms)
+            self._cond.notify()
+
+    def reconfigurar(self):
+        """Traz o limite para os novos ADMISSION_MIN/MAX_CONCURRENCY (recarga a quente)."""
+        with self._cond:
+            self.limite = min(max(self.limite, float(Config.ADMISSION_MIN_CONCURRENCY)),
+                              float(Config.ADMISSION_MAX_CONCURRENCY))
+            self._cond.notify_all()
+
+    def limitar(self, ao_rejeitar):
+        """
+        Decorador de rota: admite ou responde com ao_rejeitar(Sobrecarga).
+        """
+        def decorador(funcao):
+            @wraps(funcao)
+            def envolvida(*args, **kwargs):
+                try:
+                    admitida_em = self.entrar()
+                except Sobrecarga as e:
+                    return ao_rejeitar(e)
+                try:
+                    return funcao(*args, **kwargs)
+                finally:
+                    self.sair(admitida_em)
+            return envolvida
+        return decorador
+
+    def resumo(self):
+        """Estado para diagnóstico."""
+        return {'nome': self.nome, 'limite': int(self.limite), 'em_uso': self.em_uso,
+                'esperando': self.esperando, 'admitidas': self.admitidas, 'rejeitadas': self.rejeitadas}
+
+# Controle do endpoint de login (um por processo)
+controle_login = ControleAdmissao('login')
+
+@debug.route('/admissao', methods=['GET'])
+def admissao_resumo():
+    return jsonify({'pid': os.getpid(), **controle_login.resumo()}), 200
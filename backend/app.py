@@ -12,7 +12,7 @@ Endpoints disponíveis:
 
 Schema do Banco (REAL - Confirmado):
 - usuarios: id, email, senha, criado_em
-  (NÃO possui: nome, ativo, atualizado_em, ultimo_acesso)
+  (NÃO possui: nome, ativo, atualizado_em; ultimo_acesso só via last_access.py)
 - registros_acesso: id, usuario_id, tipo_evento, endereco_ip, sucesso, mensagem, criado_em
   (NÃO possui: email)
 
@@ -23,76 +23,230 @@ Autenticação:
 - Tratamento robusto de exceções SQL
 
 Segurança:
-- CORS configurado para origens específicas
+- CORS configurado para origens específicas (CORS_ORIGINS); preflights
+  respondidos por cors_preflight.PreflightCors antes do roteamento
 - Validação de inputs
 - Tratamento robusto de exceções para prevenir crash do Gunicorn
 - Proteção contra SQL injection (prepared statements)
 - Rollback automático em erros de banco
 
 Variáveis de ambiente necessárias:
-- JWT_SECRET (obrigatória)
+- JWT_SECRET (obrigatória); JWT_SECRET_PREVIOUS durante uma rotação
 - DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD
+- Recarregáveis sem reiniciar os workers (config_reload.py)
+
+Inicialização (app factory):
+- create_app() monta o app Flask, registra as rotas (Blueprint 'api') e
+  aquece o estado caro: bcrypt, JWT, roteamento do Flask e respostas
+  JSON pré-serializadas
+- Com gunicorn.conf.py (preload_app) isso acontece UMA vez no master;
+  gc.freeze() antes do fork mantém as páginas compartilhadas entre os
+  workers (copy-on-write) e cada worker já nasce aquecido
+- startup.py mede imports e etapas; o resumo é logado ao final
 
 Uso:
     # Desenvolvimento
     python app.py
     
     # Produção
-    gunicorn --bind 0.0.0.0:3000 app:app
+    gunicorn -c gunicorn.conf.py app:app
 """
 
-from flask import Flask, request, jsonify
-from flask_cors import CORS, cross_origin
-import jwt
-import bcrypt
-import psycopg2
-from datetime import datetime, timedelta
-from db import get_user_by_email, create_session, log_access, get_connection
-from config import Config
-
-# Inicializa aplicação Flask
-app = Flask(__name__)
-
-# Validar configurações obrigatórias na inicialização
-if not Config.JWT_SECRET:
-    raise ValueError(
-        "JWT_SECRET é obrigatória. Configure a variável de ambiente JWT_SECRET. "
-        "Exemplo: export JWT_SECRET='sua_chave_secreta_aqui'"
-    )
-
-# Configuração CORS para origens permitidas
-CORS(app, resources={r"/*": {"origins": ["https://login-interface.znh7ry.easypanel.host", "http://localhost:3000"]}}, 
-     supports_credentials=True, 
-     allow_headers=["Content-Type", "Authorization"],
-     methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
-
-# Handler explícito de preflight CORS para evitar 404 sem headers
-@app.route('/api/auth/login', methods=['OPTIONS'])
-@cross_origin(origins=["https://login-interface.znh7ry.easypanel.host", "http://localhost:3000"],
-              allow_headers=["Content-Type", "Authorization"],
-              methods=["POST"])
-def login_options():
-    """Handler preflight CORS para endpoint de login"""
-    return '', 200
-
-@app.route('/health', methods=['GET'])
+import startup
+
+with startup.etapa('import_stdlib'):
+    import logging
+    from datetime import datetime, timedelta
+with startup.etapa('import_flask'):
+    from flask import Flask, Blueprint, request, jsonify, current_app
+    from flask_cors import CORS
+with startup.etapa('import_crypto'):
+    import jwt
+    import bcrypt
+with startup.etapa('import_db'):
+    import psycopg2
+    from db import get_user_by_email, normalizar_email, roteador
+    from session_writer import gravador_sessoes
+    from access_aggregator import agregador_acessos
+    from last_access import rastreador_ultimo_acesso
+    from circuit_breaker import BancoIndisponivel
+    from query_stats import CursorInstrumentado
+    import faults
+with startup.etapa('import_config'):
+    from config import Config
+    from app_logging import configurar_logging, definir_contexto, limpar_contexto
+    from cors_preflight import PreflightCors, METODOS_PADRAO, HEADERS_PADRAO
+    from singleflight import SingleFlight, chave_credenciais
+    from debug_api import debug
+    from profiler import perfilador
+    import memdiag
+    from admission import controle_login
+    import deadline
+    from config_reload import recarregador_config
+
+logger = logging.getLogger('app')
+
+# Rotas da API, registradas no app por create_app()
+api = Blueprint('api', __name__)
+
+# Respostas de erro fixas, serializadas uma vez por create_app()
+RESPOSTAS_FIXAS = {
+    'dados_invalidos': ({'sucesso': False, 'mensagem': 'Dados inválidos'}, 400),
+    'campos_obrigatorios': ({'sucesso': False, 'mensagem': 'Email e senha obrigatórios'}, 400),
+    'credenciais_invalidas': ({'sucesso': False, 'mensagem': 'Usuário ou senha inválida'}, 401),
+    'token_ausente': ({'sucesso': False, 'mensagem': 'Token nao fornecido'}, 401),
+    'token_expirado': ({'sucesso': False, 'mensagem': 'Token expirado'}, 401),
+    'token_invalido': ({'sucesso': False, 'mensagem': 'Token invalido'}, 401),
+}
+_corpos_prontos = {}
+
+# Verificações de login em andamento neste worker (singleflight.py)
+logins_em_voo = SingleFlight('login', timeout=Config.LOGIN_SINGLEFLIGHT_TIMEOUT_SECONDS)
+
+@recarregador_config.ao_recarregar
+def reconfigurar_login():
+    logins_em_voo.timeout = Config.LOGIN_SINGLEFLIGHT_TIMEOUT_SECONDS
+
+def resposta_pronta(chave):
+    """
+    Resposta JSON fixa a partir do corpo pré-serializado.
+
+    Um novo objeto Response por requisição (o CORS adiciona headers nele),
+    reaproveitando apenas os bytes do corpo. O corpo sai do próprio jsonify
+    (mesmos separadores compactos, sort_keys e ensure_ascii do app).
+    """
+    corpo, status = RESPOSTAS_FIXAS[chave]
+    if chave not in _corpos_prontos:
+        _corpos_prontos[chave] = jsonify(corpo).get_data()
+    return current_app.response_class(_corpos_prontos[chave], status=status, mimetype='application/json')
+
+def aquecer(app):
+    """
+    Executa o trabalho caro de primeira requisição antes de servir tráfego.
+
+    Não toca no banco: no master do Gunicorn (preload) conexões abertas
+    aqui seriam herdadas pelos workers.
+    """
+    with startup.etapa('aquecimento_bcrypt'):
+        # Custo mínimo: só carrega a biblioteca, sem gastar CPU no master
+        hash_aquecimento = bcrypt.hashpw(b'aquecimento', bcrypt.gensalt(rounds=4))
+        bcrypt.checkpw(b'aquecimento', hash_aquecimento)
+    with startup.etapa('aquecimento_jwt'):
+        token = jwt.encode({'user_id': 0, 'email': 'aquecimento@local',
+                            'exp': datetime.utcnow() + timedelta(minutes=1)},
+                           Config.JWT_SECRET, algorithm='HS256')
+        jwt.decode(token, Config.JWT_SECRET, algorithms=['HS256'])
+    with startup.etapa('aquecimento_respostas'):
+        with app.app_context():
+            for chave in RESPOSTAS_FIXAS:
+                resposta_pronta(chave)
+    with startup.etapa('aquecimento_rotas'):
+        # Compila o mapa de URLs e exercita o pipeline do Flask/CORS
+        cliente = app.test_client()
+        cliente.get('/health')
+        cliente.post('/api/auth/verify', headers={'Authorization': 'Bearer aquecimento'})
+
+def create_app(aquecer_app=True):
+    """
+    App factory: cria e configura a aplicação Flask.
+
+    Args:
+        aquecer_app (bool): Executa aquecer() antes de retornar
+
+    Returns:
+        Flask: Aplicação pronta para servir
+
+    Raises:
+        ValueError: JWT_SECRET não configurada
+    """
+    # Logging estruturado (JSON) com fila não bloqueante
+    configurar_logging()
+
+    # Validar configurações obrigatórias na inicialização
+    if not Config.JWT_SECRET:
+        raise ValueError(
+            "JWT_SECRET é obrigatória. Configure a variável de ambiente JWT_SECRET. "
+            "Exemplo: export JWT_SECRET='sua_chave_secreta_aqui'"
+        )
+
+    with startup.etapa('create_app'):
+        # Inicializa aplicação Flask
+        app = Flask(__name__)
+
+        # Configuração CORS para origens permitidas (headers das respostas)
+        CORS(app, resources={r"/*": {"origins": Config.CORS_ORIGINS}}, 
+             supports_credentials=True, 
+             allow_headers=list(HEADERS_PADRAO),
+             methods=list(METODOS_PADRAO),
+             max_age=Config.CORS_MAX_AGE_SECONDS)
+        # Preflights respondidos antes do roteamento do Flask
+        app.wsgi_app = PreflightCors(app.wsgi_app, Config.CORS_ORIGINS,
+                                     max_age=Config.CORS_MAX_AGE_SECONDS)
+
+        app.before_request(contexto_log_requisicao)
+        app.teardown_request(limpar_contexto_log)
+        app.before_request(iniciar_prazo)
+        app.teardown_request(limpar_prazo)
+        app.register_blueprint(api)
+        
+        # Diagnóstico: profiler, memória e endpoints /debug (DEBUG_TOKEN)
+        perfilador.instalar(app)
+        if Config.MEMDIAG_TRACEMALLOC_FRAMES:
+            memdiag.iniciar(Config.MEMDIAG_TRACEMALLOC_FRAMES)
+        app.register_blueprint(debug)
+
+    if aquecer_app:
+        aquecer(app)
+
+    logger.info("Inicialização concluída", extra=startup.resumo())
+    return app
+
+def contexto_log_requisicao():
+    """Associa rota, método e IP a todos os logs emitidos nesta requisição."""
+    definir_contexto(rota=request.path, metodo=request.method, ip=request.remote_addr)
+
+def limpar_contexto_log(exc=None):
+    """Descarta o contexto de log ao fim da requisição."""
+    limpar_contexto()
+
+def iniciar_prazo():
+    """Prazo da requisição por rota, encurtável pelo header do cliente (deadline.py)."""
+    deadline.iniciar(request.endpoint, request.headers.get(Config.DEADLINE_HEADER))
+
+def limpar_prazo(exc=None):
+    deadline.limpar()
+
+def resposta_indisponivel(corpo, retry_after):
+    """Resposta 503 com header Retry-After (banco indisponível)."""
+    resposta = jsonify(corpo)
+    resposta.status_code = 503
+    resposta.headers['Retry-After'] = str(retry_after)
+    return resposta
+
+@api.route('/health', methods=['GET'])
 def health():
     """Health check básico da aplicação"""
     return jsonify({'status': 'OK', 'timestamp': datetime.now().isoformat()}), 200
 
-@app.route('/health/db', methods=['GET'])
+@api.route('/health/db', methods=['GET'])
 def health_db():
     """
     Health check do banco de dados.
     Verifica conectividade e conta usuários (se possível).
+    
+    Leitura de diagnóstico: roteada como as demais leituras (réplica
+    saudável ou primário). O corpo inclui o estado de cada pool.
+    
+    Com o circuit breaker aberto responde 503 imediatamente, com
+    Retry-After, sem tentar conectar.
     """
+    pool = roteador.pool_leitura()
     try:
-        conn = get_connection()
-        if not conn:
-            return jsonify({'status': 'ERROR', 'db': 'UNAVAILABLE'}), 500
+        conn = pool.obter()
         try:
-            cur = conn.cursor()
+            cur = CursorInstrumentado(conn.cursor())
             cur.execute("SELECT 1")
+            pool.circuito.registrar_sucesso()
             # Tentar contar usuários (opcional, para diagnóstico)
             usuarios_count = None
             try:
@@ -101,20 +255,89 @@ def health_db():
             except Exception:
                 usuarios_count = 'unknown'
             cur.close()
-            return jsonify({'status': 'OK', 'db': 'AVAILABLE', 'usuarios_count': usuarios_count}), 200
+            return jsonify({'status': 'OK', 'db': 'AVAILABLE', 'usuarios_count': usuarios_count,
+                            'servidor': pool.nome, 'pools': roteador.resumo()}), 200
         finally:
-            conn.close()
+            pool.devolver(conn)
+    except BancoIndisponivel as e:
+        return resposta_indisponivel({'status': 'ERROR', 'db': 'UNAVAILABLE',
+                                      'pools': roteador.resumo()}, e.retry_after)
+    except psycopg2.OperationalError as e:
+        pool.circuito.registrar_falha()
+        logger.error("Banco indisponível no health check: %s", e)
+        return resposta_indisponivel({'status': 'ERROR', 'db': 'UNAVAILABLE'}, pool.circuito.retry_after())
     except Exception as e:
-        print(f"DB health error: {e}")
+        logger.exception("Erro no health check do banco: %s", e)
         return jsonify({'status': 'ERROR', 'db': 'UNKNOWN'}), 500
 
 # Evitar 404 para favicon (não impacta API)
-@app.route('/favicon.ico', methods=['GET'])
+@api.route('/favicon.ico', methods=['GET'])
 def favicon():
     """Retorna 204 para favicon (evita logs desnecessários)"""
     return '', 204
 
-@app.route('/api/auth/login', methods=['POST'])
+def verificar_senha(senha, hash_senha):
+    """bcrypt.checkpw com o ponto de injeção 'bcrypt' (faults.py)."""
+    faults.injetar('bcrypt')
+    return bcrypt.checkpw(senha.encode('utf-8'), hash_senha)
+
+def decodificar_token(token):
+    """
+    jwt.decode com JWT_SECRET e, em uma rotação, os segredos de JWT_SECRET_PREVIOUS.
+
+    Tokens novos são sempre assinados com JWT_SECRET; os anteriores só
+    validam tokens emitidos antes da troca (até expirarem, 24h).
+    """
+    segredo, anteriores = Config.JWT_SECRET, Config.JWT_SECRET_PREVIOUS
+    try:
+        return jwt.decode(token, segredo, algorithms=['HS256'])
+    except jwt.InvalidSignatureError:
+        for anterior in (s.strip() for s in anteriores.split(',')):
+            if not anterior:
+                continue
+            try:
+                return jwt.decode(token, anterior, algorithms=['HS256'])
+            except jwt.InvalidSignatureError:
+                continue
+        raise
+
+def verificar_credenciais(email, senha):
+    """
+    Busca o usuário e confere a senha (parte compartilhada pelo single-flight).
+
+    Returns:
+        tuple: (usuario ou None, senha_correta)
+    """
+    # Buscar usuário no banco - retorna apenas: id, email, senha, criado_em
+    definir_contexto(etapa='busca_usuario')
+    usuario = get_user_by_email(email)
+    if not usuario:
+        return None, False
+    
+    # Verificar senha (suporta bcrypt e plaintext para dev)
+    definir_contexto(etapa='verificacao_senha')
+    senha_db = usuario['senha']
+    senha_correta = False
+    
+    # Verificar se é hash bcrypt (formato: $2b$ ou $2a$)
+    if senha_db.startswith('$2b$') or senha_db.startswith('$2a$'):
+        try:
+            senha_correta = verificar_senha(senha, senha_db.encode('utf-8'))
+        except Exception as e:
+            logger.error("Erro ao verificar bcrypt: %s", e)
+            senha_correta = False
+    else:
+        # Fallback plaintext apenas para desenvolvimento (NÃO usar em produção)
+        senha_correta = (senha == senha_db)
+    return usuario, senha_correta
+
+def resposta_sobrecarga(erro):
+    """Login rejeitado pelo controle de admissão: 503 rápido com Retry-After."""
+    return resposta_indisponivel({'sucesso': False, 'mensagem': 'Servidor sobrecarregado, tente novamente'},
+                                 erro.retry_after)
+
+@api.route('/api/auth/login', methods=['POST'])
+@controle_login.limitar(ao_rejeitar=resposta_sobrecarga)
 def login():
     """
     Endpoint de autenticação de usuários.
@@ -143,54 +366,49 @@ def login():
             }
         }
     
-    Response Error (400/401/500):
+    Response Error (400/401/500/503):
         {
             "sucesso": false,
             "mensagem": "Descrição do erro"
         }
+    
+    503 também quando o controle de admissão (admission.py) rejeita o
+    login por sobrecarga, com header Retry-After.
     """
     try:
         # Validar presença de dados no request
         data = request.get_json()
         if not data:
-            return jsonify({'sucesso': False, 'mensagem': 'Dados inválidos'}), 400
+            return resposta_pronta('dados_invalidos')
         
-        # Extrair credenciais
-        email = data.get('email')
+        # Extrair credenciais (email normalizado: minúsculo, sem espaços)
+        email = normalizar_email(data.get('email'))
         senha = data.get('senha')
         
         # Validar campos obrigatórios
         if not email or not senha:
-            return jsonify({'sucesso': False, 'mensagem': 'Email e senha obrigatórios'}), 400
+            return resposta_pronta('campos_obrigatorios')
+        
+        # Buscar usuário e verificar a senha; tentativas idênticas concorrentes
+        # (duplo clique, retentativas) compartilham uma única verificação
+        if Config.LOGIN_SINGLEFLIGHT:
+            usuario, senha_correta = logins_em_voo.executar(
+                chave_credenciais(email, senha), lambda: verificar_credenciais(email, senha))
+        else:
+            usuario, senha_correta = verificar_credenciais(email, senha)
         
-        # Buscar usuário no banco - retorna apenas: id, email, senha, criado_em
-        usuario = get_user_by_email(email)
         if not usuario:
             # Usuário não encontrado - registrar tentativa sem usuario_id
             ip = request.remote_addr
-            log_access(None, 'login', ip, False, 'Usuário não encontrado')
-            return jsonify({'sucesso': False, 'mensagem': 'Usuário ou senha inválida'}), 401
-        
-        # Verificar senha (suporta bcrypt e plaintext para dev)
-        senha_db = usuario['senha']
-        senha_correta = False
-        
-        # Verificar se é hash bcrypt (formato: $2b$ ou $2a$)
-        if senha_db.startswith('$2b$') or senha_db.startswith('$2a$'):
-            try:
-                senha_correta = bcrypt.checkpw(senha.encode('utf-8'), senha_db.encode('utf-8'))
-            except Exception as e:
-                print(f"Erro ao verificar bcrypt: {e}")
-                senha_correta = False
-        else:
-            # Fallback plaintext apenas para desenvolvimento (NÃO usar em produção)
-            senha_correta = (senha == senha_db)
+            agregador_acessos.registrar(None, 'login', ip, False, 'Usuário não encontrado')
+            return resposta_pronta('credenciais_invalidas')
         
         # Se senha incorreta, registrar tentativa falhada e retornar erro
+        definir_contexto(usuario_id=usuario['id'])
         if not senha_correta:
             ip = request.remote_addr
-            log_access(usuario['id'], 'login', ip, False, 'Senha inválida')
-            return jsonify({'sucesso': False, 'mensagem': 'Usuário ou senha inválida'}), 401
+            agregador_acessos.registrar(usuario['id'], 'login', ip, False, 'Senha inválida')
+            return resposta_pronta('credenciais_invalidas')
         
         # Gerar token JWT com informações do usuário
         payload = {
@@ -200,10 +418,12 @@ def login():
         }
         token = jwt.encode(payload, Config.JWT_SECRET, algorithm='HS256')
         
-        # Registrar sessão e log de acesso bem-sucedido
+        # Registrar sessão (write-behind: não espera o commit), log e último acesso (em lote)
+        definir_contexto(etapa='registro_sessao')
         ip = request.remote_addr
-        create_session(usuario['id'], token, ip)
-        log_access(usuario['id'], 'login', ip, True, 'Login bem-sucedido')
+        gravador_sessoes.registrar(usuario['id'], token, ip)
+        agregador_acessos.registrar(usuario['id'], 'login', ip, True, 'Login bem-sucedido')
+        rastreador_ultimo_acesso.registrar(usuario['id'])
         
         # Retornar resposta de sucesso SEM campo 'nome' (não existe no banco)
         return jsonify({
@@ -216,19 +436,25 @@ def login():
             }
         }), 200
         
+    except BancoIndisponivel as e:
+        # Banco fora do ar/lento: falha rápida com Retry-After (circuit breaker)
+        logger.warning("Login rejeitado, banco indisponível: %s", e)
+        return resposta_indisponivel({'sucesso': False, 'mensagem': 'Serviço temporariamente indisponível'},
+                                     e.retry_after)
+        
     except psycopg2.Error as db_error:
         # Tratamento específico para erros de banco de dados
         # Evita crash do Gunicorn ao logar erro e retornar resposta controlada
-        print(f"[ERRO SQL] Erro de banco de dados no login: {db_error}")
+        logger.error("Erro de banco de dados no login: %s", db_error)
         return jsonify({'sucesso': False, 'mensagem': 'Erro no banco de dados'}), 500
         
     except Exception as e:
         # Tratamento genérico para evitar crash do Gunicorn
         # Captura qualquer exceção não prevista
-        print(f"[ERRO] Erro inesperado no login: {e}")
+        logger.exception("Erro inesperado no login: %s", e)
         return jsonify({'sucesso': False, 'mensagem': 'Erro ao realizar login'}), 500
 
-@app.route('/api/auth/verify', methods=['POST'])
+@api.route('/api/auth/verify', methods=['POST'])
 def verify():
     """
     Verifica validade do token JWT.
@@ -258,34 +484,40 @@ def verify():
         # Extrair token do header Authorization
         auth_header = request.headers.get('Authorization')
         if not auth_header:
-            return jsonify({'sucesso': False, 'mensagem': 'Token nao fornecido'}), 401
+            return resposta_pronta('token_ausente')
         
         # Remover "Bearer " se presente
         token = auth_header.split(' ')[1] if ' ' in auth_header else auth_header
         
         # Decodificar e validar token
-        payload = jwt.decode(token, Config.JWT_SECRET, algorithms=['HS256'])
+        payload = decodificar_token(token)
         
         return jsonify({'sucesso': True, 'mensagem': 'Token valido', 'usuario': payload}), 200
         
     except jwt.ExpiredSignatureError:
         # Token expirado (após 24 horas)
-        return jsonify({'sucesso': False, 'mensagem': 'Token expirado'}), 401
+        return resposta_pronta('token_expirado')
         
     except jwt.InvalidTokenError:
         # Token inválido (assinatura incorreta, formato inválido, etc)
-        return jsonify({'sucesso': False, 'mensagem': 'Token invalido'}), 401
+        return resposta_pronta('token_invalido')
         
     except Exception as e:
         # Tratamento genérico para evitar crash
-        print(f"[ERRO] Erro inesperado na verificação de token: {e}")
+        logger.exception("Erro inesperado na verificação de token: %s", e)
         return jsonify({'sucesso': False, 'mensagem': 'Erro ao verificar'}), 500
 
+# Instância usada por "gunicorn app:app" (e aquecida no master com preload)
+app = create_app()
+
 if __name__ == '__main__':
     """
     Servidor de desenvolvimento.
     Para produção, usar Gunicorn:
-        gunicorn --bind 0.0.0.0:3000 app:app
+        gunicorn -c gunicorn.conf.py app:app
     """
+    perfilador.instalar_sinal()
+    recarregador_config.instalar_sinal()
+    recarregador_config.iniciar()
     app.run(host='0.0.0.0', port=Config.PORT, debug=Config.DEBUG)
 
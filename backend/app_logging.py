@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+app_logging.py - Logging Estruturado e Não Bloqueante
+
+Substitui os print() de app.py e db.py por logging estruturado em JSON,
+emitido por uma thread dedicada (QueueHandler + QueueListener).
+
+Por que:
+- print() escreve de forma síncrona no pipe do stdout; durante uma queda do
+  banco cada requisição que falha bloqueia o worker escrevendo mensagens
+- Mensagens sem estrutura não dizem em que rota/IP/etapa o erro ocorreu
+
+Como funciona:
+- logger.error(...) no worker só enfileira o registro (queue.put_nowait);
+  a serialização JSON e a escrita ficam na thread do QueueListener
+- Fila cheia: o registro é DESCARTADO e contado (nunca bloqueia a requisição);
+  o total descartado aparece no próximo registro emitido
+- Limite de taxa: mensagens idênticas (mesmo logger, nível e template) além
+  de LOG_RATE_LIMIT_BURST por janela de LOG_RATE_LIMIT_WINDOW_SECONDS são
+  suprimidas; a primeira após a janela informa quantas foram suprimidas
+  (ex.: tempestade de "Erro ao conectar ao banco de dados")
+- Contexto da requisição (rota, método, IP, etapa) guardado em contextvars
+  e anexado a cada registro na thread de origem
+
+Custo medido (python app_logging.py --bench, x86-64):
+- logger.error/info enfileirado: ~15-20 µs por chamada na thread da
+  requisição, incluindo a disputa de GIL com a thread de escrita
+- print() com pipe livre: ~3 µs, mas com o pipe cheio (leitor lento ou
+  parado) bloqueia o worker por tempo ilimitado
+O ganho não é o custo médio, e sim o pior caso: o worker nunca espera I/O.
+
+Uso:
+    from app_logging import configurar_logging, definir_contexto
+    import logging
+
+    configurar_logging()
+    logger = logging.getLogger('app')
+    definir_contexto(rota='/api/auth/login', ip='1.2.3.4')
+    logger.error('Erro ao buscar usuário: %s', erro, extra={'etapa': 'busca_usuario'})
+
+Configuração (.env):
+- LOG_LEVEL, LOG_QUEUE_SIZE, LOG_RATE_LIMIT_BURST, LOG_RATE_LIMIT_WINDOW_SECONDS
+"""
+
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+from config import Config
+
+# Contexto da requisição atual (rota, ip, etapa...), isolado por thread/greenlet
+_contexto = contextvars.ContextVar('contexto_log', default={})
+
+# Atributos padrão de LogRecord que não devem ser repetidos como campos extras
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_lock_configuracao = threading.Lock()
+
+def definir_contexto(**campos):
+    """Acrescenta campos ao contexto de log da requisição atual."""
+    _contexto.set({**_contexto.get(), **campos})
+
+def limpar_contexto():
+    """Remove todo o contexto de log (fim da requisição)."""
+    _contexto.set({})
+
+class FormatadorJson(logging.Formatter):
+    """Serializa cada registro como uma linha JSON."""
+
+    def format(self, record):
+        dados = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        dados.update(getattr(record, 'contexto', {}))
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO and chave != 'contexto':
+                dados[chave] = valor
+        if record.exc_info:
+            dados['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Exceção já convertida em texto pelo HandlerFilaNaoBloqueante
+            dados['exc'] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+class FiltroContexto(logging.Filter):
+    """Anexa o contexto da requisição ao registro, na thread de origem."""
+
+    def filter(self, record):
+        record.contexto = _contexto.get()
+        return True
+
+class FiltroLimiteTaxa(logging.Filter):
+    """
+    Suprime repetições da mesma mensagem além de `rajada` por janela.
+
+    A chave é (logger, nível, template da mensagem) — os argumentos não
+    entram, então "Erro ao conectar: %s" com erros diferentes conta como
+    a mesma mensagem.
+    """
+
+    def __init__(self, rajada, janela_segundos):
+        super().__init__()
+        self.rajada = rajada
+        self.janela = janela_segundos
+        self._estado = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        chave = (record.name, record.levelno, str(record.msg))
+        agora = time.monotonic()
+        with self._lock:
+            inicio, emitidas, suprimidas = self._estado.get(chave, (agora, 0, 0))
+            if agora - inicio >= self.janela:
+                if suprimidas:
+                    record.suprimidas = suprimidas
+                self._estado[chave] = (agora, 1, 0)
+                return True
+            if emitidas < self.rajada:
+                self._estado[chave] = (inicio, emitidas + 1, suprimidas)
+                return True
+            self._estado[chave] = (inicio, emitidas, suprimidas + 1)
+            return False
+
+class HandlerFilaNaoBloqueante(logging.handlers.QueueHandler):
+    """
+    QueueHandler que descarta (e conta) registros quando a fila está cheia.
+
+    prepare() é sobrescrito para NÃO formatar na thread da requisição:
+    a serialização JSON acontece no QueueListener. O contador de
+    descartados é lido e alterado sob o lock do handler (RLock), como
+    os contadores de FiltroLimiteTaxa sob o seu.
+    """
+
+    def __init__(self, fila):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record):
+        # Resolve args agora (objetos podem mudar depois), mas sem formatar JSON
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        with self.lock:
+            if self.descartados:
+                record.descartados = self.descartados
+                self.descartados = 0
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.descartados += 1
+
+def configurar_logging(stream=None):
+    """
+    Configura o logger raiz com fila não bloqueante e saída JSON.
+
+    Idempotente: chamadas repetidas não duplicam handlers. Após um fork
+    (gunicorn com preload) chame reiniciar_apos_fork() no worker, pois a
+    thread do QueueListener não sobrevive ao fork.
+
+    Args:
+        stream: Destino das linhas JSON (padrão: sys.stdout)
+    """
+    global _listener
+    with _lock_configuracao:
+        if _listener is not None:
+            return
+        fila = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        handler_fila = HandlerFilaNaoBloqueante(fila)
+        handler_fila.addFilter(FiltroContexto())
+        handler_fila.addFilter(FiltroLimiteTaxa(Config.LOG_RATE_LIMIT_BURST,
+                                                Config.LOG_RATE_LIMIT_WINDOW_SECONDS))
+
+        saida = logging.StreamHandler(stream or sys.stdout)
+        saida.setFormatter(FormatadorJson())
+
+        raiz = logging.getLogger()
+        raiz.handlers = [handler_fila]
+        raiz.setLevel(Config.LOG_LEVEL)
+
+        _listener = logging.handlers.QueueListener(fila, saida, respect_handler_level=True)
+        _listener.start()
+        atexit.register(parar_logging)
+
+def reconfigurar():
+    """
+    Aplica LOG_LEVEL, LOG_QUEUE_SIZE e LOG_RATE_LIMIT_* atuais (recarga a
+    quente): a fila é redimensionada sem perder os registros já nela.
+    """
+    raiz = logging.getLogger()
+    raiz.setLevel(Config.LOG_LEVEL)
+    for handler in raiz.handlers:
+        if not isinstance(handler, HandlerFilaNaoBloqueante):
+            continue
+        with handler.queue.mutex:
+            handler.queue.maxsize = Config.LOG_QUEUE_SIZE
+            handler.queue.not_full.notify_all()
+        for filtro in handler.filters:
+            if isinstance(filtro, FiltroLimiteTaxa):
+                filtro.rajada = Config.LOG_RATE_LIMIT_BURST
+                filtro.janela = Config.LOG_RATE_LIMIT_WINDOW_SECONDS
+
+def parar_logging():
+    """Esvazia a fila e encerra a thread de escrita."""
+    global _listener
+    with _lock_configuracao:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+def reiniciar_apos_fork():
+    """Recria fila e thread de escrita no processo filho (post_fork)."""
+    global _listener
+    with _lock_configuracao:
+        _listener = None
+    configurar_logging()
+
+def _benchmark(n=100_000):
+    """Mede o custo por chamada de logger.error com a fila não bloqueante."""
+    import io
+    import os
+
+    configurar_logging(stream=io.StringIO())
+    logger = logging.getLogger('bench')
+    definir_contexto(rota='/api/auth/login', ip='127.0.0.1')
+
+    inicio = time.perf_counter()
+    for i in range(n):
+        logger.error('Erro de banco de dados no login: %s', i)
+    por_chamada_limitado = (time.perf_counter() - inicio) / n * 1e6
+
+    inicio = time.perf_counter()
+    for i in range(n):
+        logging.getLogger(f'bench.{i % 1000}').info('Evento distinto %s', i)
+    por_chamada = (time.perf_counter() - inicio) / n * 1e6
+    parar_logging()
+
+    leitura, escrita = os.pipe()
+    saida = os.fdopen(escrita, 'w')
+    inicio = time.perf_counter()
+    for i in range(min(n, 1000)):
+        print(f'[ERRO SQL] Erro de banco de dados no login: {i}', file=saida, flush=True)
+    por_print = (time.perf_counter() - inicio) / min(n, 1000) * 1e6
+    saida.close()
+    os.close(leitura)
+
+    print(f'logger.error repetido (limitado): {por_chamada_limitado:.2f} µs/chamada')
+    print(f'logger.info enfileirado:          {por_chamada:.2f} µs/chamada')
+    print(f'print() para pipe (com flush):    {por_print:.2f} µs/chamada (bloqueia com pipe cheio)')
+
+if __name__ == '__main__':
+    if '--bench' in sys.argv:
+        _benchmark()
+    else:
+        print(__doc__)
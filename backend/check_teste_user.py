@@ -14,13 +14,20 @@ sys.path.insert(0, '/app/backend')
 try:
     from config import Config
     from db import get_user_by_email
+    from circuit_breaker import BancoIndisponivel
     
     print('\n' + '='*80)
     print('🔍 VERIFICANDO USUÁRIO: teste@email.com')
     print('='*80 + '\n')
     
     # Tentar buscar o usuário
-    usuario = get_user_by_email('teste@email.com')
+    try:
+        usuario = get_user_by_email('teste@email.com')
+    except BancoIndisponivel as e:
+        # Sem banco não dá para dizer se o usuário existe
+        print(f'❌ BANCO INDISPONÍVEL: {e}')
+        print(f'Verifique DB_HOST ({Config.DB_HOST}) e tente novamente.\n')
+        sys.exit(1)
     
     if usuario:
         print('✅ USUÁRIO ENCONTRADO!\n')
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+circuit_breaker.py - Circuit Breaker para o Acesso ao Banco
+
+Quando o PostgreSQL está lento ou fora do ar, cada requisição ficava presa
+em psycopg2.connect até o timeout TCP e os workers do Gunicorn se
+acumulavam. O circuit breaker falha rápido nessas situações.
+
+Estados:
+- FECHADO: chamadas passam normalmente; falhas consecutivas são contadas
+- ABERTO: após CB_FAILURE_THRESHOLD falhas consecutivas, toda chamada é
+  rejeitada na hora com BancoIndisponivel (sem tocar no banco). Uma thread
+  em segundo plano sonda o banco a cada CB_OPEN_SECONDS
+- SEMI_ABERTO: a sonda teve sucesso; UMA requisição real por intervalo é
+  liberada como teste. Sucesso fecha o circuito, falha reabre
+
+Somente falhas de disponibilidade contam (erro de conexão, conexão perdida,
+statement_timeout — psycopg2.OperationalError). Erros de SQL/integridade
+significam que o banco respondeu e contam como sucesso.
+
+Uso:
+    circuito = CircuitBreaker('primario', sonda=testar_conexao)
+    circuito.antes_da_chamada()          # levanta BancoIndisponivel se aberto
+    try:
+        ...
+        circuito.registrar_sucesso()
+    except psycopg2.OperationalError:
+        circuito.registrar_falha()
+"""
+
+import time
+import logging
+import threading
+from config import Config
+
+logger = logging.getLogger('circuit_breaker')
+
+FECHADO = 'fechado'
+ABERTO = 'aberto'
+SEMI_ABERTO = 'semi_aberto'
+
+class BancoIndisponivel(Exception):
+    """
+    Banco considerado indisponível: a requisição deve responder 503.
+
+    Attributes:
+        retry_after (int): Segundos sugeridos para o header Retry-After
+    """
+
+    def __init__(self, mensagem='Banco de dados indisponível', retry_after=1):
+        super().__init__(mensagem)
+        self.retry_after = max(1, int(retry_after))
+
+class CircuitBreaker:
+    """
+    Circuit breaker thread-safe com sondagem de recuperação em segundo plano.
+
+    Args:
+        nome (str): Identificação nos logs (ex.: 'primario', 'replica-1')
+        sonda (callable): Função sem argumentos que retorna True se o banco
+            respondeu; usada pela thread de recuperação
+        limite_falhas (int): Falhas consecutivas para abrir o circuito
+        intervalo_sonda (float): Segundos entre sondagens com circuito aberto
+    """
+
+    def __init__(self, nome, sonda=None, limite_falhas=None, intervalo_sonda=None):
+        self.nome = nome
+        self.sonda = sonda
+        self.limite_falhas = limite_falhas or Config.CB_FAILURE_THRESHOLD
+        self.intervalo_sonda = intervalo_sonda or Config.CB_OPEN_SECONDS
+        self._estado = FECHADO
+        self._falhas = 0
+        self._proxima_tentativa = 0.0
+        self._thread_sonda = None
+        self._lock = threading.Lock()
+
+    @property
+    def estado(self):
+        return self._estado
+
+    def retry_after(self):
+        """Segundos até a próxima tentativa de recuperação."""
+        return max(1, int(self._proxima_tentativa - time.monotonic() + 0.999))
+
+    def antes_da_chamada(self):
+        """
+        Autoriza (ou rejeita) uma chamada ao banco.
+
+        Raises:
+            BancoIndisponivel: Circuito aberto, ou semi-aberto com o teste
+                do intervalo já em andamento
+        """
+        if self._estado == FECHADO:
+            return
+        with self._lock:
+            if self._estado == ABERTO:
+                self._garantir_sonda()
+                raise BancoIndisponivel(retry_after=self.retry_after())
+            if self._estado == SEMI_ABERTO:
+                agora = time.monotonic()
+                if agora < self._proxima_tentativa:
+                    raise BancoIndisponivel(retry_after=self.retry_after())
+                # Libera uma requisição de teste por intervalo
+                self._proxima_tentativa = agora + self.intervalo_sonda
+
+    def registrar_sucesso(self):
+        """Chamada concluída: zera falhas e fecha o circuito se estava em teste."""
+        if self._estado == FECHADO and self._falhas == 0:
+            return
+        with self._lock:
+            if self._estado != FECHADO:
+                logger.warning("Circuito '%s' fechado: banco recuperado", self.nome)
+            self._estado = FECHADO
+            self._falhas = 0
+
+    def registrar_falha(self):
+        """Falha de disponibilidade: abre o circuito no limite ou se estava em teste."""
+        with self._lock:
+            self._falhas += 1
+            if self._estado == SEMI_ABERTO or (self._estado == FECHADO and self._falhas >= self.limite_falhas):
+                self._abrir()
+
+    def _abrir(self):
+        """Transição para ABERTO (chamado com o lock adquirido)."""
+        self._estado = ABERTO
+        self._proxima_tentativa = time.monotonic() + self.intervalo_sonda
+        logger.error("Circuito '%s' aberto após %d falha(s) consecutiva(s)", self.nome, self._falhas)
+        self._garantir_sonda()
+
+    def _garantir_sonda(self):
+        """
+        Inicia a thread de sondagem se não estiver rodando.
+
+        Também cobre o caso de um worker criado por fork com o circuito
+        aberto, já que threads não sobrevivem ao fork.
+        """
+        if self.sonda is None or (self._thread_sonda and self._thread_sonda.is_alive()):
+            return
+        self._thread_sonda = threading.Thread(target=self._sondar, name=f'sonda-{self.nome}', daemon=True)
+        self._thread_sonda.start()
+
+    def _sondar(self):
+        """Loop da thread de recuperação: sonda até o banco responder."""
+        while self._estado == ABERTO:
+            time.sleep(max(0.0, self._proxima_tentativa - time.monotonic()))
+            try:
+                ok = self.sonda()
+            except Exception:
+                ok = False
+            with self._lock:
+                if self._estado != ABERTO:
+                    return
+                if ok:
+                    # Próxima requisição real é liberada como teste
+                    self._estado = SEMI_ABERTO
+                    self._proxima_tentativa = 0.0
+                    logger.warning("Circuito '%s' semi-aberto: sonda respondeu", self.nome)
+                    return
+                self._proxima_tentativa = time.monotonic() + self.intervalo_sonda
+
+    def resumo(self):
+        """Estado atual para endpoints de diagnóstico."""
+        return {'nome': self.nome, 'estado': self._estado, 'falhas_consecutivas': self._falhas}
@@ -9,13 +9,59 @@ Variáveis obrigatórias:
 - JWT_SECRET: Chave secreta para assinatura de tokens JWT (mínimo 32 caracteres)
 
 Variáveis opcionais com defaults:
+- JWT_SECRET_PREVIOUS: Segredos anteriores aceitos só na verificação, separados por vírgula (padrão: nenhum)
 - DB_HOST: Host do PostgreSQL (padrão: login_auth_db)
 - DB_PORT: Porta do PostgreSQL (padrão: 5432)
 - DB_USER: Usuário do banco (padrão: auth_db)
 - DB_PASSWORD: Senha do banco (padrão: Senha123456)
 - DB_NAME: Nome do banco (padrão: auth_db)
+- DB_CONNECT_TIMEOUT: Timeout de conexão em segundos (padrão: 3)
+- DB_STATEMENT_TIMEOUT_MS: statement_timeout das conexões da API (padrão: 5000)
+- DB_POOL_MAX: Conexões máximas do pool do primário por processo (padrão: 5)
+- DB_REPLICA_HOSTS: Réplicas de leitura "host1[:porta],host2[:porta]" (padrão: nenhuma)
+- DB_REPLICA_POOL_MAX: Conexões máximas por réplica por processo (padrão: 5)
+- REPLICA_SELECTION: round_robin ou least_loaded (padrão: round_robin)
+- REPLICA_MAX_LAG_SECONDS: Atraso máximo de replicação aceito (padrão: 5)
+- REPLICA_LAG_CHECK_SECONDS: Cache da medição de atraso (padrão: 1)
+- REPLICA_MISS_FALLBACK: Confirma "não encontrado" no primário (padrão: True)
+- CB_FAILURE_THRESHOLD: Falhas consecutivas que abrem o circuit breaker (padrão: 5)
+- CB_OPEN_SECONDS: Intervalo de sondagem com o circuito aberto (padrão: 10)
 - DEBUG: Modo debug (padrão: False)
 - PORT: Porta da aplicação (padrão: 3000)
+- MIGRATION_LOCK_TIMEOUT_MS: lock_timeout de cada DDL das migrações (padrão: 2000)
+- MIGRATION_STATEMENT_TIMEOUT_MS: statement_timeout das migrações, 0 = sem limite (padrão: 0)
+- MIGRATION_DDL_RETRIES: Tentativas de DDL após estouro de lock_timeout (padrão: 5)
+- ROLLUP_LAG_SECONDS: Atraso mínimo antes de agregar um registro de acesso (padrão: 60)
+- ROLLUP_BATCH_SIZE: Registros de acesso agregados por transação (padrão: 50000)
+- ROLLUP_MINUTE_RETENTION_HOURS: Retenção dos rollups por minuto (padrão: 48)
+- SESSION_WRITE_MODE: sync, async ou async_spill (padrão: async)
+- SESSION_QUEUE_SIZE: Sessões pendentes em memória por worker (padrão: 10000)
+- SESSION_BATCH_SIZE: Sessões por INSERT em lote (padrão: 200)
+- SESSION_FLUSH_INTERVAL_MS: Espera máxima por novas sessões do lote (padrão: 50)
+- SESSION_MAX_RETRIES: Novas tentativas de um lote com falha (padrão: 5)
+- SESSION_SPILL_FILE: Arquivo de spill do modo async_spill (padrão: sessoes_pendentes.jsonl)
+- SESSION_PARTITION_PREMAKE_HOURS: Partições horárias de sessoes criadas à frente (padrão: 48)
+- SESSION_PARTITION_RETENTION_HOURS: Horas após o fim de uma partição até removê-la (padrão: 1)
+- ACCESS_LOG_MODE: exato ou agregado, este requer a migração 0003 (padrão: exato)
+- ACCESS_LOG_WINDOW_SECONDS: Janela de agregação de tentativas repetidas (padrão: 60)
+- ACCESS_LOG_SUCCESS_SAMPLE_RATE: Fração de logins bem-sucedidos repetidos gravados exatos (padrão: 1.0)
+- ACCESS_LOG_MAX_KEYS: Janelas de agregação abertas por worker (padrão: 50000)
+- ACCESS_LOG_FLUSH_SECONDS: Intervalo de gravação das janelas vencidas (padrão: 5)
+- LAST_ACCESS_TRACKING: Grava usuarios.ultimo_acesso em lote, requer a migração 0005 (padrão: False)
+- LAST_ACCESS_FLUSH_SECONDS: Intervalo entre os UPDATEs em lote do último acesso (padrão: 30)
+- LAST_ACCESS_PRECISION_SECONDS: Diferença mínima para reescrever ultimo_acesso (padrão: 60)
+- FAULTS_ENABLED: Permite injeção de latência/falhas (faults.py) (padrão: False)
+- FAULTS_SPEC: Regras iniciais de injeção em JSON (padrão: nenhuma)
+- FAULTS_DEFAULT_SECONDS: Expiração das regras aplicadas por /debug/falhas (padrão: 300)
+- CONFIG_RELOAD_INTERVAL_SECONDS: Verificação do .env para recarga a quente, 0 = só SIGHUP (padrão: 5)
+- LOG_LEVEL: Nível mínimo de log (padrão: INFO)
+- LOG_QUEUE_SIZE: Capacidade da fila de logs; excedente é descartado (padrão: 10000)
+- LOG_RATE_LIMIT_BURST: Repetições de uma mesma mensagem por janela (padrão: 5)
+- LOG_RATE_LIMIT_WINDOW_SECONDS: Janela do limite de repetições (padrão: 10)
+
+Variáveis do ambiente do processo têm precedência sobre o .env. Os
+valores podem ser recarregados sem reiniciar os workers (config_reload.py):
+leia sempre Config.X no momento do uso, sem copiar para outra variável.
 
 Uso:
     from config import Config
@@ -23,15 +69,20 @@ Uso:
 """
 
 import os
-from dotenv import load_dotenv
+from dotenv import load_dotenv, find_dotenv
+
+# Definidas antes do .env: não são sobrescritas por ele (nem na recarga)
+VARIAVEIS_DO_PROCESSO = frozenset(os.environ)
+ARQUIVO_ENV = find_dotenv()
 
 # Carrega variáveis do arquivo .env para os.environ
-load_dotenv()
+load_dotenv(ARQUIVO_ENV)
 
 class Config:
     """
     Classe de configuração que centraliza todas as variáveis de ambiente.
-    Todas as propriedades são carregadas na inicialização da aplicação.
+    Todas as propriedades são carregadas na inicialização da aplicação e
+    trocadas pela recarga a quente (config_reload.py).
     """
     
     # Configurações do Banco de Dados PostgreSQL
@@ -40,10 +91,109 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'auth_db')        # Usuário do banco
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'Senha123456')  # Senha do banco
     DB_NAME = os.getenv('DB_NAME', 'auth_db')        # Nome do banco de dados
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 3))              # Segundos para conectar
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 5000))  # Limite por comando SQL
+    
+    # Pools e Réplicas de Leitura (pools.py)
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 5))                          # Conexões por processo
+    DB_REPLICA_HOSTS = os.getenv('DB_REPLICA_HOSTS', '')                    # Vazio = sem réplicas
+    DB_REPLICA_POOL_MAX = int(os.getenv('DB_REPLICA_POOL_MAX', 5))          # Conexões por réplica
+    REPLICA_SELECTION = os.getenv('REPLICA_SELECTION', 'round_robin')       # round_robin | least_loaded
+    REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))      # Atraso máximo aceito
+    REPLICA_LAG_CHECK_SECONDS = float(os.getenv('REPLICA_LAG_CHECK_SECONDS', 1))  # Cache da medição
+    REPLICA_MISS_FALLBACK = os.getenv('REPLICA_MISS_FALLBACK', 'True').lower() in ('1', 'true', 'yes')
+    
+    # Circuit Breaker do Banco (circuit_breaker.py)
+    CB_FAILURE_THRESHOLD = int(os.getenv('CB_FAILURE_THRESHOLD', 5))  # Falhas consecutivas para abrir
+    CB_OPEN_SECONDS = float(os.getenv('CB_OPEN_SECONDS', 10))         # Intervalo entre sondagens
     
     # Configurações de Segurança
     JWT_SECRET = os.getenv('JWT_SECRET')  # Chave secreta para JWT - OBRIGATÓRIA
+    JWT_SECRET_PREVIOUS = os.getenv('JWT_SECRET_PREVIOUS', '')  # Aceitos só no verify (rotação)
     
     # Configurações da Aplicação
     DEBUG = os.getenv('DEBUG', False)     # Modo debug (True/False)
     PORT = int(os.getenv('PORT', 3000))   # Porta onde a aplicação vai rodar
+    CORS_ORIGINS = [o.strip() for o in os.getenv(
+        'CORS_ORIGINS', 'https://login-interface.znh7ry.easypanel.host,http://localhost:3000').split(',') if o.strip()]
+    CORS_MAX_AGE_SECONDS = int(os.getenv('CORS_MAX_AGE_SECONDS', 7200))            # Cache do preflight no navegador
+    LOGIN_SINGLEFLIGHT = os.getenv('LOGIN_SINGLEFLIGHT', 'True').lower() in ('1', 'true', 'yes')  # Coalescer logins idênticos
+    LOGIN_SINGLEFLIGHT_TIMEOUT_SECONDS = float(os.getenv('LOGIN_SINGLEFLIGHT_TIMEOUT_SECONDS', 10))  # Espera dos seguidores
+    
+    # Gunicorn (gunicorn.conf.py)
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 2))                          # Workers
+    GUNICORN_PRELOAD = os.getenv('GUNICORN_PRELOAD', 'True').lower() in ('1', 'true', 'yes')  # Aquecer no master
+    GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 4))                        # Threads por worker (gthread)
+    
+    # Prazo por Requisição (deadline.py)
+    DEADLINE_ROUTES_MS = os.getenv('DEADLINE_ROUTES_MS', 'api.login=3000,api.verify=1000,api.health_db=2000')  # endpoint=ms
+    DEADLINE_DEFAULT_MS = float(os.getenv('DEADLINE_DEFAULT_MS', 10000))            # Demais rotas (0 = sem prazo)
+    DEADLINE_HEADER = os.getenv('DEADLINE_HEADER', 'X-Request-Timeout-Ms')          # Cliente pode encurtar o prazo
+    DEADLINE_MIN_STATEMENT_MS = float(os.getenv('DEADLINE_MIN_STATEMENT_MS', 5))    # Abaixo disso não executa
+    DEADLINE_LOG_RESERVE_MS = float(os.getenv('DEADLINE_LOG_RESERVE_MS', 50))       # Pula log_access abaixo disso
+    
+    # Controle de Admissão do Login (admission.py)
+    ADMISSION_RESERVED_THREADS = int(os.getenv('ADMISSION_RESERVED_THREADS', 1))    # Threads do worker fora do alcance do login
+    ADMISSION_MAX_CONCURRENCY = int(os.getenv('ADMISSION_MAX_CONCURRENCY',
+                                              max(1, GUNICORN_THREADS - ADMISSION_RESERVED_THREADS)))  # Teto do limite adaptativo
+    ADMISSION_MIN_CONCURRENCY = int(os.getenv('ADMISSION_MIN_CONCURRENCY', 1))      # Piso do limite adaptativo
+    ADMISSION_TARGET_LATENCY_MS = float(os.getenv('ADMISSION_TARGET_LATENCY_MS', 1000))  # Acima disso o limite cai
+    ADMISSION_DECREASE_FACTOR = float(os.getenv('ADMISSION_DECREASE_FACTOR', 0.9))  # Redução multiplicativa
+    ADMISSION_QUEUE_TIMEOUT_MS = float(os.getenv('ADMISSION_QUEUE_TIMEOUT_MS', 2000))  # Espera máxima por vaga
+    ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', GUNICORN_THREADS))   # Esperando (também limitado pelas threads livres)
+    
+    # Configurações das Migrações (migrate.py)
+    MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv('MIGRATION_LOCK_TIMEOUT_MS', 2000))      # Espera máxima por locks de DDL
+    MIGRATION_STATEMENT_TIMEOUT_MS = int(os.getenv('MIGRATION_STATEMENT_TIMEOUT_MS', 0))  # 0 = sem limite
+    MIGRATION_DDL_RETRIES = int(os.getenv('MIGRATION_DDL_RETRIES', 5))                 # Novas tentativas de DDL
+    
+    # Configurações dos Rollups de Acesso (rollup_acessos.py)
+    ROLLUP_LAG_SECONDS = int(os.getenv('ROLLUP_LAG_SECONDS', 60))                  # Espera por commits tardios
+    ROLLUP_BATCH_SIZE = int(os.getenv('ROLLUP_BATCH_SIZE', 50000))                 # Registros por lote
+    ROLLUP_MINUTE_RETENTION_HOURS = int(os.getenv('ROLLUP_MINUTE_RETENTION_HOURS', 48))  # Retenção por minuto
+    
+    # Gravação Write-Behind de Sessões (session_writer.py)
+    SESSION_WRITE_MODE = os.getenv('SESSION_WRITE_MODE', 'async')                   # sync | async | async_spill
+    SESSION_QUEUE_SIZE = int(os.getenv('SESSION_QUEUE_SIZE', 10000))                # Sessões pendentes
+    SESSION_BATCH_SIZE = int(os.getenv('SESSION_BATCH_SIZE', 200))                  # Sessões por INSERT
+    SESSION_FLUSH_INTERVAL_MS = int(os.getenv('SESSION_FLUSH_INTERVAL_MS', 50))     # Espera do lote
+    SESSION_MAX_RETRIES = int(os.getenv('SESSION_MAX_RETRIES', 5))                  # Novas tentativas
+    SESSION_SPILL_FILE = os.getenv('SESSION_SPILL_FILE', 'sessoes_pendentes.jsonl')  # Spill em disco
+    SESSION_PARTITION_PREMAKE_HOURS = int(os.getenv('SESSION_PARTITION_PREMAKE_HOURS', 48))     # Partições à frente (manutencao_sessoes.py)
+    SESSION_PARTITION_RETENTION_HOURS = int(os.getenv('SESSION_PARTITION_RETENTION_HOURS', 1))  # Espera antes do DROP
+    
+    # Registro de Acessos Agregado (access_aggregator.py)
+    ACCESS_LOG_MODE = os.getenv('ACCESS_LOG_MODE', 'exato')                         # exato | agregado (migração 0003)
+    ACCESS_LOG_WINDOW_SECONDS = float(os.getenv('ACCESS_LOG_WINDOW_SECONDS', 60))   # Janela por chave
+    ACCESS_LOG_SUCCESS_SAMPLE_RATE = float(os.getenv('ACCESS_LOG_SUCCESS_SAMPLE_RATE', 1.0))  # Sucessos repetidos gravados exatos
+    ACCESS_LOG_MAX_KEYS = int(os.getenv('ACCESS_LOG_MAX_KEYS', 50000))              # Janelas abertas por worker
+    ACCESS_LOG_FLUSH_SECONDS = float(os.getenv('ACCESS_LOG_FLUSH_SECONDS', 5))      # Gravação das janelas vencidas
+    
+    # Último Acesso em Lote (last_access.py)
+    LAST_ACCESS_TRACKING = os.getenv('LAST_ACCESS_TRACKING', 'False').lower() in ('1', 'true', 'yes')  # Requer migração 0005
+    LAST_ACCESS_FLUSH_SECONDS = float(os.getenv('LAST_ACCESS_FLUSH_SECONDS', 30))   # Intervalo entre lotes
+    LAST_ACCESS_PRECISION_SECONDS = float(os.getenv('LAST_ACCESS_PRECISION_SECONDS', 60))  # Não reescreve abaixo disso
+    
+    # Diagnóstico (debug_api.py, profiler.py, memdiag.py, query_stats.py)
+    DEBUG_TOKEN = os.getenv('DEBUG_TOKEN')                                          # Header X-Debug-Token; vazio = /debug desativado
+    PROFILE_ENABLED = os.getenv('PROFILE_ENABLED', 'False').lower() in ('1', 'true', 'yes')  # Amostrar desde o início
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.01))             # Fração de requisições perfiladas
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'perfis')                                # Destino dos .pstats
+    MEMDIAG_TRACEMALLOC_FRAMES = int(os.getenv('MEMDIAG_TRACEMALLOC_FRAMES', 0))    # > 0 inicia tracemalloc com o app (memdiag.py)
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))                          # Consulta lenta (query_stats.py)
+    SLOW_QUERY_EXPLAIN_SAMPLE = float(os.getenv('SLOW_QUERY_EXPLAIN_SAMPLE', 0))    # Fração dos SELECTs lentos com EXPLAIN
+    SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS = float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS', 60))  # Por consulta
+    QUERY_STATS_RESERVOIR = int(os.getenv('QUERY_STATS_RESERVOIR', 1024))           # Amostras p/ percentis
+    MEMDIAG_MAX_SNAPSHOTS = int(os.getenv('MEMDIAG_MAX_SNAPSHOTS', 5))              # Snapshots mantidos em memória
+    FAULTS_ENABLED = os.getenv('FAULTS_ENABLED', 'False').lower() in ('1', 'true', 'yes')  # Injeção de falhas (faults.py)
+    FAULTS_SPEC = os.getenv('FAULTS_SPEC', '')                                      # {"ponto": {regra}} inicial
+    FAULTS_DEFAULT_SECONDS = float(os.getenv('FAULTS_DEFAULT_SECONDS', 300))        # Expiração via /debug (0 = nunca)
+    
+    # Recarga a Quente (config_reload.py)
+    CONFIG_RELOAD_INTERVAL_SECONDS = float(os.getenv('CONFIG_RELOAD_INTERVAL_SECONDS', 5))  # 0 = só SIGHUP/rota
+
+    # Configurações de Logging (app_logging.py)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()                              # DEBUG/INFO/WARNING/ERROR
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))                        # Registros em espera
+    LOG_RATE_LIMIT_BURST = int(os.getenv('LOG_RATE_LIMIT_BURST', 5))                # Repetições permitidas
+    LOG_RATE_LIMIT_WINDOW_SECONDS = float(os.getenv('LOG_RATE_LIMIT_WINDOW_SECONDS', 10))  # Janela em segundos
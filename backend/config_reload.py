@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+config_reload.py - Recarga a Quente da Configuração
+
+Config lia o ambiente uma única vez no import: trocar o JWT_SECRET, o
+tamanho dos pools ou um timeout exigia reiniciar os workers, que voltavam
+frios e derrubavam os logins em andamento. Aqui cada worker relê o .env,
+valida o resultado e troca os valores do Config em execução.
+
+Gatilhos:
+- Arquivo: a cada CONFIG_RELOAD_INTERVAL_SECONDS uma thread compara o
+  conteúdo do .env com o da última carga (0 = desligado)
+- SIGHUP no worker (kill -HUP <pid do worker>). NÃO envie SIGHUP ao
+  master do Gunicorn: lá ele recria todos os workers
+- POST /debug/config/recarregar (X-Debug-Token; rota deste módulo)
+- Worker novo (post_worker_init) confere o arquivo antes de atender: o
+  master com preload guarda a configuração da inicialização
+
+Recarga:
+- O .env é reaplicado em os.environ como na inicialização: variáveis do
+  ambiente do processo continuam com precedência; as que saíram do
+  arquivo são removidas
+- config.py é executado de novo em um módulo à parte (mesmas conversões e
+  padrões) e validado; com erro nada muda, os.environ é restaurado e o
+  erro fica em /debug/config até a próxima alteração do arquivo
+- Os valores alterados são copiados para o Config sob um lock, com
+  JWT_SECRET por último. Cada leitura de Config.X vê o valor antigo ou o
+  novo, nunca um intermediário
+- Estado derivado é ajustado no lugar: pools (tamanho, endereço,
+  credenciais, réplicas, circuit breaker), prazos por rota, limite de
+  admissão, filas de sessões e de logs, nível de log, regras de falhas e
+  funções registradas com ao_recarregar()
+- Variáveis em REINICIO (porta, workers, CORS...) só valem após reiniciar:
+  a mudança é ignorada e listada em "exigem_reinicio"
+
+Rotação do JWT_SECRET sem derrubar sessões:
+    JWT_SECRET=<novo>  JWT_SECRET_PREVIOUS=<antigo>
+  Tokens antigos continuam válidos no /verify até expirarem (24h); depois
+  remova JWT_SECRET_PREVIOUS. Enquanto os workers não recarregaram (até
+  um intervalo), um worker ainda antigo rejeita tokens novos; para evitar
+  até isso, primeiro coloque o novo segredo em JWT_SECRET_PREVIOUS e só
+  depois faça a troca.
+
+Configuração (.env):
+- CONFIG_RELOAD_INTERVAL_SECONDS, JWT_SECRET_PREVIOUS
+"""
+
+import os
+import json
+import signal
+import atexit
+import hashlib
+import logging
+import threading
+import importlib.util
+from datetime import datetime, timezone
+from dotenv import dotenv_values
+from flask import jsonify
+import config
+from config import Config
+from debug_api import debug
+from db import roteador
+from admission import controle_login
+from session_writer import gravador_sessoes
+import app_logging
+import deadline
+import faults
+
+logger = logging.getLogger('config_reload')
+
+# Lidas só na inicialização (Gunicorn, create_app, profiler, tracemalloc)
+REINICIO = frozenset({
+    'PORT', 'DEBUG', 'WEB_CONCURRENCY', 'GUNICORN_THREADS', 'GUNICORN_PRELOAD',
+    'CORS_ORIGINS', 'CORS_MAX_AGE_SECONDS', 'PROFILE_ENABLED', 'MEMDIAG_TRACEMALLOC_FRAMES',
+})
+
+MODOS = {
+    'REPLICA_SELECTION': ('round_robin', 'least_loaded'),
+    'SESSION_WRITE_MODE': ('sync', 'async', 'async_spill'),
+    'ACCESS_LOG_MODE': ('exato', 'agregado'),
+}
+
+def caminho_env():
+    """Arquivo .env encontrado na inicialização (ou backend/.env se não havia)."""
+    return config.ARQUIVO_ENV or os.path.join(os.path.dirname(os.path.abspath(config.__file__)), '.env')
+
+def ler_env(caminho):
+    """
+    Conteúdo do .env.
+
+    Returns:
+        tuple: (assinatura sha256 ou None se não existe, dict nome -> valor)
+    """
+    try:
+        with open(caminho, 'rb') as f:
+            conteudo = f.read()
+    except FileNotFoundError:
+        return None, {}
+    valores = dotenv_values(caminho)
+    return hashlib.sha256(conteudo).hexdigest(), {k: v for k, v in valores.items() if v is not None}
+
+def carregar_candidata():
+    """Executa config.py em um módulo à parte e devolve a classe Config resultante."""
+    spec = importlib.util.spec_from_file_location('config_candidata', config.__file__)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo.Config
+
+def validar(candidata):
+    """
+    Regras que a conversão de tipos do config.py não cobre.
+
+    Returns:
+        list: Mensagens de erro (vazia = válida)
+    """
+    erros = []
+    if not candidata.JWT_SECRET:
+        erros.append('JWT_SECRET é obrigatória')
+    for nome in ('DB_POOL_MAX', 'DB_REPLICA_POOL_MAX', 'ADMISSION_MIN_CONCURRENCY', 'SESSION_QUEUE_SIZE',
+                 'SESSION_BATCH_SIZE', 'LOG_QUEUE_SIZE'):
+        if getattr(candidata, nome) < 1:
+            erros.append(f'{nome} deve ser >= 1')
+    if candidata.ADMISSION_MAX_CONCURRENCY < candidata.ADMISSION_MIN_CONCURRENCY:
+        erros.append('ADMISSION_MAX_CONCURRENCY deve ser >= ADMISSION_MIN_CONCURRENCY')
+    for nome, validos in MODOS.items():
+        if getattr(candidata, nome) not in validos:
+            erros.append(f'{nome} deve ser um de: {", ".join(validos)}')
+    if not isinstance(logging.getLevelName(candidata.LOG_LEVEL), int):
+        erros.append(f'LOG_LEVEL inválido: {candidata.LOG_LEVEL}')
+    for item in candidata.DEADLINE_ROUTES_MS.split(','):
+        _, _, ms = item.partition('=')
+        try:
+            float(ms or 0)
+        except ValueError:
+            erros.append(f'DEADLINE_ROUTES_MS inválido: {item.strip()}')
+    if candidata.FAULTS_SPEC:
+        try:
+            faults.validar(json.loads(candidata.FAULTS_SPEC))
+        except ValueError as e:
+            erros.append(f'FAULTS_SPEC inválido: {e}')
+    return erros
+
+class RecarregadorConfig:
+    """
+    Relê, valida e aplica o .env no processo atual.
+
+    Uso:
+        recarregador = RecarregadorConfig()
+        recarregador.recarregar('manual')   # True se aplicou
+        recarregador.iniciar()              # thread que observa o arquivo
+        recarregador.instalar_sinal()       # SIGHUP (thread principal)
+    """
+
+    def __init__(self):
+        self.caminho = caminho_env()
+        self._assinatura, valores = ler_env(self.caminho)
+        self._do_arquivo = set(valores) - config.VARIAVEIS_DO_PROCESSO
+        self._funcoes = []
+        self._thread = None
+        self._pid = None
+        self._parando = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_thread = threading.Lock()
+        self.versao = 1
+        self.recarregado_em = None
+        self.alteradas = []
+        self.exigem_reinicio = []
+        self.ultimo_erro = None
+        self.falhas = 0
+
+    def ao_recarregar(self, funcao):
+        """Registra funcao() para reajustar estado derivado do Config (decorador)."""
+        self._funcoes.append(funcao)
+        return funcao
+
+    def verificar(self):
+        """Recarrega se o .env mudou desde a última tentativa."""
+        if ler_env(self.caminho)[0] != self._assinatura:
+            self.recarregar('arquivo')
+
+    def recarregar(self, motivo):
+        """
+        Relê o .env, valida e troca os valores alterados do Config.
+
+        Args:
+            motivo (str): Origem da recarga (logs/diagnóstico)
+
+        Returns:
+            bool: True se a configuração foi aplicada
+        """
+        with self._lock:
+            assinatura, valores = ler_env(self.caminho)
+            # Tentativa registrada mesmo com erro: só tenta de novo se o arquivo mudar
+            self._assinatura = assinatura
+            do_arquivo = set(valores) - config.VARIAVEIS_DO_PROCESSO
+            ambiente_anterior = {nome: os.environ.get(nome) for nome in self._do_arquivo | do_arquivo}
+            for nome in self._do_arquivo - do_arquivo:
+                os.environ.pop(nome, None)
+            for nome in do_arquivo:
+                os.environ[nome] = valores[nome]
+
+            try:
+                candidata = carregar_candidata()
+                erros = validar(candidata)
+            except Exception as e:
+                erros = [f'{type(e).__name__}: {e}']
+            if erros:
+                for nome, valor in ambiente_anterior.items():
+                    if valor is None:
+                        os.environ.pop(nome, None)
+                    else:
+                        os.environ[nome] = valor
+                self.ultimo_erro = '; '.join(erros)
+                self.falhas += 1
+                logger.error("Recarga da configuração rejeitada (%s): %s", motivo, self.ultimo_erro)
+                return False
+            self._do_arquivo = do_arquivo
+
+            novos = {nome: valor for nome, valor in vars(candidata).items() if nome.isupper()}
+            alteradas = [nome for nome, valor in novos.items() if getattr(Config, nome, None) != valor]
+            self.exigem_reinicio = sorted(nome for nome in alteradas if nome in REINICIO)
+            aplicar = [nome for nome in alteradas if nome not in REINICIO]
+            # JWT_SECRET por último: JWT_SECRET_PREVIOUS já aceita o antigo quando ele muda
+            for nome in sorted(aplicar, key=lambda n: n == 'JWT_SECRET'):
+                setattr(Config, nome, novos[nome])
+            self._reaplicar(aplicar)
+
+            self.versao += 1
+            self.recarregado_em = datetime.now(timezone.utc).isoformat(timespec='seconds')
+            self.alteradas = sorted(aplicar)
+            self.ultimo_erro = None
+        # Só nomes: valores podem ser segredos
+        logger.warning("Configuração recarregada (%s): %d alteração(ões)", motivo, len(aplicar),
+                       extra={'alteradas': self.alteradas, 'exigem_reinicio': self.exigem_reinicio,
+                              'versao': self.versao})
+        return True
+
+    def _reaplicar(self, alteradas):
+        """Ajusta o estado derivado do Config; uma falha não impede as demais."""
+        funcoes = [roteador.reconfigurar, deadline.reconfigurar, controle_login.reconfigurar,
+                   gravador_sessoes.reconfigurar, app_logging.reconfigurar, self.iniciar]
+        if 'FAULTS_ENABLED' in alteradas or 'FAULTS_SPEC' in alteradas:
+            funcoes.append(self._reconfigurar_falhas)
+        for funcao in funcoes + self._funcoes:
+            try:
+                funcao()
+            except Exception as e:
+                logger.exception("Erro ao reaplicar configuração em %s: %s", funcao.__qualname__, e)
+
+    @staticmethod
+    def _reconfigurar_falhas():
+        if Config.FAULTS_ENABLED and Config.FAULTS_SPEC:
+            faults.configurar(json.loads(Config.FAULTS_SPEC))
+        else:
+            faults.limpar()
+
+    def iniciar(self):
+        """Inicia a thread que observa o .env neste processo (também após fork)."""
+        if Config.CONFIG_RELOAD_INTERVAL_SECONDS <= 0:
+            return
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock_thread:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._parando.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._executar, name='recarga-config', daemon=True)
+            self._thread.start()
+            atexit.register(self.parar)
+
+    def _executar(self):
+        """Loop da thread: confere o arquivo a cada intervalo (0 encerra)."""
+        while Config.CONFIG_RELOAD_INTERVAL_SECONDS > 0 and not self._parando.wait(
+                Config.CONFIG_RELOAD_INTERVAL_SECONDS):
+            try:
+                self.verificar()
+            except Exception as e:
+                logger.exception("Erro ao verificar o arquivo de configuração: %s", e)
+
+    def parar(self, timeout=5.0):
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._parando.set()
+        self._thread.join(timeout)
+
+    def instalar_sinal(self):
+        """SIGHUP recarrega a configuração (chamar na thread principal do worker)."""
+        def recarregar(signum, frame):
+            # Fora do handler de sinal: a recarga usa locks e faz I/O
+            threading.Thread(target=self.recarregar, args=('sinal',), daemon=True).start()
+        signal.signal(signal.SIGHUP, recarregar)
+
+    def resumo(self):
+        """Estado para diagnóstico (sem valores: podem ser segredos)."""
+        return {'pid': os.getpid(), 'arquivo': self.caminho, 'versao': self.versao,
+                'recarregado_em': self.recarregado_em, 'alteradas': self.alteradas,
+                'exigem_reinicio': self.exigem_reinicio, 'ultimo_erro': self.ultimo_erro,
+                'falhas': self.falhas, 'observando': self._thread is not None and self._thread.is_alive()}
+
+# Instância única por processo
+recarregador_config = RecarregadorConfig()
+
+@debug.route('/config', methods=['GET'])
+def config_resumo():
+    return jsonify(recarregador_config.resumo()), 200
+
+@debug.route('/config/recarregar', methods=['POST'])
+def config_recarregar():
+    """Recarrega a configuração neste worker; 422 se a nova for inválida."""
+    aplicada = recarregador_config.recarregar('rota')
+    return jsonify({'sucesso': aplicada, **recarregador_config.resumo()}), 200 if aplicada else 422
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+cors_preflight.py - Preflight CORS Antes do Roteamento do Flask
+
+Todo POST do navegador para /api/auth/login era precedido de um OPTIONS
+que passava pelo roteamento do Flask, pela rota login_options e pelo
+Flask-CORS, e sem Access-Control-Max-Age o navegador repetia o preflight
+a cada login.
+
+Este middleware WSGI responde o preflight direto:
+- Origem comparada com um frozenset montado uma vez (CORS_ORIGINS)
+- Headers da resposta pré-calculados por origem
+- Access-Control-Max-Age = CORS_MAX_AGE_SECONDS, para o navegador
+  reaproveitar o preflight (Chrome limita a 2h, Firefox a 24h)
+
+Requisições que não são preflight (sem Access-Control-Request-Method)
+seguem para o Flask, onde o Flask-CORS adiciona os headers das respostas.
+
+Uso:
+    app.wsgi_app = PreflightCors(app.wsgi_app, Config.CORS_ORIGINS)
+"""
+
+import logging
+
+logger = logging.getLogger('cors_preflight')
+
+METODOS_PADRAO = ('GET', 'POST', 'PUT', 'DELETE', 'OPTIONS')
+HEADERS_PADRAO = ('Content-Type', 'Authorization')
+
+class PreflightCors:
+    """
+    Middleware WSGI que responde preflights CORS sem chamar o Flask.
+
+    Args:
+        wsgi_app: Aplicação WSGI envolvida (app.wsgi_app)
+        origens (iterable): Origens permitidas
+        max_age (int): Segundos de cache do preflight no navegador
+        metodos (iterable), headers (iterable): Permitidos no preflight
+    """
+
+    def __init__(self, wsgi_app, origens, max_age=7200, metodos=METODOS_PADRAO,
+                 headers=HEADERS_PADRAO):
+        self.wsgi_app = wsgi_app
+        self.origens = frozenset(origens)
+        comuns = [
+            ('Access-Control-Allow-Methods', ', '.join(metodos)),
+            ('Access-Control-Allow-Headers', ', '.join(headers)),
+            ('Access-Control-Allow-Credentials', 'true'),
+            ('Access-Control-Max-Age', str(int(max_age))),
+            ('Vary', 'Origin'),
+            ('Content-Length', '0'),
+        ]
+        self._headers = {origem: [('Access-Control-Allow-Origin', origem)] + comuns
+                         for origem in self.origens}
+        # Origem não permitida: sem headers CORS, o navegador bloqueia o POST
+        self._negado = [('Vary', 'Origin'), ('Content-Length', '0')]
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] != 'OPTIONS' or 'HTTP_ACCESS_CONTROL_REQUEST_METHOD' not in environ:
+            return self.wsgi_app(environ, start_response)
+        headers = self._headers.get(environ.get('HTTP_ORIGIN'))
+        if headers is None:
+            logger.warning("Preflight de origem não permitida: %s", environ.get('HTTP_ORIGIN'))
+            headers = self._negado
+        # start_response pode anexar headers: entregar uma cópia
+        start_response('204 No Content', list(headers))
+        return [b'']
@@ -33,7 +33,8 @@ Uso:
 Segurança:
 - NUNCA armazena senhas em texto puro
 - Usa bcrypt com salt automático
-- Valida duplicação de email
+- Valida duplicação de email (case-insensitive)
+- Email normalizado (minúsculo, sem espaços) antes de gravar
 - Prepared statements (proteção SQL injection)
 
 Requisitos:
@@ -45,6 +46,7 @@ Requisitos:
 import bcrypt
 import psycopg2
 from config import Config
+from db import normalizar_email
 
 def hash_password(password):
     """
@@ -78,7 +80,8 @@ def create_user(email, password):
     - INSERT apenas colunas EXISTENTES: email, senha
     - NÃO usa: nome, ativo (não existem no schema real)
     
-    Valida se o email já existe antes de inserir.
+    Valida se o email já existe antes de inserir. O email é normalizado
+    com normalizar_email() para casar com o índice único lower(email).
     Usa prepared statements para prevenir SQL injection.
     Inclui tratamento robusto de exceções com rollback.
     
@@ -93,7 +96,11 @@ def create_user(email, password):
         if create_user('teste@email.com', '123456'):
             print('Usuário criado!')
     """
+    conn = None
     try:
+        # Normalizar email (mesma forma usada no login)
+        email = normalizar_email(email)
+        
         # Gerar hash da senha
         password_hash = hash_password(password)
         print(f"✓ Hash gerado: {password_hash[:30]}...")
@@ -110,7 +117,7 @@ def create_user(email, password):
         cur = conn.cursor()
         
         # Verificar se usuário já existe
-        cur.execute("SELECT id FROM usuarios WHERE email = %s", (email,))
+        cur.execute("SELECT id FROM usuarios WHERE lower(email) = %s", (email,))
         if cur.fetchone():
             print(f"❌ Erro: Usuário com email '{email}' já existe!")
             cur.close()
@@ -10,17 +10,29 @@ Módulo responsável por todas as operações de banco de dados:
 
 Schema do Banco (REAL - Confirmado no banco de produção):
 - usuarios: id, email, senha, criado_em
-  (NÃO possui: nome, ativo, atualizado_em, ultimo_acesso)
+  (NÃO possui: nome, ativo, atualizado_em; ultimo_acesso pela migração 0005)
   
 - sessoes: id, usuario_id, token, endereco_ip, agente_usuario, expirado_em, criado_em
+  (particionada por hora de expirado_em pela migração 0004)
   
 - registros_acesso: id, usuario_id, tipo_evento, endereco_ip, sucesso, mensagem, criado_em
-  (NÃO possui: email)
+  (NÃO possui: email; contagem, primeiro_em, ultimo_em pela migração 0003)
 
 CORREÇÕES APLICADAS:
 - Removido uso de coluna 'nome' em usuarios
 - Removido uso de coluna 'email' em registros_acesso
-- Removido uso de coluna 'ultimo_acesso' em usuarios
+- ultimo_acesso não é mais atualizado a cada login: last_access.py guarda
+  o último login por usuário e grava em lote (update_last_access_batch)
+- Busca de email case-insensitive via índice funcional lower(email)
+- Circuit breaker + connect_timeout/statement_timeout: com o banco lento ou
+  fora do ar as funções falham rápido (BancoIndisponivel) em vez de travar
+- Pools de conexão: leituras em réplicas (DB_REPLICA_HOSTS), escritas no primário
+- Consultas medidas por query_stats.CursorInstrumentado (tempo, consultas
+  lentas, EXPLAIN amostrado, estatísticas em /debug/queries)
+- Prazo por requisição (deadline.py): statement_timeout limitado ao
+  orçamento restante; log_access é pulado com o prazo esgotado
+- Registros de acesso repetidos agregados em lote (log_access_batch,
+  usada por access_aggregator.py)
 - Tratamento robusto de exceções SQL com rollback
 - Apenas colunas existentes são utilizadas
 
@@ -28,20 +40,55 @@ Todas as funções incluem tratamento de exceções e rollback automático
 para prevenir crash do Gunicorn.
 """
 
+import logging
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from config import Config
+from circuit_breaker import BancoIndisponivel
+from pools import criar_roteador, conectar
+from query_stats import CursorInstrumentado
+from deadline import PrazoEsgotado, esgotado
+import faults
+
+logger = logging.getLogger('db')
+
+# Pools do primário e das réplicas (DB_REPLICA_HOSTS); leituras vão às
+# réplicas saudáveis, escritas sempre ao primário
+roteador = criar_roteador()
+
+# Circuit breaker do primário (exposto para app.py)
+circuito = roteador.primario.circuito
+
+def _registrar_erro(pool, e):
+    """
+    Informa ao circuit breaker do pool o resultado de um erro psycopg2.
+
+    Apenas OperationalError (conexão perdida, timeout) indica indisponibilidade;
+    demais erros significam que o banco respondeu.
+    """
+    if isinstance(e, psycopg2.OperationalError):
+        pool.circuito.registrar_falha()
+    else:
+        pool.circuito.registrar_sucesso()
 
 def get_connection():
     """
-    Estabelece conexão com o banco de dados PostgreSQL.
+    Estabelece conexão avulsa (fora do pool) com o banco PostgreSQL primário.
+    
+    Utiliza as configurações definidas em Config para conectar ao banco,
+    com connect_timeout (DB_CONNECT_TIMEOUT) e statement_timeout
+    (DB_STATEMENT_TIMEOUT_MS). Em caso de erro, registra no log, conta a
+    falha no circuit breaker e retorna None.
     
-    Utiliza as configurações definidas em Config para conectar ao banco.
-    Em caso de erro, imprime a mensagem e retorna None.
+    Usada por scripts e diagnósticos; as funções da API usam os pools
+    do roteador.
     
     Returns:
         psycopg2.connection: Objeto de conexão ativa ou None em caso de erro
         
+    Raises:
+        BancoIndisponivel: Circuit breaker aberto (falha imediata, sem conectar)
+        
     Exemplo:
         conn = get_connection()
         if conn:
@@ -49,60 +96,120 @@ def get_connection():
             # executar queries
             conn.close()
     """
+    circuito.antes_da_chamada()
     try:
         # Estabelece conexão usando credenciais do Config
-        conn = psycopg2.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME
+        faults.injetar('conexao', limite_ms=Config.DB_CONNECT_TIMEOUT * 1000)
+        return conectar(Config.DB_HOST, Config.DB_PORT)
+    except psycopg2.Error as e:
+        circuito.registrar_falha()
+        # Limite de taxa do app_logging evita tempestade de logs em quedas do banco
+        logger.error("Erro ao conectar ao banco de dados: %s", e)
+        return None
+
+def normalizar_email(email):
+    """
+    Normaliza email para a forma canônica usada no banco (sem espaços, minúsculo).
+    
+    Deve ser aplicada tanto na escrita (create_user.py) quanto na leitura
+    (login), para que a busca use o índice funcional idx_usuarios_email_lower.
+    
+    Args:
+        email (str): Email como enviado pelo cliente
+        
+    Returns:
+        str: Email normalizado (ou o próprio valor se não for string)
+        
+    Exemplo:
+        normalizar_email('  Teste@Email.COM ')  # 'teste@email.com'
+    """
+    if not isinstance(email, str):
+        return email
+    return email.strip().lower()
+
+def _buscar_usuario(pool, email):
+    """
+    Executa a busca de usuário em um pool específico (primário ou réplica).
+    
+    Raises:
+        BancoIndisponivel: Servidor do pool indisponível
+    """
+    conn = pool.obter()
+    try:
+        cur = CursorInstrumentado(conn.cursor(cursor_factory=RealDictCursor))
+        # SELECT apenas colunas que EXISTEM no banco: id, email, senha, criado_em
+        # NÃO inclui: nome, ativo, atualizado_em (ultimo_acesso não é lido no login)
+        # lower(email) casa exatamente com a expressão do índice funcional
+        cur.execute(
+            "SELECT id, email, senha, criado_em FROM usuarios WHERE lower(email) = %s", 
+            (email,)
         )
-        return conn
+        user = cur.fetchone()
+        cur.close()
+        pool.circuito.registrar_sucesso()
+        return user
+    except psycopg2.OperationalError as e:
+        pool.circuito.registrar_falha()
+        logger.error("Erro ao buscar usuário em %s: %s", pool.nome, e)
+        raise BancoIndisponivel(retry_after=pool.circuito.retry_after()) from e
     except psycopg2.Error as e:
-        # Log do erro (em produção, usar logging adequado)
-        print(f"[ERRO SQL] Erro ao conectar ao banco de dados: {e}")
+        pool.circuito.registrar_sucesso()
+        logger.error("Erro ao buscar usuário: %s", e)
         return None
+    finally:
+        pool.devolver(conn)
 
-def get_user_by_email(email):
+def get_user_by_email(email, ler_do_primario=False):
     """
-    Busca usuário por email.
+    Busca usuário por email (case-insensitive).
     
     CORREÇÃO APLICADA:
     - SELECT apenas colunas EXISTENTES: id, email, senha, criado_em
     - NÃO usa: nome, ativo, atualizado_em, ultimo_acesso (não existem)
     
+    A comparação usa lower(email), servida pelo índice único funcional
+    idx_usuarios_email_lower (ver normalize_emails.py). O parâmetro é
+    normalizado aqui para que chamadores antigos continuem funcionando.
+    
+    Roteamento (pools.py): a consulta vai a uma réplica saudável, exceto
+    se ler_do_primario=True. Réplica indisponível → primário. Com
+    REPLICA_MISS_FALLBACK (padrão), "não encontrado" na réplica é
+    confirmado no primário: usuários são criados por outros processos
+    (create_user.py) e sem isso o login logo após o cadastro daria 401
+    durante o atraso de replicação. Custa uma leitura no primário por
+    email inexistente.
+    
     Args:
         email (str): Email do usuário a ser buscado
+        ler_do_primario (bool): Força leitura no primário
         
     Returns:
         dict: Dicionário com dados do usuário ou None se não encontrado
               Campos retornados: id, email, senha, criado_em
               
+    Raises:
+        BancoIndisponivel: Banco fora do ar/lento (circuito aberto, falha de
+            conexão ou timeout). O login responde 503 em vez de 401, pois
+            não é possível afirmar que o usuário não existe
+              
     Exemplo:
         usuario = get_user_by_email('teste@email.com')
         if usuario:
             print(f"ID: {usuario['id']}, Email: {usuario['email']}")
     """
-    conn = get_connection()
-    if not conn:
-        return None
+    email = normalizar_email(email)
+    pool = roteador.primario if ler_do_primario else roteador.pool_leitura()
+    if pool is roteador.primario:
+        return _buscar_usuario(pool, email)
     try:
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        # SELECT apenas colunas que EXISTEM no banco: id, email, senha, criado_em
-        # NÃO inclui: nome, ativo, atualizado_em, ultimo_acesso
-        cur.execute(
-            "SELECT id, email, senha, criado_em FROM usuarios WHERE email = %s", 
-            (email,)
-        )
-        user = cur.fetchone()
-        cur.close()
-        return user
-    except psycopg2.Error as e:
-        print(f"[ERRO SQL] Erro ao buscar usuário: {e}")
-        return None
-    finally:
-        conn.close()
+        usuario = _buscar_usuario(pool, email)
+    except PrazoEsgotado:
+        raise
+    except BancoIndisponivel:
+        return _buscar_usuario(roteador.primario, email)
+    if usuario is None and Config.REPLICA_MISS_FALLBACK:
+        return _buscar_usuario(roteador.primario, email)
+    return usuario
 
 def create_session(usuario_id, token, ip_address):
     """
@@ -123,11 +230,14 @@ def create_session(usuario_id, token, ip_address):
         if create_session(1, 'jwt_token_aqui', '192.168.1.1'):
             print('Sessão criada!')
     """
-    conn = get_connection()
-    if not conn:
+    # Escritas sempre no primário
+    pool = roteador.primario
+    try:
+        conn = pool.obter()
+    except BancoIndisponivel:
         return False
     try:
-        cur = conn.cursor()
+        cur = CursorInstrumentado(conn.cursor())
         # INSERT na tabela sessoes com expiração de 24 horas
         cur.execute(
             "INSERT INTO sessoes (usuario_id, token, endereco_ip, expirado_em) "
@@ -136,14 +246,75 @@ def create_session(usuario_id, token, ip_address):
         )
         conn.commit()
         cur.close()
+        pool.circuito.registrar_sucesso()
+        return True
+    except psycopg2.Error as e:
+        # Em caso de erro SQL, faz rollback e retorna False
+        _registrar_erro(pool, e)
+        logger.error("Erro ao criar sessão: %s", e)
+        conn.rollback()
+        return False
+    except PrazoEsgotado:
+        logger.warning("Prazo da requisição esgotado ao criar sessão")
+        conn.rollback()
+        return False
+    finally:
+        pool.devolver(conn)
+
+def create_sessions_batch(sessoes):
+    """
+    Cria várias sessões em um único INSERT/commit (gravação write-behind).
+    
+    Usada pelo session_writer.py. O horário de cada sessão é reconstruído
+    no relógio do banco a partir de quantos segundos ela esperou na fila,
+    para que expirado_em continue sendo criação + 24 horas.
+    
+    Nova tentativa de um lote é idempotente (o commit anterior pode ter
+    chegado ao banco mesmo com erro no cliente): sessões cujo token já existe
+    com expirado_em na janela de ±1 hora não são reinseridas. Com sessoes
+    particionada por expirado_em (migração 0004) o UNIQUE é (token,
+    expirado_em) e a janela limita a busca a no máximo três partições.
+    Sessões que já venceram (regravação tardia do spill) são ignoradas:
+    a partição da hora delas pode já ter sido removida.
+    
+    Args:
+        sessoes (list): Tuplas (usuario_id, token, ip_address, espera_segundos)
+        
+    Returns:
+        bool: True se o lote foi gravado, False caso contrário
+    """
+    # Escritas sempre no primário
+    pool = roteador.primario
+    try:
+        conn = pool.obter()
+    except BancoIndisponivel:
+        return False
+    try:
+        cur = CursorInstrumentado(conn.cursor())
+        cur.execute_values(
+            "INSERT INTO sessoes (usuario_id, token, endereco_ip, expirado_em, criado_em) "
+            "SELECT v.usuario_id, v.token, v.endereco_ip, v.criado_em + INTERVAL '24 hours', v.criado_em "
+            "FROM (VALUES %s) AS v (usuario_id, token, endereco_ip, criado_em) "
+            "WHERE v.criado_em + INTERVAL '24 hours' > LOCALTIMESTAMP "
+            "AND NOT EXISTS (SELECT 1 FROM sessoes s WHERE s.token = v.token AND s.expirado_em "
+            "BETWEEN v.criado_em + INTERVAL '23 hours' AND v.criado_em + INTERVAL '25 hours') "
+            "ON CONFLICT DO NOTHING",
+            sessoes,
+            template="(%s::int, %s::varchar, %s::varchar, (NOW() - make_interval(secs => %s))::timestamp)",
+            page_size=len(sessoes) or 1
+        )
+        conn.commit()
+        cur.close()
+        pool.circuito.registrar_sucesso()
         return True
     except psycopg2.Error as e:
         # Em caso de erro SQL, faz rollback e retorna False
-        print(f"[ERRO SQL] Erro ao criar sessão: {e}")
+        _registrar_erro(pool, e)
+        logger.error("Erro ao gravar lote de %d sessões: %s", len(sessoes), e)
         conn.rollback()
         return False
     finally:
-        conn.close()
+        pool.devolver(conn)
 
 def log_access(usuario_id, tipo_evento, ip_address, sucesso, mensagem):
     """
@@ -162,17 +333,25 @@ def log_access(usuario_id, tipo_evento, ip_address, sucesso, mensagem):
         mensagem (str): Mensagem descritiva do evento
         
     Returns:
-        bool: True se registrado com sucesso, False caso contrário
+        bool: True se registrado com sucesso, False caso contrário (inclusive
+              quando pulado por falta de prazo na requisição)
         
     Exemplo:
         log_access(1, 'login', '192.168.1.1', True, 'Login bem-sucedido')
         log_access(None, 'login', '192.168.1.1', False, 'Usuário não encontrado')
     """
-    conn = get_connection()
-    if not conn:
+    # Trabalho não essencial: com o prazo da requisição no fim, não registrar
+    if esgotado(Config.DEADLINE_LOG_RESERVE_MS):
+        logger.warning("Registro de acesso pulado: prazo da requisição esgotado")
+        return False
+    # Escritas sempre no primário
+    pool = roteador.primario
+    try:
+        conn = pool.obter()
+    except BancoIndisponivel:
         return False
     try:
-        cur = conn.cursor()
+        cur = CursorInstrumentado(conn.cursor())
         # INSERT apenas colunas garantidas: usuario_id, tipo_evento, endereco_ip, sucesso, mensagem
         # REMOVE coluna 'email' que NÃO existe em registros_acesso
         cur.execute(
@@ -182,11 +361,126 @@ def log_access(usuario_id, tipo_evento, ip_address, sucesso, mensagem):
         )
         conn.commit()
         cur.close()
+        pool.circuito.registrar_sucesso()
+        return True
+    except psycopg2.Error as e:
+        # Em caso de erro SQL, faz rollback e retorna False
+        _registrar_erro(pool, e)
+        logger.error("Erro ao registrar acesso: %s", e)
+        conn.rollback()
+        return False
+    except PrazoEsgotado:
+        logger.warning("Prazo da requisição esgotado ao registrar acesso")
+        conn.rollback()
+        return False
+    finally:
+        pool.devolver(conn)
+
+def log_access_batch(registros):
+    """
+    Grava registros de acesso agregados em um único INSERT/commit.
+    
+    Usada por access_aggregator.py (modo agregado, migração 0003): cada
+    registro representa `contagem` tentativas repetidas. Os horários são
+    reconstruídos no relógio do banco a partir de há quantos segundos a
+    primeira e a última tentativa aconteceram; criado_em é o momento da
+    gravação (mantém a marca d'água de rollup_acessos.py consistente) e
+    os rollups contam a linha no minuto de primeiro_em.
+    
+    Args:
+        registros (list): Tuplas (usuario_id, tipo_evento, ip_address, sucesso,
+                          mensagem, contagem, segundos_desde_primeiro, segundos_desde_ultimo)
+        
+    Returns:
+        bool: True se o lote foi gravado, False caso contrário
+    """
+    # Escritas sempre no primário
+    pool = roteador.primario
+    try:
+        conn = pool.obter()
+    except BancoIndisponivel:
+        return False
+    try:
+        cur = CursorInstrumentado(conn.cursor())
+        cur.execute_values(
+            "INSERT INTO registros_acesso (usuario_id, tipo_evento, endereco_ip, sucesso, mensagem, "
+            "contagem, primeiro_em, ultimo_em) VALUES %s",
+            registros,
+            template="(%s, %s, %s, %s, %s, %s, NOW() - make_interval(secs => %s), "
+                     "NOW() - make_interval(secs => %s))",
+            page_size=len(registros) or 1
+        )
+        conn.commit()
+        cur.close()
+        pool.circuito.registrar_sucesso()
         return True
     except psycopg2.Error as e:
         # Em caso de erro SQL, faz rollback e retorna False
-        print(f"[ERRO SQL] Erro ao registrar acesso: {e}")
+        _registrar_erro(pool, e)
+        logger.error("Erro ao gravar lote de %d registros de acesso agregados: %s", len(registros), e)
         conn.rollback()
         return False
     finally:
-        conn.close()
+        pool.devolver(conn)
+
+def update_last_access_batch(acessos, precisao_segundos=0.0):
+    """
+    Atualiza o último acesso de vários usuários em um único UPDATE/commit.
+    
+    Usada por last_access.py, que junta os logins em memória e envia só o
+    mais recente de cada usuário. Os horários são reconstruídos no relógio
+    do banco a partir de há quantos segundos o login aconteceu. Linhas cujo
+    valor gravado já está a menos de `precisao_segundos` do novo não são
+    reescritas (evita versões mortas de usuarios), nem valores mais antigos
+    que o gravado (outro worker pode ter gravado depois).
+    
+    Args:
+        acessos (list): Tuplas (usuario_id, segundos_desde_o_login)
+        precisao_segundos (float): Diferença mínima para reescrever o valor
+        
+    Returns:
+        bool: True se o lote foi gravado, False caso contrário
+    """
+    # Escritas sempre no primário
+    pool = roteador.primario
+    try:
+        conn = pool.obter()
+    except BancoIndisponivel:
+        return False
+    try:
+        cur = CursorInstrumentado(conn.cursor())
+        cur.execute_values(
+            "UPDATE usuarios AS u SET ultimo_acesso = v.ultimo_acesso "
+            "FROM (VALUES %s) AS v (id, ultimo_acesso) "
+            "WHERE u.id = v.id AND (u.ultimo_acesso IS NULL "
+            f"OR u.ultimo_acesso < v.ultimo_acesso - make_interval(secs => {float(precisao_segundos)}))",
+            acessos,
+            template="(%s::int, (NOW() - make_interval(secs => %s))::timestamp)",
+            page_size=len(acessos) or 1
+        )
+        conn.commit()
+        cur.close()
+        pool.circuito.registrar_sucesso()
+        return True
+    except psycopg2.Error as e:
+        # Em caso de erro SQL, faz rollback e retorna False
+        _registrar_erro(pool, e)
+        logger.error("Erro ao atualizar último acesso de %d usuário(s): %s", len(acessos), e)
+        conn.rollback()
+        return False
+    finally:
+        pool.devolver(conn)
+
+def update_last_access(usuario_id):
+    """
+    Atualiza o último acesso de um usuário imediatamente.
+    
+    Para scripts e testes; o login usa last_access.py (gravação em lote).
+    
+    Args:
+        usuario_id (int): ID do usuário
+        
+    Returns:
+        bool: True se gravado, False caso contrário
+    """
+    return update_last_access_batch([(usuario_id, 0.0)])
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+deadline.py - Prazo por Requisição Propagado até o PostgreSQL
+
+O login não tinha orçamento de tempo: um SELECT em usuarios ou INSERT em
+sessoes lento segurava o worker até o timeout do banco mesmo depois de o
+cliente desistir. Cada requisição agora recebe um prazo:
+
+- Por rota (DEADLINE_ROUTES_MS, ex.: "api.login=3000,api.verify=1000"),
+  senão DEADLINE_DEFAULT_MS
+- O cliente pode ENCURTAR o prazo com o header DEADLINE_HEADER
+  (padrão X-Request-Timeout-Ms); nunca alongar
+- Guardado em contextvar: vale para a thread da requisição e não vaza
+  para as threads de segundo plano (gravador de sessões, logging)
+
+Quem consome:
+- query_stats.CursorInstrumentado: antes de cada execute, se o restante
+  é menor que DB_STATEMENT_TIMEOUT_MS, envia "SET LOCAL statement_timeout"
+  junto com a consulta (mesmo round-trip); sem orçamento, nem executa.
+  Cancelamento causado pelo prazo vira PrazoEsgotado e NÃO conta como
+  falha no circuit breaker (o banco não está indisponível)
+- admission.py: a espera por vaga não passa do prazo
+- db.log_access: trabalho não essencial, pulado com o prazo esgotado
+
+Uso:
+    iniciar('api.login', request.headers.get(Config.DEADLINE_HEADER))
+    restante_ms()         # None sem prazo
+    esgotado()
+"""
+
+import math
+import time
+import contextvars
+from config import Config
+from circuit_breaker import BancoIndisponivel
+
+# Instante (time.monotonic) em que a requisição atual expira
+_prazo = contextvars.ContextVar('prazo_requisicao', default=None)
+
+class PrazoEsgotado(BancoIndisponivel):
+    """Prazo da requisição esgotado antes ou durante uma consulta (responder 503)."""
+
+    def __init__(self, mensagem='Prazo da requisição esgotado'):
+        super().__init__(mensagem, retry_after=1)
+
+def _prazos_por_rota():
+    prazos = {}
+    for item in Config.DEADLINE_ROUTES_MS.split(','):
+        rota, _, ms = item.partition('=')
+        if rota.strip() and ms.strip():
+            prazos[rota.strip()] = float(ms)
+    return prazos
+
+_PRAZOS_ROTA = _prazos_por_rota()
+
+def reconfigurar():
+    """Relê DEADLINE_ROUTES_MS (recarga a quente, config_reload.py)."""
+    global _PRAZOS_ROTA
+    _PRAZOS_ROTA = _prazos_por_rota()
+
+def iniciar(endpoint, cabecalho=None):
+    """
+    Define o prazo da requisição atual.
+
+    O header só encurta: valor <= 0 deixa o prazo já esgotado e valores
+    não numéricos ou não finitos (nan, inf) são ignorados. Em rota sem
+    prazo (0), um header válido passa a ser o prazo.
+
+    Args:
+        endpoint (str): request.endpoint (ex.: 'api.login')
+        cabecalho (str): Valor do header do cliente em ms (opcional)
+    """
+    ms = _PRAZOS_ROTA.get(endpoint, Config.DEADLINE_DEFAULT_MS)
+    prazo = time.monotonic() + ms / 1000 if ms > 0 else None
+    if cabecalho:
+        try:
+            cliente = float(cabecalho)
+        except ValueError:
+            cliente = math.nan
+        if math.isfinite(cliente):
+            limite = time.monotonic() + max(0.0, cliente) / 1000
+            prazo = limite if prazo is None else min(prazo, limite)
+    _prazo.set(prazo)
+
+def limpar():
+    _prazo.set(None)
+
+def restante_ms():
+    """Milissegundos restantes (pode ser negativo) ou None sem prazo."""
+    prazo = _prazo.get()
+    if prazo is None:
+        return None
+    return (prazo - time.monotonic()) * 1000
+
+def esgotado(reserva_ms=0):
+    """True se restam menos de `reserva_ms` (ou nada) do prazo."""
+    restante = restante_ms()
+    return restante is not None and restante <= reserva_ms
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+debug_api.py - Endpoints de Diagnóstico Protegidos
+
+Blueprint '/debug' para ferramentas de diagnóstico dos workers (profiler,
+memória, consultas, injeção de falhas). Toda requisição precisa do header X-Debug-Token igual
+a DEBUG_TOKEN; sem DEBUG_TOKEN configurado os endpoints respondem 404,
+como se não existissem.
+
+Cada worker responde apenas pelo próprio processo: o "pid" das respostas
+indica qual worker atendeu.
+
+Uso:
+    curl -H "X-Debug-Token: $DEBUG_TOKEN" http://localhost:3000/debug/profile
+"""
+
+import os
+import hmac
+from flask import Blueprint, request, jsonify, abort
+from config import Config
+import query_stats
+import faults
+
+debug = Blueprint('debug', __name__, url_prefix='/debug')
+
+@debug.before_request
+def exigir_token():
+    """Rejeita requisições sem o token de diagnóstico."""
+    if not Config.DEBUG_TOKEN:
+        abort(404)
+    token = request.headers.get('X-Debug-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), Config.DEBUG_TOKEN.encode('utf-8')):
+        return jsonify({'sucesso': False, 'mensagem': 'Token de diagnóstico inválido'}), 403
+
+def parametro_numero(nome, padrao, minimo, maximo, tipo=float):
+    """Lê um parâmetro numérico da query string limitado a [minimo, maximo]."""
+    try:
+        valor = tipo(request.args.get(nome, padrao))
+    except (TypeError, ValueError):
+        valor = padrao
+    return min(max(valor, minimo), maximo)
+
+@debug.route('/queries', methods=['GET'])
+def queries_resumo():
+    """Estatísticas por consulta SQL (query_stats.py)."""
+    return jsonify(query_stats.resumo(limite=parametro_numero('limite', 50, 1, 500, int))), 200
+
+@debug.route('/queries', methods=['DELETE'])
+def queries_zerar():
+    query_stats.zerar()
+    return jsonify({'pid': os.getpid(), 'zerado': True}), 200
+
+@debug.route('/falhas', methods=['GET'])
+def falhas_resumo():
+    """Regras de injeção de falhas ativas neste worker (faults.py)."""
+    return jsonify(faults.resumo()), 200
+
+@debug.route('/falhas', methods=['PUT'])
+def falhas_configurar():
+    """Troca as regras; expiram após ?segundos= (padrão FAULTS_DEFAULT_SECONDS)."""
+    if not Config.FAULTS_ENABLED:
+        return jsonify({'sucesso': False, 'mensagem': 'Injeção de falhas desativada (FAULTS_ENABLED)'}), 403
+    segundos = parametro_numero('segundos', Config.FAULTS_DEFAULT_SECONDS, 0, 86400)
+    try:
+        faults.configurar(request.get_json(silent=True), segundos)
+    except ValueError as e:
+        return jsonify({'sucesso': False, 'mensagem': str(e)}), 400
+    return jsonify(faults.resumo()), 200
+
+@debug.route('/falhas', methods=['DELETE'])
+def falhas_limpar():
+    faults.limpar()
+    faults.zerar_contagem()
+    return jsonify(faults.resumo()), 200
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+export_acessos.py - Exportação de Arquivo Morto via COPY TO STDOUT
+
+Exporta registros_acesso ou sessoes de um intervalo de tempo (criado_em)
+para arquivos CSV compactados (gzip), prontos para armazenamento frio.
+
+Memória constante: cada arquivo é produzido por um único
+COPY (SELECT ...) TO STDOUT, cujo fluxo o psycopg2 repassa em blocos
+direto para o gzip no disco — nenhuma linha passa por listas Python.
+Exportar cem milhões de linhas usa poucos MB de RAM.
+
+Limite fixo: antes da primeira faixa, MAX(id) e NOW() são lidos uma vez
+e gravados na marca d'água (limite_id, limite_em). Faixas e COPY usam
+id <= limite_id e criado_em < limite_em, além do intervalo pedido:
+linhas inseridas durante a exportação não entram em arquivo nenhum.
+Uma retomada reutiliza o mesmo limite.
+
+Colunas: lidas do catálogo (information_schema) na ordem da tabela, de
+modo que registros_acesso exporta contagem/primeiro_em/ultimo_em só
+depois da migração 0003.
+
+Retomável:
+- Cada arquivo cobre uma faixa de ids (--linhas-por-arquivo linhas) e é
+  escrito como .partial, sincronizado (fsync) e renomeado ao final
+- A marca d'água (<tabela>.watermark.json no diretório de saída) só avança
+  depois do arquivo finalizado; uma execução interrompida recomeça do
+  último arquivo completo, com o mesmo nome de arquivo (idempotente)
+
+Remoção opcional (--apagar):
+- Após cada arquivo finalizado, os ids LIDOS DO PRÓPRIO ARQUIVO são
+  apagados em lotes pequenos (--lote-delete) com pausa, sem transações
+  longas. Uma linha da faixa confirmada depois do snapshot do COPY não
+  está no arquivo e por isso não é apagada (fica para a próxima
+  exportação)
+- A marca "apagado_ate" permite retomar remoções interrompidas, a partir
+  dos arquivos já gravados no diretório de saída
+
+Uso:
+    python export_acessos.py --tabela registros_acesso \\
+        --de 2024-01-01 --ate 2024-07-01 --saida /backup/acessos
+    python export_acessos.py --tabela sessoes --de 2024-01-01 --ate 2024-02-01 \\
+        --saida /backup/sessoes --apagar
+
+Formato:
+- CSV com cabeçalho, um arquivo .csv.gz por faixa de ids:
+  <tabela>-<primeiro_id>-<ultimo_id>.csv.gz
+"""
+
+import os
+import re
+import csv
+import sys
+import json
+import gzip
+import time
+import argparse
+import psycopg2
+from psycopg2 import sql
+from config import Config
+
+# sessoes_legado: tabela anterior à migração 0004 (sessões vencidas antes do particionamento)
+TABELAS = ('registros_acesso', 'sessoes', 'sessoes_legado')
+
+# <tabela>-<primeiro_id>-<ultimo_id>.csv.gz
+NOME_ARQUIVO = re.compile(r'^(?P<tabela>\w+)-(?P<de>\d+)-(?P<ate>\d+)\.csv\.gz$')
+
+def conectar():
+    """Abre conexão com o banco usando as credenciais do Config."""
+    return psycopg2.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME
+    )
+
+def caminho_watermark(saida, tabela):
+    return os.path.join(saida, f'{tabela}.watermark.json')
+
+def carregar_watermark(saida, tabela, de, ate):
+    """
+    Lê a marca d'água da exportação anterior para o mesmo intervalo.
+
+    Uma marca de outro intervalo (--de/--ate diferentes) é rejeitada para
+    não misturar exportações.
+    """
+    caminho = caminho_watermark(saida, tabela)
+    if not os.path.exists(caminho):
+        return {'de': de, 'ate': ate, 'limite_id': None, 'limite_em': None,
+                'ultimo_id': 0, 'apagado_ate': 0, 'arquivos': 0, 'linhas': 0}
+    with open(caminho, 'r', encoding='utf-8') as f:
+        estado = json.load(f)
+    if estado['de'] != de or estado['ate'] != ate:
+        raise ValueError(f"Marca d'água em {caminho} é do intervalo {estado['de']}..{estado['ate']}; "
+                         f"use outro diretório de saída ou remova o arquivo")
+    return estado
+
+def salvar_watermark(saida, tabela, estado):
+    """Grava a marca d'água de forma atômica (arquivo temporário + rename)."""
+    caminho = caminho_watermark(saida, tabela)
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+def colunas_tabela(cur, tabela):
+    """Colunas da tabela no catálogo, na ordem de definição."""
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+        ORDER BY ordinal_position
+    """, (tabela,))
+    return [linha[0] for linha in cur.fetchall()]
+
+def fixar_limite(cur, tabela, estado):
+    """
+    Lê MAX(id) e NOW() uma única vez, antes da primeira faixa.
+
+    Execuções retomadas mantêm o limite já gravado na marca d'água.
+    """
+    cur.execute(sql.SQL("SELECT COALESCE(MAX(id), 0), NOW()::timestamp FROM {tabela}").format(
+        tabela=sql.Identifier(tabela)))
+    limite_id, limite_em = cur.fetchone()
+    estado['limite_id'] = limite_id
+    estado['limite_em'] = limite_em.isoformat()
+
+def proxima_faixa(cur, tabela, estado, linhas):
+    """
+    Determina o último id da próxima faixa (até `linhas` linhas do intervalo).
+
+    Returns:
+        int: id final da faixa ou None se não há mais linhas
+    """
+    cur.execute(sql.SQL("""
+        SELECT MAX(id) FROM (
+            SELECT id FROM {tabela}
+            WHERE id > %s AND id <= %s
+              AND criado_em >= %s AND criado_em < %s AND criado_em < %s
+            ORDER BY id
+            LIMIT %s
+        ) faixa
+    """).format(tabela=sql.Identifier(tabela)),
+        (estado['ultimo_id'], estado['limite_id'], estado['de'], estado['ate'], estado['limite_em'], linhas))
+    return cur.fetchone()[0]
+
+def exportar_faixa(conn, tabela, colunas, estado, ate_id, saida, nivel_gzip):
+    """
+    Exporta ids (ultimo_id, ate_id] do intervalo para um arquivo .csv.gz.
+
+    Returns:
+        tuple: (caminho_arquivo, linhas_exportadas)
+    """
+    nome = f"{tabela}-{estado['ultimo_id'] + 1}-{ate_id}.csv.gz"
+    final = os.path.join(saida, nome)
+    parcial = final + '.partial'
+
+    consulta = sql.SQL("""
+        COPY (
+            SELECT {colunas} FROM {tabela}
+            WHERE id > {de_id} AND id <= {ate_id}
+              AND criado_em >= {de} AND criado_em < {ate} AND criado_em < {limite_em}
+            ORDER BY id
+        ) TO STDOUT WITH (FORMAT csv, HEADER true)
+    """).format(
+        colunas=sql.SQL(', ').join(map(sql.Identifier, colunas)),
+        tabela=sql.Identifier(tabela),
+        de_id=sql.Literal(estado['ultimo_id']),
+        ate_id=sql.Literal(ate_id),
+        de=sql.Literal(estado['de']),
+        ate=sql.Literal(estado['ate']),
+        limite_em=sql.Literal(estado['limite_em']),
+    )
+
+    cur = conn.cursor()
+    with open(parcial, 'wb') as bruto:
+        with gzip.GzipFile(fileobj=bruto, mode='wb', compresslevel=nivel_gzip) as arquivo:
+            cur.copy_expert(consulta, arquivo, size=64 * 1024)
+        bruto.flush()
+        os.fsync(bruto.fileno())
+    linhas = cur.rowcount
+    cur.close()
+    # COPY é somente leitura; encerra a transação de leitura
+    conn.rollback()
+
+    os.replace(parcial, final)
+    return final, linhas
+
+def arquivos_exportados(saida, tabela, de_id, ate_id):
+    """Arquivos finalizados de `tabela` com ids em (de_id, ate_id], em ordem."""
+    arquivos = []
+    for nome in os.listdir(saida):
+        encontrado = NOME_ARQUIVO.match(nome)
+        if (encontrado and encontrado['tabela'] == tabela
+                and int(encontrado['ate']) > de_id and int(encontrado['de']) <= ate_id):
+            arquivos.append((int(encontrado['de']), os.path.join(saida, nome)))
+    return [caminho for _, caminho in sorted(arquivos)]
+
+def ids_do_arquivo(arquivo, lote):
+    """Lê a coluna id de um .csv.gz exportado, em listas de até `lote` ids."""
+    with gzip.open(arquivo, 'rt', encoding='utf-8', newline='') as f:
+        leitor = csv.reader(f)
+        coluna = next(leitor).index('id')
+        ids = []
+        for linha in leitor:
+            ids.append(int(linha[coluna]))
+            if len(ids) == lote:
+                yield ids
+                ids = []
+        if ids:
+            yield ids
+
+def apagar_arquivo(conn, tabela, arquivo, lote, pausa):
+    """
+    Apaga em lotes as linhas cujos ids estão no arquivo exportado.
+
+    Só o que foi de fato gravado no arquivo é apagado. Cada lote é uma
+    transação curta; reapagar um arquivo (retomada) não tem efeito nas
+    linhas já removidas.
+
+    Returns:
+        int: Total de linhas apagadas
+    """
+    comando = sql.SQL("DELETE FROM {tabela} WHERE id = ANY(%s)").format(tabela=sql.Identifier(tabela))
+    total = 0
+    cur = conn.cursor()
+    try:
+        for ids in ids_do_arquivo(arquivo, lote):
+            cur.execute(comando, (ids,))
+            total += cur.rowcount
+            conn.commit()
+            if len(ids) == lote:
+                time.sleep(pausa)
+        return total
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Exporta registros antigos via COPY TO STDOUT')
+    parser.add_argument('--tabela', choices=TABELAS, required=True)
+    parser.add_argument('--de', required=True, help='Início do intervalo (criado_em >=), ex.: 2024-01-01')
+    parser.add_argument('--ate', required=True, help='Fim do intervalo (criado_em <), ex.: 2024-07-01')
+    parser.add_argument('--saida', required=True, help='Diretório de destino dos arquivos')
+    parser.add_argument('--linhas-por-arquivo', type=int, default=1_000_000)
+    parser.add_argument('--gzip', type=int, default=6, choices=range(1, 10), metavar='1-9',
+                        help='Nível de compressão gzip (padrão: 6)')
+    parser.add_argument('--apagar', action='store_true', help='Apaga as faixas após exportar')
+    parser.add_argument('--lote-delete', type=int, default=5000)
+    parser.add_argument('--pausa', type=float, default=0.05, help='Segundos entre lotes de DELETE')
+    args = parser.parse_args()
+
+    os.makedirs(args.saida, exist_ok=True)
+    try:
+        estado = carregar_watermark(args.saida, args.tabela, args.de, args.ate)
+    except ValueError as e:
+        print(f'❌ {e}')
+        return 1
+
+    try:
+        conn = conectar()
+    except psycopg2.Error as e:
+        print(f'❌ Erro ao conectar: {e}')
+        return 1
+
+    print('=' * 80)
+    print(f'📦 EXPORTANDO {args.tabela} ({args.de} → {args.ate})')
+    print('=' * 80)
+    if estado['ultimo_id']:
+        print(f"↩️  Retomando após id {estado['ultimo_id']} ({estado['arquivos']} arquivo(s) prontos)")
+
+    inicio = time.monotonic()
+    try:
+        cur = conn.cursor()
+        colunas = colunas_tabela(cur, args.tabela)
+        if not colunas:
+            print(f'❌ Tabela {args.tabela} não existe')
+            return 1
+        if estado.get('limite_id') is None:
+            fixar_limite(cur, args.tabela, estado)
+            conn.rollback()
+            salvar_watermark(args.saida, args.tabela, estado)
+            print(f"📌 Limite: id <= {estado['limite_id']}, criado_em < {estado['limite_em']}")
+
+        # Remoção interrompida de uma execução anterior
+        if args.apagar and estado['apagado_ate'] < estado['ultimo_id']:
+            for arquivo in arquivos_exportados(args.saida, args.tabela,
+                                               estado['apagado_ate'], estado['ultimo_id']):
+                apagar_arquivo(conn, args.tabela, arquivo, args.lote_delete, args.pausa)
+            estado['apagado_ate'] = estado['ultimo_id']
+            salvar_watermark(args.saida, args.tabela, estado)
+
+        while True:
+            ate_id = proxima_faixa(cur, args.tabela, estado, args.linhas_por_arquivo)
+            conn.rollback()
+            if ate_id is None:
+                break
+            arquivo, linhas = exportar_faixa(conn, args.tabela, colunas, estado, ate_id, args.saida, args.gzip)
+            estado['ultimo_id'] = ate_id
+            estado['arquivos'] += 1
+            estado['linhas'] += linhas
+            salvar_watermark(args.saida, args.tabela, estado)
+            print(f'✅ {os.path.basename(arquivo)}: {linhas} linha(s), '
+                  f'{os.path.getsize(arquivo) / 1024 / 1024:.1f} MB')
+
+            if args.apagar:
+                apagadas = apagar_arquivo(conn, args.tabela, arquivo, args.lote_delete, args.pausa)
+                estado['apagado_ate'] = ate_id
+                salvar_watermark(args.saida, args.tabela, estado)
+                print(f'   🗑️  {apagadas} linha(s) apagada(s)')
+        cur.close()
+    except (psycopg2.Error, OSError) as e:
+        print(f'❌ Exportação interrompida: {e}')
+        print("   Execute novamente para retomar da última marca d'água.")
+        return 1
+    finally:
+        conn.close()
+
+    print(f"\n📊 Total: {estado['linhas']} linha(s) em {estado['arquivos']} arquivo(s), "
+          f"{time.monotonic() - inicio:.1f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+faults.py - Injeção de Latência e Falhas (Banco e bcrypt)
+
+Para saber como o serviço se comporta quando o PostgreSQL ganha 200 ms de
+latência ou derruba 5% das conexões, sem esperar um incidente. Três
+pontos de injeção:
+
+- conexao: db.get_connection e PoolBanco.obter (pools.py), antes de
+  conectar/emprestar a conexão
+- consulta: CursorInstrumentado.execute/execute_values (query_stats.py),
+  dentro da medição (aparece em /debug/queries)
+- bcrypt: verificação de senha do login (app.verificar_senha), inclusive
+  o hash fictício de emails inexistentes
+
+Cada ponto aceita uma regra (JSON):
+    {"taxa_latencia": 1.0, "distribuicao": "lognormal", "latencia_ms": 200, "sigma": 0.5,
+     "taxa_erro": 0.01, "taxa_queda": 0.05}
+
+- taxa_latencia + distribuicao: fixa (latencia_ms), uniforme (latencia_ms
+  a latencia_max_ms), exponencial (média latencia_ms) ou lognormal
+  (mediana latencia_ms, desvio sigma em escala log)
+- taxa_erro: conexao/consulta → psycopg2.DatabaseError; bcrypt → ValueError
+  (o mesmo tipo que bcrypt levanta para um hash corrompido)
+- taxa_queda: OperationalError como o de uma conexão recusada (conexao)
+  ou derrubada no meio da consulta (consulta). A conexão real não é
+  fechada: os handlers seguem fazendo rollback e devolvendo-a ao pool
+- Latência acima do limite em vigor espera só até o limite: consulta →
+  QueryCanceled (statement_timeout do prazo da requisição ou
+  DB_STATEMENT_TIMEOUT_MS), conexao → OperationalError (DB_CONNECT_TIMEOUT),
+  como o PostgreSQL/libpq fariam
+
+Controle:
+- FAULTS_ENABLED=False (padrão) desliga tudo: os pontos de injeção custam
+  uma leitura de variável e as rotas recusam novas regras
+- FAULTS_SPEC: regras iniciais ({"consulta": {...}, "bcrypt": {...}})
+- GET/PUT/DELETE /debug/falhas (X-Debug-Token; rotas em debug_api.py):
+  regras trocadas em tempo de execução expiram após FAULTS_DEFAULT_SECONDS
+  (ou ?segundos=N; 0 = sem expiração). Valem só para o worker que atendeu
+  ("pid" da resposta)
+
+Uso:
+    curl -X PUT -H "X-Debug-Token: $DEBUG_TOKEN" -H 'Content-Type: application/json' \\
+        -d '{"consulta": {"taxa_latencia": 1, "latencia_ms": 200}}' \\
+        'http://localhost:3000/debug/falhas?segundos=120'
+"""
+
+import os
+import json
+import math
+import time
+import random
+import logging
+import threading
+import psycopg2
+from psycopg2 import errors
+from config import Config
+
+logger = logging.getLogger('faults')
+
+PONTOS = ('conexao', 'consulta', 'bcrypt')
+DISTRIBUICOES = ('fixa', 'uniforme', 'exponencial', 'lognormal')
+
+class Regra:
+    """Regra de injeção de um ponto, validada na criação."""
+
+    __slots__ = ('taxa_latencia', 'distribuicao', 'latencia_ms', 'latencia_max_ms', 'sigma',
+                 'taxa_erro', 'taxa_queda')
+
+    def __init__(self, especificacao):
+        if not isinstance(especificacao, dict):
+            raise ValueError('regra deve ser um objeto JSON')
+        desconhecidas = set(especificacao) - set(self.__slots__)
+        if desconhecidas:
+            raise ValueError(f'campos desconhecidos: {", ".join(sorted(desconhecidas))}')
+        self.taxa_latencia = self._taxa(especificacao, 'taxa_latencia')
+        self.taxa_erro = self._taxa(especificacao, 'taxa_erro')
+        self.taxa_queda = self._taxa(especificacao, 'taxa_queda')
+        self.distribuicao = especificacao.get('distribuicao', 'fixa')
+        if self.distribuicao not in DISTRIBUICOES:
+            raise ValueError(f'distribuicao deve ser uma de: {", ".join(DISTRIBUICOES)}')
+        self.latencia_ms = float(especificacao.get('latencia_ms', 0))
+        self.latencia_max_ms = float(especificacao.get('latencia_max_ms', self.latencia_ms))
+        self.sigma = float(especificacao.get('sigma', 0.5))
+        if self.latencia_ms < 0 or self.latencia_max_ms < self.latencia_ms or self.sigma < 0:
+            raise ValueError('latências devem ser >= 0, latencia_max_ms >= latencia_ms e sigma >= 0')
+
+    @staticmethod
+    def _taxa(especificacao, nome):
+        taxa = float(especificacao.get(nome, 0))
+        if not 0 <= taxa <= 1:
+            raise ValueError(f'{nome} deve estar entre 0 e 1')
+        return taxa
+
+    def sortear_latencia_ms(self):
+        if self.distribuicao == 'uniforme':
+            return random.uniform(self.latencia_ms, self.latencia_max_ms)
+        if self.distribuicao == 'exponencial':
+            return random.expovariate(1 / self.latencia_ms) if self.latencia_ms else 0.0
+        if self.distribuicao == 'lognormal':
+            return random.lognormvariate(math.log(self.latencia_ms), self.sigma) if self.latencia_ms else 0.0
+        return self.latencia_ms
+
+    def resumo(self):
+        return {nome: getattr(self, nome) for nome in self.__slots__}
+
+# dict ponto -> Regra, ou None (caminho rápido: nada configurado)
+_regras = None
+_expira_em = None
+_contagem = {}
+_lock = threading.Lock()
+
+def _contar(ponto, tipo):
+    with _lock:
+        chave = f'{ponto}.{tipo}'
+        _contagem[chave] = _contagem.get(chave, 0) + 1
+
+def validar(especificacao):
+    """
+    Valida uma especificação {ponto: regra} sem aplicá-la.
+
+    Returns:
+        dict: ponto -> Regra
+
+    Raises:
+        ValueError: Ponto ou regra inválidos
+    """
+    if not isinstance(especificacao, dict):
+        raise ValueError('especificação deve ser um objeto JSON {ponto: regra}')
+    desconhecidos = set(especificacao) - set(PONTOS)
+    if desconhecidos:
+        raise ValueError(f'pontos desconhecidos: {", ".join(sorted(desconhecidos))} '
+                         f'(válidos: {", ".join(PONTOS)})')
+    return {ponto: Regra(regra) for ponto, regra in especificacao.items()}
+
+def configurar(especificacao, segundos=0):
+    """
+    Troca todas as regras (validando antes de aplicar).
+
+    Args:
+        especificacao (dict): ponto -> regra; vazio remove as regras
+        segundos (float): Expiração das regras (0 = sem expiração)
+
+    Raises:
+        ValueError: Ponto ou regra inválidos
+    """
+    global _regras, _expira_em
+    regras = validar(especificacao)
+    _expira_em = time.monotonic() + segundos if segundos > 0 and regras else None
+    _regras = regras or None
+    if regras:
+        logger.warning("Injeção de falhas ativa em %s", ', '.join(sorted(regras)),
+                       extra={'regras': {p: r.resumo() for p, r in regras.items()}, 'segundos': segundos})
+    else:
+        logger.warning("Injeção de falhas desligada")
+
+def limpar():
+    configurar({})
+
+def injetar(ponto, limite_ms=None):
+    """
+    Aplica a regra do ponto (latência, erro ou queda), se houver.
+
+    Args:
+        ponto (str): 'conexao', 'consulta' ou 'bcrypt'
+        limite_ms (float): statement_timeout (consulta) ou connect_timeout
+            (conexao) em vigor; latência maior vira timeout
+    """
+    regras = _regras
+    if regras is None:
+        return
+    if _expira_em is not None and time.monotonic() >= _expira_em:
+        limpar()
+        return
+    regra = regras.get(ponto)
+    if regra is None:
+        return
+
+    if regra.taxa_latencia and random.random() < regra.taxa_latencia:
+        latencia_ms = regra.sortear_latencia_ms()
+        _contar(ponto, 'latencia')
+        if limite_ms is not None and latencia_ms >= limite_ms:
+            time.sleep(max(0.0, limite_ms) / 1000)
+            _contar(ponto, 'timeout')
+            if ponto == 'consulta':
+                raise errors.QueryCanceled('canceling statement due to statement timeout (injetado)')
+            raise psycopg2.OperationalError('timeout expired (injetado)')
+        time.sleep(latencia_ms / 1000)
+
+    if regra.taxa_queda and random.random() < regra.taxa_queda:
+        _contar(ponto, 'queda')
+        raise psycopg2.OperationalError('server closed the connection unexpectedly (injetado)')
+
+    if regra.taxa_erro and random.random() < regra.taxa_erro:
+        _contar(ponto, 'erro')
+        if ponto == 'bcrypt':
+            raise ValueError('Invalid salt (injetado)')
+        raise psycopg2.DatabaseError('erro injetado')
+
+def resumo():
+    """Regras ativas e contagem de injeções neste processo."""
+    regras = _regras or {}
+    with _lock:
+        contagem = dict(sorted(_contagem.items()))
+    return {'pid': os.getpid(), 'habilitado': Config.FAULTS_ENABLED,
+            'regras': {ponto: regra.resumo() for ponto, regra in regras.items()},
+            'expira_em_s': round(_expira_em - time.monotonic(), 1) if _expira_em is not None else None,
+            'injetadas': contagem}
+
+def zerar_contagem():
+    with _lock:
+        _contagem.clear()
+
+if Config.FAULTS_ENABLED and Config.FAULTS_SPEC:
+    configurar(json.loads(Config.FAULTS_SPEC))
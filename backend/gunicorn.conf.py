@@ -0,0 +1,75 @@
+"""
+gunicorn.conf.py - Configuração do Gunicorn
+
+Com preload_app o master importa app.py uma única vez (imports, create_app
+e aquecimento) e os workers são criados por fork já prontos: sobem em
+milissegundos e a primeira requisição não paga imports nem o hash bcrypt.
+
+- when_ready: gc.collect() + gc.freeze() antes do primeiro fork. Objetos
+  congelados não são varridos pelo coletor nos workers, que assim não
+  escrevem nos cabeçalhos desses objetos e as páginas continuam
+  compartilhadas (copy-on-write)
+- post_fork: recria a thread de logging do worker (threads não
+  sobrevivem ao fork); pools de conexão e o gravador de sessões já são
+  recriados sob demanda por pid
+- post_worker_init: loga o tempo do fork até o worker estar pronto,
+  instala o SIGUSR2 do profiler e o SIGHUP da recarga de configuração
+  (depois dos handlers do próprio worker), confere se o .env mudou
+  desde que o master o leu (config_reload.py) e inicia o gravador de
+  sessões, que regrava o spill pendente (session_writer.py)
+- worker_exit: grava as sessões pendentes, as janelas do agregador de
+  acessos e os últimos acessos antes de o worker encerrar
+
+Uso:
+    gunicorn -c gunicorn.conf.py app:app
+"""
+
+import gc
+import time
+import logging
+from config import Config
+
+bind = f"0.0.0.0:{Config.PORT}"
+workers = Config.WEB_CONCURRENCY
+# threads > 1 usa o worker gthread: vários logins por worker (o bcrypt
+# libera o GIL) e a fila do controle de admissão (admission.py)
+threads = Config.GUNICORN_THREADS
+preload_app = Config.GUNICORN_PRELOAD
+
+_fork_em = {}
+
+def when_ready(server):
+    if preload_app:
+        import startup
+        gc.collect()
+        gc.freeze()
+        logging.getLogger('gunicorn.conf').info(
+            "Master pronto", extra={**startup.resumo(), 'objetos_congelados': gc.get_freeze_count()})
+
+def post_fork(server, worker):
+    _fork_em['inicio'] = time.perf_counter()
+    from app_logging import reiniciar_apos_fork
+    reiniciar_apos_fork()
+
+def post_worker_init(worker):
+    from profiler import perfilador
+    from config_reload import recarregador_config
+    from session_writer import gravador_sessoes
+    perfilador.instalar_sinal()
+    recarregador_config.instalar_sinal()
+    recarregador_config.verificar()
+    recarregador_config.iniciar()
+    gravador_sessoes.iniciar()
+    inicio = _fork_em.get('inicio')
+    if inicio is not None:
+        logging.getLogger('gunicorn.conf').info(
+            "Worker pronto", extra={'worker_pid': worker.pid,
+                                    'fork_ate_pronto_ms': round((time.perf_counter() - inicio) * 1000, 2)})
+
+def worker_exit(server, worker):
+    from session_writer import gravador_sessoes
+    from access_aggregator import agregador_acessos
+    from last_access import rastreador_ultimo_acesso
+    gravador_sessoes.parar()
+    agregador_acessos.parar()
+    rastreador_ultimo_acesso.parar()
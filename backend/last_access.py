@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+last_access.py - Último Acesso por Usuário com Gravação em Lote
+
+update_last_access() saiu do login porque um UPDATE em usuarios a cada
+login custava um commit e uma nova versão da linha (WAL, VACUUM) no
+caminho crítico. Aqui o login só anota em memória o horário do último
+login de cada usuário; uma thread em segundo plano grava, a cada
+LAST_ACCESS_FLUSH_SECONDS, apenas o valor mais recente de cada usuário em
+um único UPDATE ... FROM (VALUES ...) (db.update_last_access_batch).
+
+- Mil logins do mesmo usuário no intervalo viram uma linha no lote
+- Valores que mudaram menos de LAST_ACCESS_PRECISION_SECONDS não são
+  reescritos; valores mais antigos que o gravado (outro worker) também não
+- Lote com falha volta para memória e é reenviado no próximo ciclo
+  (mantendo o horário mais recente de cada usuário)
+- Flush no encerramento do worker (atexit / worker_exit do Gunicorn); o
+  que estiver em memória se perde se o processo morrer sem shutdown limpo
+
+Requer a migração 0005 (coluna usuarios.ultimo_acesso). Desligado por
+padrão (LAST_ACCESS_TRACKING).
+
+Configuração (.env):
+- LAST_ACCESS_TRACKING, LAST_ACCESS_FLUSH_SECONDS, LAST_ACCESS_PRECISION_SECONDS
+"""
+
+import os
+import time
+import atexit
+import logging
+import threading
+from flask import jsonify
+from config import Config
+from debug_api import debug
+import db
+
+logger = logging.getLogger('last_access')
+
+class RastreadorUltimoAcesso:
+    """
+    Último login por usuário em memória com thread de gravação periódica.
+
+    Uso:
+        rastreador = RastreadorUltimoAcesso()
+        rastreador.registrar(usuario_id)     # O(1), sem banco
+        rastreador.parar()                   # flush final
+    """
+
+    def __init__(self):
+        self._pendentes = {}
+        self._thread = None
+        self._pid = None
+        self._parando = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_thread = threading.Lock()
+        self.registrados = 0
+        self.gravados = 0
+        self.lotes = 0
+
+    def registrar(self, usuario_id):
+        """Anota o login do usuário agora (não bloqueia nem toca no banco)."""
+        if not Config.LAST_ACCESS_TRACKING:
+            return
+        self._garantir_thread()
+        with self._lock:
+            self._pendentes[usuario_id] = time.time()
+            self.registrados += 1
+
+    def _garantir_thread(self):
+        """Inicia a thread de gravação neste processo (também após fork)."""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock_thread:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Pendências herdadas do master pertencem ao processo pai
+                self._pendentes = {}
+            self._parando.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._executar, name='ultimo-acesso', daemon=True)
+            self._thread.start()
+            atexit.register(self.parar)
+
+    def _executar(self):
+        """Loop da thread: grava as pendências a cada intervalo."""
+        while not self._parando.wait(Config.LAST_ACCESS_FLUSH_SECONDS):
+            self._gravar()
+        self._gravar()
+
+    def _gravar(self):
+        """Troca o dicionário de pendências e grava um lote; falhas voltam para memória."""
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+        if not pendentes:
+            return
+        agora = time.time()
+        lote = [(usuario_id, max(0.0, agora - horario)) for usuario_id, horario in pendentes.items()]
+        if db.update_last_access_batch(lote, Config.LAST_ACCESS_PRECISION_SECONDS):
+            self.gravados += len(lote)
+            self.lotes += 1
+            return
+        with self._lock:
+            for usuario_id, horario in pendentes.items():
+                if self._pendentes.get(usuario_id, 0) < horario:
+                    self._pendentes[usuario_id] = horario
+        logger.warning("Último acesso de %d usuário(s) mantido em memória para nova tentativa", len(lote))
+
+    def parar(self, timeout=10.0):
+        """Grava as pendências e encerra a thread (shutdown do worker)."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._parando.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Rastreador de último acesso não terminou em %.0fs", timeout)
+
+    def resumo(self):
+        """Estado para diagnóstico."""
+        with self._lock:
+            pendentes = len(self._pendentes)
+        return {'ativo': Config.LAST_ACCESS_TRACKING, 'pendentes': pendentes, 'registrados': self.registrados,
+                'gravados': self.gravados, 'lotes': self.lotes}
+
+# Instância única por processo
+rastreador_ultimo_acesso = RastreadorUltimoAcesso()
+
+@debug.route('/ultimo-acesso', methods=['GET'])
+def ultimo_acesso_resumo():
+    return jsonify({'pid': os.getpid(), **rastreador_ultimo_acesso.resumo()}), 200
@@ -5,19 +5,34 @@ list_database.py - Explorador do Banco de Dados
 Script de diagnóstico que lista todas as tabelas do banco, suas estruturas
 e dados armazenados. Útil para debug e inspeção do schema.
 
+Seguro para rodar contra o banco de produção:
+- Contagem ESTIMADA por padrão (pg_class.reltuples), sem SELECT COUNT(*)
+- Contagem exata opcional (--exato) limitada por statement_timeout
+- Amostras lidas por cursor nomeado (server-side), sem trazer a tabela
+- Tabelas inspecionadas em paralelo, cada uma com sua conexão
+- Conexões somente leitura com statement_timeout
+- Nomes de tabela sempre citados com psycopg2.sql.Identifier
+
 Funcionalidades:
 - Lista todas as tabelas do banco
 - Exibe estrutura de cada tabela (colunas, tipos, constraints)
-- Mostra dados armazenados em cada tabela
-- Conta total de registros
+- Mostra amostra dos dados armazenados em cada tabela
+- Total de registros (estimado ou exato)
+- Tamanho da tabela e de cada índice, scans por índice
+- Indicador de bloat (tuplas mortas, último vacuum/analyze)
 
 Uso:
     # Localmente
     python list_database.py
-    
+
     # No EasyPanel/Servidor
     cd /app/backend && python list_database.py
 
+    # Opções
+    python list_database.py --exato --timeout-ms 2000   # COUNT(*) com limite
+    python list_database.py --amostras 0                # sem dados
+    python list_database.py --tabela usuarios --paralelo 1
+
 Requisitos:
 - Variáveis de ambiente configuradas (.env)
 - Acesso ao banco de dados PostgreSQL
@@ -28,116 +43,253 @@ Output:
 - Total de registros por tabela
 """
 
+import io
 import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 # Adiciona path da aplicação para importar Config
 sys.path.append('/app')
 
 from config import Config
 import psycopg2
+from psycopg2 import sql, errors
 from psycopg2.extras import RealDictCursor
 
-def list_all_tables():
+def conectar(timeout_ms):
+    """
+    Abre conexão somente leitura com statement_timeout de sessão.
+
+    Args:
+        timeout_ms (int): Limite por comando (0 = sem limite)
+    """
+    return psycopg2.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME,
+        options=f'-c statement_timeout={timeout_ms} -c default_transaction_read_only=on'
+    )
+
+def formatar_bytes(n):
+    """Formata tamanho em bytes de forma legível (kB, MB, GB)."""
+    for unidade in ('B', 'kB', 'MB', 'GB'):
+        if n < 1024:
+            return f'{n:.0f} {unidade}' if unidade == 'B' else f'{n:.1f} {unidade}'
+        n /= 1024
+    return f'{n:.1f} TB'
+
+def listar_tabelas(cur, filtro=None):
+    """Retorna nomes das tabelas do schema public (opcionalmente uma só)."""
+    cur.execute("""
+        SELECT table_name
+        FROM information_schema.tables
+        WHERE table_schema = 'public' AND table_type = 'BASE TABLE'
+          AND (%s::text IS NULL OR table_name = %s)
+        ORDER BY table_name
+    """, (filtro, filtro))
+    return [row['table_name'] for row in cur.fetchall()]
+
+def inspecionar_tabela(table_name, args):
+    """
+    Inspeciona uma tabela com conexão própria e devolve o texto do relatório.
+
+    Executado em paralelo (ThreadPoolExecutor): conexões psycopg2 não devem
+    ser compartilhadas entre threads, por isso cada tabela abre a sua.
+
+    Returns:
+        str: Relatório formatado da tabela
+    """
+    out = io.StringIO()
+    escrever = lambda texto='': print(texto, file=out)
+
+    try:
+        conn = conectar(args.timeout_ms)
+    except psycopg2.Error as e:
+        return f'❌ {table_name}: erro ao conectar: {e}\n'
+
+    try:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        escrever('─' * 80)
+        escrever(f'📋 Tabela: {table_name.upper()}')
+        escrever('─' * 80)
+
+        # Listar colunas
+        cur.execute("""
+            SELECT
+                column_name,
+                data_type,
+                character_maximum_length,
+                is_nullable,
+                column_default
+            FROM information_schema.columns
+            WHERE table_schema = 'public' AND table_name = %s
+            ORDER BY ordinal_position
+        """, (table_name,))
+        columns = cur.fetchall()
+
+        escrever('\nColunas:')
+        for idx, col in enumerate(columns, 1):
+            col_type = col['data_type']
+            if col['character_maximum_length']:
+                col_type += f"({col['character_maximum_length']})"
+
+            nullable = 'NULL' if col['is_nullable'] == 'YES' else 'NOT NULL'
+            default = f" DEFAULT {col['column_default']}" if col['column_default'] else ''
+
+            escrever(f"  {idx}. {col['column_name']:<20} {col_type:<25} {nullable}{default}")
+
+        # Estimativa, tamanhos e bloat pelo catálogo (não toca nos dados)
+        cur.execute("""
+            SELECT c.reltuples::bigint AS estimativa,
+                   pg_relation_size(c.oid) AS tamanho_tabela,
+                   pg_total_relation_size(c.oid) AS tamanho_total,
+                   pg_indexes_size(c.oid) AS tamanho_indices,
+                   s.n_live_tup, s.n_dead_tup,
+                   s.last_vacuum, s.last_autovacuum, s.last_analyze, s.last_autoanalyze
+            FROM pg_class c
+            LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+            WHERE c.oid = to_regclass(%s)
+        """, (f'public.{table_name}',))
+        stats = cur.fetchone()
+
+        # to_regclass NULL (tabela removida ou renomeada desde a listagem): sem linha
+        if stats is None:
+            escrever(f'\n⚠️  {table_name}: estatísticas indisponíveis')
+        elif stats['estimativa'] < 0:
+            escrever('\n📊 Total de registros (estimado): desconhecido (tabela nunca analisada)')
+        else:
+            escrever(f"\n📊 Total de registros (estimado): ~{stats['estimativa']}")
+
+        count = None
+        if args.exato:
+            try:
+                cur.execute(sql.SQL("SELECT COUNT(*) AS count FROM {}").format(sql.Identifier(table_name)))
+                count = cur.fetchone()['count']
+                escrever(f'📊 Total de registros (exato): {count}')
+            except errors.QueryCanceled:
+                conn.rollback()
+                escrever(f'⏱️  COUNT(*) excedeu {args.timeout_ms} ms, mantendo estimativa')
+
+        if stats is not None:
+            escrever(f"\n💾 Tamanho: tabela {formatar_bytes(stats['tamanho_tabela'])}, "
+                     f"índices {formatar_bytes(stats['tamanho_indices'])}, "
+                     f"total {formatar_bytes(stats['tamanho_total'])}")
+
+            vivas = stats['n_live_tup'] or 0
+            mortas = stats['n_dead_tup'] or 0
+            if vivas + mortas:
+                proporcao = mortas / (vivas + mortas) * 100
+                alerta = ' ⚠️' if proporcao > 20 else ''
+                escrever(f'🧹 Bloat: {mortas} tuplas mortas ({proporcao:.1f}%){alerta}')
+            ultimo_vacuum = max(filter(None, (stats['last_vacuum'], stats['last_autovacuum'])), default=None)
+            ultimo_analyze = max(filter(None, (stats['last_analyze'], stats['last_autoanalyze'])), default=None)
+            escrever(f'   Último vacuum: {ultimo_vacuum or "nunca"} | '
+                     f'último analyze: {ultimo_analyze or "nunca"}')
+
+        cur.execute("""
+            SELECT i.indexrelname AS nome,
+                   pg_relation_size(i.indexrelid) AS tamanho,
+                   i.idx_scan
+            FROM pg_stat_user_indexes i
+            WHERE i.relid = to_regclass(%s)
+            ORDER BY tamanho DESC
+        """, (f'public.{table_name}',))
+        indices = cur.fetchall()
+        if indices:
+            escrever('\n🗂️  Índices:')
+            for ind in indices:
+                sem_uso = ' (nunca usado)' if ind['idx_scan'] == 0 else ''
+                escrever(f"  - {ind['nome']:<35} {formatar_bytes(ind['tamanho']):>10}  "
+                         f"{ind['idx_scan']} scans{sem_uso}")
+
+        # Amostra via cursor nomeado (server-side): só args.amostras linhas trafegam
+        if args.amostras > 0 and count != 0:
+            amostra = conn.cursor(name=f'amostra_{table_name}', cursor_factory=RealDictCursor)
+            amostra.itersize = args.amostras
+            amostra.execute(sql.SQL("SELECT * FROM {}").format(sql.Identifier(table_name)))
+            rows = amostra.fetchmany(args.amostras)
+            amostra.close()
+
+            if rows:
+                escrever(f'\n🔍 Primeiros {len(rows)} registros:')
+            for idx, row in enumerate(rows, 1):
+                escrever(f'\n  Registro {idx}:')
+                for key, value in row.items():
+                    if isinstance(value, str) and len(value) > 60:
+                        value = value[:57] + '...'
+                    escrever(f'    {key}: {value}')
+        escrever()
+        cur.close()
+    except psycopg2.Error as e:
+        escrever(f'❌ Erro ao inspecionar {table_name}: {e}')
+    finally:
+        conn.close()
+
+    return out.getvalue()
+
+def list_all_tables(args=None):
     """
     Lista todas as tabelas do schema 'public' e seus dados.
-    
+
     Para cada tabela, exibe:
     - Nome da tabela
     - Estrutura (colunas, tipos, constraints)
-    - Dados armazenados
-    - Total de registros
-    
+    - Dados armazenados (amostra)
+    - Total de registros (estimado ou exato)
+    - Tamanhos, índices e bloat
+
+    Args:
+        args (argparse.Namespace): Opções da linha de comando (padrões se None)
+
     Returns:
         None: Imprime resultados no console
     """
+    if args is None:
+        args = criar_parser().parse_args([])
+
     try:
-        # Conecta ao banco usando configurações do Config
-        conn = psycopg2.connect(
-            host=Config.DB_HOST,
-            port=Config.DB_PORT,
-            user=Config.DB_USER,
-            password=Config.DB_PASSWORD,
-            database=Config.DB_NAME
-        )
-        
+        conn = conectar(args.timeout_ms)
+
         print('✅ Conectado ao banco de dados\n')
         print('=' * 80)
         print('📊 ESTRUTURA DO BANCO DE DADOS')
         print('=' * 80)
-        
+
         cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Listar todas as tabelas
-        cur.execute("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            ORDER BY table_name
-        """)
-        tables = cur.fetchall()
-        
+        tables = listar_tabelas(cur, args.tabela)
+        cur.close()
+        conn.close()
+
         print(f'\n🗂️  Total de tabelas: {len(tables)}\n')
-        
-        for table in tables:
-            table_name = table['table_name']
-            print('─' * 80)
-            print(f'📋 Tabela: {table_name.upper()}')
-            print('─' * 80)
-            
-            # Listar colunas
-            cur.execute("""
-                SELECT 
-                    column_name,
-                    data_type,
-                    character_maximum_length,
-                    is_nullable,
-                    column_default
-                FROM information_schema.columns
-                WHERE table_name = %s
-                ORDER BY ordinal_position
-            """, (table_name,))
-            columns = cur.fetchall()
-            
-            print('\nColunas:')
-            for idx, col in enumerate(columns, 1):
-                col_type = col['data_type']
-                if col['character_maximum_length']:
-                    col_type += f"({col['character_maximum_length']})"
-                
-                nullable = 'NULL' if col['is_nullable'] == 'YES' else 'NOT NULL'
-                default = f" DEFAULT {col['column_default']}" if col['column_default'] else ''
-                
-                print(f"  {idx}. {col['column_name']:<20} {col_type:<25} {nullable}{default}")
-            
-            # Contar registros
-            cur.execute(f"SELECT COUNT(*) as count FROM {table_name}")
-            count = cur.fetchone()['count']
-            print(f'\n📊 Total de registros: {count}')
-            
-            # Mostrar registros
-            if count > 0:
-                cur.execute(f"SELECT * FROM {table_name} LIMIT 5")
-                rows = cur.fetchall()
-                
-                print(f'\n🔍 Primeiros {len(rows)} registros:')
-                for idx, row in enumerate(rows, 1):
-                    print(f'\n  Registro {idx}:')
-                    for key, value in row.items():
-                        if isinstance(value, str) and len(value) > 60:
-                            value = value[:57] + '...'
-                        print(f'    {key}: {value}')
-            print()
-        
+
+        # Relatórios são gerados em paralelo e impressos na ordem das tabelas
+        with ThreadPoolExecutor(max_workers=max(1, args.paralelo)) as executor:
+            for relatorio in executor.map(lambda t: inspecionar_tabela(t, args), tables):
+                print(relatorio, end='')
+
         print('=' * 80)
         print('✅ Consulta concluída!')
         print('=' * 80)
-        
-        cur.close()
-        conn.close()
-        
+
     except Exception as e:
         print(f'❌ Erro: {e}')
         import traceback
         traceback.print_exc()
 
+def criar_parser():
+    """Define as opções de linha de comando do explorador."""
+    parser = argparse.ArgumentParser(description='Explorador do banco de dados')
+    parser.add_argument('--exato', action='store_true',
+                        help='Executa COUNT(*) exato (limitado por --timeout-ms)')
+    parser.add_argument('--timeout-ms', type=int, default=5000,
+                        help='statement_timeout por comando em ms (padrão: 5000)')
+    parser.add_argument('--amostras', type=int, default=5,
+                        help='Linhas de amostra por tabela (padrão: 5, 0 = nenhuma)')
+    parser.add_argument('--paralelo', type=int, default=4,
+                        help='Tabelas inspecionadas em paralelo (padrão: 4)')
+    parser.add_argument('--tabela', help='Inspeciona apenas esta tabela')
+    return parser
+
 if __name__ == '__main__':
-    list_all_tables()
+    list_all_tables(criar_parser().parse_args())
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+manutencao_sessoes.py - Partições Horárias de sessoes
+
+Com a migração 0004, sessoes é particionada por RANGE (expirado_em), uma
+partição por hora (sessoes_pAAAAMMDDHH). Sessões vencidas não são mais
+apagadas linha a linha: a partição inteira é descartada quando a última
+sessão dela expira, sem DELETE, sem VACUUM e sem inchar os índices. O
+custo de armazenamento fica estável qualquer que seja o volume de logins.
+
+Partição DEFAULT (sessoes_padrao, migração 0006): recebe as sessões de
+horas sem partição própria, de modo que o INSERT do login nunca falha
+por falta de partição, mesmo com a manutenção parada por mais de
+SESSION_PARTITION_PREMAKE_HOURS. Ela deve ficar vazia em operação normal.
+
+Manutenção (rodar de hora em hora, ex.: cron "5 * * * *"):
+- Cria as partições da hora atual até SESSION_PARTITION_PREMAKE_HOURS à
+  frente. Se a DEFAULT já tem sessões da hora (manutenção atrasada),
+  elas são movidas para a nova partição na mesma transação que a anexa
+- Remove as partições cujo intervalo terminou há mais de
+  SESSION_PARTITION_RETENTION_HOURS e apaga da DEFAULT as sessões com o
+  mesmo vencimento. No PostgreSQL 14+ a partição é
+  desanexada com DETACH ... CONCURRENTLY (sem bloquear os INSERTs) antes
+  do DROP; DDL sempre com lock_timeout e novas tentativas (migrate.py)
+
+Poda de partições: consultas precisam filtrar por expirado_em para ler só
+as partições relevantes (ex.: "token válido" com expirado_em > NOW()).
+O comando verificar roda EXPLAIN das consultas de sessoes e confere que
+apenas as partições esperadas aparecem no plano.
+
+Uso:
+    python manutencao_sessoes.py manter        # cria à frente e remove vencidas
+    python manutencao_sessoes.py listar
+    python manutencao_sessoes.py verificar     # EXPLAIN: poda de partições
+
+Configuração (.env):
+- SESSION_PARTITION_PREMAKE_HOURS, SESSION_PARTITION_RETENTION_HOURS
+"""
+
+import sys
+import argparse
+from datetime import datetime, timedelta
+import psycopg2
+from psycopg2 import sql
+from config import Config
+from migrate import Migrador, conectar
+
+PREFIXO = 'sessoes_p'
+PADRAO = 'sessoes_padrao'
+FORMATO_NOME = PREFIXO + '%Y%m%d%H'
+UMA_HORA = timedelta(hours=1)
+
+def particionada(conn):
+    """True se sessoes já é uma tabela particionada (migração 0004)."""
+    cur = conn.cursor()
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('sessoes')")
+    row = cur.fetchone()
+    cur.close()
+    return row is not None and row[0] == 'p'
+
+def agora_banco(conn):
+    """LOCALTIMESTAMP do banco (expirado_em é TIMESTAMP sem fuso)."""
+    cur = conn.cursor()
+    cur.execute("SELECT LOCALTIMESTAMP")
+    agora = cur.fetchone()[0]
+    cur.close()
+    return agora
+
+def listar_particoes(conn, tabela='sessoes'):
+    """
+    Partições horárias de sessoes (ou da tabela nova durante a migração 0004).
+
+    Returns:
+        list: Tuplas (nome, inicio) ordenadas pelo início
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (tabela,))
+    particoes = []
+    for (nome,) in cur.fetchall():
+        try:
+            particoes.append((nome, datetime.strptime(nome, FORMATO_NOME)))
+        except ValueError:
+            continue
+    cur.close()
+    return sorted(particoes, key=lambda p: p[1])
+
+def existe_padrao(conn, tabela='sessoes'):
+    """True se `tabela` tem a partição DEFAULT (migração 0006)."""
+    if tabela != 'sessoes':
+        return False
+    cur = conn.cursor()
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (PADRAO,))
+    existe = cur.fetchone()[0]
+    cur.close()
+    return existe
+
+def _mover_do_padrao(m, nome, de, ate):
+    """
+    Cria a partição `nome` levando as sessões do intervalo que estão na
+    DEFAULT (CREATE ... PARTITION OF falharia com elas lá).
+
+    Tudo numa transação: cria a tabela solta, move as linhas e anexa.
+    """
+    comandos = [
+        sql.SQL("CREATE TABLE {} (LIKE sessoes INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+            sql.Identifier(nome)),
+        sql.SQL("""
+            WITH movidas AS (
+                DELETE FROM {padrao} WHERE expirado_em >= {de} AND expirado_em < {ate} RETURNING *
+            )
+            INSERT INTO {nome} SELECT * FROM movidas
+        """).format(padrao=sql.Identifier(PADRAO), nome=sql.Identifier(nome), de=de, ate=ate),
+        sql.SQL("ALTER TABLE sessoes ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(
+            sql.Identifier(nome), de, ate),
+    ]
+    if m.transacional:
+        for comando in comandos:
+            m.executar(comando, statement_timeout_ms=0)
+        return
+    with m.transacao():
+        for comando in comandos:
+            m.executar(comando, statement_timeout_ms=0)
+
+def criar_particoes(m, horas, tabela='sessoes'):
+    """
+    Cria as partições da hora atual até `horas` à frente (idempotente).
+
+    Args:
+        m (Migrador): Executor com lock_timeout e novas tentativas
+        horas (int): Horas à frente da hora atual
+        tabela (str): Tabela particionada (sessoes_nova durante a migração 0004)
+
+    Returns:
+        list: Nomes das partições criadas
+    """
+    inicio = agora_banco(m.conn).replace(minute=0, second=0, microsecond=0)
+    existentes = {nome for nome, _ in listar_particoes(m.conn, tabela)}
+    padrao = existe_padrao(m.conn, tabela)
+    cur = m.conn.cursor()
+    criadas = []
+    for i in range(horas + 1):
+        hora = inicio + i * UMA_HORA
+        nome = hora.strftime(FORMATO_NOME)
+        if nome in existentes:
+            continue
+        de = sql.Literal(hora.strftime('%Y-%m-%d %H:%M:%S'))
+        ate = sql.Literal((hora + UMA_HORA).strftime('%Y-%m-%d %H:%M:%S'))
+        if padrao:
+            cur.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {} WHERE expirado_em >= {} AND expirado_em < {})").format(
+                sql.Identifier(PADRAO), de, ate))
+            if cur.fetchone()[0]:
+                _mover_do_padrao(m, nome, de, ate)
+                criadas.append(nome)
+                continue
+        m.executar(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM ({}) TO ({})").format(
+            sql.Identifier(nome), sql.Identifier(tabela), de, ate))
+        criadas.append(nome)
+    cur.close()
+    return criadas
+
+def remover_particoes(m, retencao_horas):
+    """
+    Remove as partições cujo intervalo terminou há mais de `retencao_horas`.
+
+    Returns:
+        list: Nomes das partições removidas
+    """
+    limite = agora_banco(m.conn) - timedelta(hours=retencao_horas)
+    concorrente = not m.transacional and m.conn.server_version >= 140000
+    removidas = []
+    for nome, inicio in listar_particoes(m.conn):
+        if inicio + UMA_HORA > limite:
+            break
+        if concorrente:
+            m.executar(sql.SQL("ALTER TABLE sessoes DETACH PARTITION {} CONCURRENTLY").format(
+                sql.Identifier(nome)), statement_timeout_ms=0)
+        m.executar(sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(nome)))
+        removidas.append(nome)
+    if existe_padrao(m.conn):
+        # Mesmo corte das partições: sessões da DEFAULT vencidas antes do limite
+        m.executar(sql.SQL("DELETE FROM {} WHERE expirado_em < %s").format(sql.Identifier(PADRAO)),
+                   (limite,), statement_timeout_ms=0)
+    return removidas
+
+def particoes_no_plano(plano):
+    """
+    Nomes das partições horárias de sessoes lidas por um plano EXPLAIN
+    (FORMAT JSON). A DEFAULT fica de fora: filtros sem limite superior
+    sempre a incluem, e ela deve estar vazia.
+    """
+    nomes = set()
+    pendentes = [plano]
+    while pendentes:
+        no = pendentes.pop()
+        relacao = no.get('Relation Name', '')
+        if relacao.startswith(PREFIXO) and relacao != PADRAO:
+            nomes.add(relacao)
+        pendentes.extend(no.get('Plans', []))
+    return nomes
+
+def verificar_poda(conn):
+    """
+    EXPLAIN das consultas de sessoes comparando as partições do plano com
+    as que o filtro de expirado_em deveria alcançar.
+
+    Returns:
+        list: Tuplas (consulta, lidas, esperadas, total, ok)
+    """
+    agora = agora_banco(conn)
+    particoes = listar_particoes(conn)
+    consultas = [
+        # Validação de token (schema.sql): só partições ainda não vencidas
+        ('token válido', "SELECT 1 FROM sessoes WHERE token = %s AND expirado_em > %s",
+         ('x', agora), agora, None),
+        # Reenvio idempotente de db.create_sessions_batch: janela de 2 horas
+        ('reenvio de lote', "SELECT 1 FROM sessoes WHERE token = %s AND expirado_em BETWEEN %s AND %s",
+         ('x', agora + timedelta(hours=23), agora + timedelta(hours=25)),
+         agora + timedelta(hours=23), agora + timedelta(hours=25)),
+    ]
+    cur = conn.cursor()
+    resultado = []
+    for nome, consulta, params, de, ate in consultas:
+        cur.execute('EXPLAIN (FORMAT JSON) ' + consulta, params)
+        lidas = particoes_no_plano(cur.fetchone()[0][0]['Plan'])
+        esperadas = {p for p, inicio in particoes
+                     if inicio + UMA_HORA > de and (ate is None or inicio <= ate)}
+        resultado.append((nome, len(lidas), len(esperadas), len(particoes), lidas <= esperadas))
+    cur.close()
+    conn.rollback()
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description='Partições horárias da tabela sessoes')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    manter = sub.add_parser('manter', help='Cria partições à frente e remove as vencidas')
+    manter.add_argument('--horas', type=int, default=Config.SESSION_PARTITION_PREMAKE_HOURS)
+    manter.add_argument('--retencao', type=int, default=Config.SESSION_PARTITION_RETENTION_HOURS)
+    sub.add_parser('listar', help='Lista as partições')
+    sub.add_parser('verificar', help='Confere a poda de partições via EXPLAIN')
+    args = parser.parse_args()
+
+    try:
+        conn = conectar()
+    except psycopg2.Error as e:
+        print(f'❌ Erro ao conectar: {e}')
+        return 1
+
+    try:
+        if not particionada(conn):
+            print('❌ sessoes não é particionada: aplique a migração 0004 (python migrate.py up)')
+            return 1
+
+        if args.comando == 'manter':
+            conn.autocommit = True
+            m = Migrador(conn, transacional=False)
+            criadas = criar_particoes(m, args.horas)
+            removidas = remover_particoes(m, args.retencao)
+            print(f'✅ {len(criadas)} partição(ões) criada(s), {len(removidas)} removida(s)')
+            for nome in removidas:
+                print(f'   🗑️  {nome}')
+            return 0
+
+        if args.comando == 'listar':
+            particoes = listar_particoes(conn)
+            cur = conn.cursor()
+            print(f'\n📋 Partições de sessoes ({len(particoes)}):\n')
+            for nome, inicio in particoes:
+                cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(nome)))
+                print(f"  {nome}  {inicio:%Y-%m-%d %H:00} → {inicio + UMA_HORA:%H:00}  {cur.fetchone()[0]:>10} sessão(ões)")
+            if existe_padrao(conn):
+                cur.execute(sql.SQL("SELECT COUNT(*) FROM {}").format(sql.Identifier(PADRAO)))
+                fora = cur.fetchone()[0]
+                print(f"  {PADRAO:<20} DEFAULT           {fora:>10} sessão(ões){' ⚠️  rode manter' if fora else ''}")
+            else:
+                print('  ⚠️  sem partição DEFAULT: aplique a migração 0006 (python migrate.py up)')
+            cur.close()
+            print()
+            return 0
+
+        falhas = 0
+        print('\n🔍 Poda de partições (EXPLAIN):\n')
+        for nome, lidas, esperadas, total, ok in verificar_poda(conn):
+            falhas += not ok
+            print(f"  {'✅' if ok else '❌'} {nome:<18} {lidas} de {total} partições lidas (esperado <= {esperadas})")
+        print()
+        return 1 if falhas else 0
+    except psycopg2.Error as e:
+        print(f'❌ Erro de banco de dados: {e}')
+        return 1
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
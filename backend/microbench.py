@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+microbench.py - Microbenchmarks das Peças do Login e da Verificação
+
+VALIDACAO_FINAL.py só confere trechos de código; nada pegava regressão de
+desempenho. Este script mede isoladamente cada peça de app.login() e
+app.verify() e grava o resultado em JSON, para comparar com uma baseline:
+
+- bcrypt.checkpw com custos 4, 10 e 12 (12 = gensalt() padrão do create_user.py)
+- jwt.encode / jwt.decode com o payload do login (user_id, email, exp)
+- construção das respostas JSON (jsonify do login e resposta_pronta)
+- leitura do header Authorization como em verify()
+- funções de db.py contra um PostgreSQL descartável (pg_local.py), se
+  os binários do PostgreSQL estiverem disponíveis (--sem-banco pula)
+
+Cada medição calibra o número de iterações para ~0,2s, repete N vezes e
+guarda mediana e mínimo por operação (µs). A comparação usa a mediana.
+
+Baselines dependem da máquina: gere e compare sempre no mesmo ambiente.
+
+Uso:
+    python microbench.py executar --saida benchmarks/baseline.json
+    python microbench.py executar --saida /tmp/atual.json --apenas jwt,json
+    python microbench.py comparar benchmarks/baseline.json /tmp/atual.json --limite 0.10
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import statistics
+from datetime import datetime, timedelta
+
+SEGREDO_BENCH = 'microbench-' + 'x' * 32
+
+def medir(funcao, alvo_s=0.2, repeticoes=5):
+    """
+    Mede `funcao()` e retorna estatísticas por chamada em µs.
+
+    Calibra o número de iterações até uma rodada levar >= 20ms e escala
+    para ~alvo_s por repetição.
+    """
+    iteracoes = 1
+    while True:
+        inicio = time.perf_counter()
+        for _ in range(iteracoes):
+            funcao()
+        duracao = time.perf_counter() - inicio
+        if duracao >= 0.02 or iteracoes >= 1 << 22:
+            break
+        iteracoes *= 2
+    iteracoes = max(1, math.ceil(iteracoes * alvo_s / max(duracao, 1e-9)))
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for _ in range(iteracoes):
+            funcao()
+        tempos.append((time.perf_counter() - inicio) / iteracoes * 1e6)
+    return {'mediana_us': round(statistics.median(tempos), 3), 'minimo_us': round(min(tempos), 3),
+            'iteracoes': iteracoes, 'repeticoes': repeticoes}
+
+def benchmarks_bcrypt():
+    import bcrypt
+    senha = b'senha-de-teste-123'
+    casos = {}
+    for custo in (4, 10, 12):
+        hash_senha = bcrypt.hashpw(senha, bcrypt.gensalt(custo))
+        casos[f'bcrypt.checkpw.custo{custo}'] = lambda h=hash_senha: bcrypt.checkpw(senha, h)
+    return casos
+
+def benchmarks_jwt():
+    import jwt
+    payload = {'user_id': 123, 'email': 'usuario@email.com', 'exp': datetime.utcnow() + timedelta(hours=24)}
+    token = jwt.encode(payload, SEGREDO_BENCH, algorithm='HS256')
+    return {
+        'jwt.encode': lambda: jwt.encode(payload, SEGREDO_BENCH, algorithm='HS256'),
+        'jwt.decode': lambda: jwt.decode(token, SEGREDO_BENCH, algorithms=['HS256']),
+    }
+
+def benchmarks_json():
+    import app as modulo_app
+    from flask import jsonify
+    corpo_login = {'sucesso': True, 'mensagem': 'Login realizado com sucesso', 'token': 'x' * 180,
+                   'usuario': {'id': 123, 'email': 'usuario@email.com'}}
+    contexto = modulo_app.app.app_context()
+    contexto.push()
+    return {
+        'json.jsonify_login': lambda: jsonify(corpo_login),
+        'json.resposta_pronta': lambda: modulo_app.resposta_pronta('credenciais_invalidas'),
+    }
+
+def benchmarks_header():
+    header = 'Bearer ' + 'x' * 180
+    return {
+        # Mesma extração de verify()
+        'header.authorization_split': lambda: header.split(' ')[1],
+        'header.authorization_partition': lambda: header.partition(' ')[2],
+    }
+
+def benchmarks_db(cluster):
+    """Funções de db.py contra o cluster local (um usuário de teste)."""
+    import bcrypt
+    import db
+    conn = cluster.conectar()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO usuarios (email, senha) VALUES (%s, %s) RETURNING id",
+                ('bench@teste.local', bcrypt.hashpw(b'x', bcrypt.gensalt(4)).decode('utf-8')))
+    usuario_id = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    contador = iter(range(10 ** 9))
+    return {
+        'db.get_user_by_email': lambda: db.get_user_by_email('bench@teste.local'),
+        'db.get_user_by_email_inexistente': lambda: db.get_user_by_email('nao@teste.local'),
+        'db.log_access': lambda: db.log_access(usuario_id, 'login', '127.0.0.1', False, 'Senha inválida'),
+        'db.create_session': lambda: db.create_session(usuario_id, f'tok-{next(contador)}', '127.0.0.1'),
+        'db.create_sessions_batch_50': lambda: db.create_sessions_batch(
+            [(usuario_id, f'lote-{next(contador)}', '127.0.0.1', 0.0) for _ in range(50)]),
+    }
+
+GRUPOS = ('bcrypt', 'jwt', 'json', 'header', 'db')
+
+def comando_executar(args):
+    grupos = [g.strip() for g in args.apenas.split(',')] if args.apenas else list(GRUPOS)
+    if args.sem_banco and 'db' in grupos:
+        grupos.remove('db')
+
+    cluster = None
+    if 'db' in grupos:
+        import subprocess
+        from pg_local import ClusterLocal
+        cluster = ClusterLocal()
+        try:
+            cluster.iniciar()
+        except (FileNotFoundError, subprocess.CalledProcessError) as e:
+            print(f'⚠️  Benchmarks de banco pulados: {e}')
+            grupos.remove('db')
+            cluster = None
+        else:
+            # Config é lido na importação: apontar para o cluster antes de importar db/app
+            os.environ.update(cluster.variaveis())
+    os.environ.setdefault('JWT_SECRET', SEGREDO_BENCH)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    fabricas = {'bcrypt': benchmarks_bcrypt, 'jwt': benchmarks_jwt, 'json': benchmarks_json,
+                'header': benchmarks_header, 'db': lambda: benchmarks_db(cluster)}
+    resultados = {}
+    try:
+        for grupo in grupos:
+            for nome, funcao in fabricas[grupo]().items():
+                resultados[nome] = medir(funcao, repeticoes=args.repeticoes)
+                print(f"  {nome:<36} {resultados[nome]['mediana_us']:>12.2f} µs")
+    finally:
+        if cluster is not None:
+            cluster.parar()
+
+    import bcrypt
+    import jwt
+    dados = {
+        'meta': {
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'cpus': os.cpu_count(),
+            'bcrypt': bcrypt.__version__,
+            'pyjwt': jwt.__version__,
+        },
+        'resultados': resultados,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, indent=2, ensure_ascii=False)
+    print(f'\n✅ Resultados gravados em {args.saida}')
+    return 0
+
+def comando_comparar(args):
+    with open(args.base, 'r', encoding='utf-8') as f:
+        base = json.load(f)['resultados']
+    with open(args.atual, 'r', encoding='utf-8') as f:
+        atual = json.load(f)['resultados']
+
+    regressoes = 0
+    print(f"{'benchmark':<36} {'base µs':>12} {'atual µs':>12} {'variação':>9}")
+    for nome in sorted(set(base) | set(atual)):
+        if nome not in base or nome not in atual:
+            situacao = 'novo' if nome not in base else 'ausente na execução atual'
+            print(f"{nome:<36} {'':>12} {'':>12}  ({situacao})")
+            continue
+        variacao = atual[nome]['mediana_us'] / base[nome]['mediana_us'] - 1
+        regrediu = variacao > args.limite
+        regressoes += regrediu
+        print(f"{nome:<36} {base[nome]['mediana_us']:>12.2f} {atual[nome]['mediana_us']:>12.2f} "
+              f"{variacao:>+8.1%} {'❌' if regrediu else '✅'}")
+
+    if regressoes:
+        print(f'\n❌ {regressoes} regressão(ões) acima de {args.limite:.0%}')
+        return 1
+    print(f'\n✅ Nenhuma regressão acima de {args.limite:.0%}')
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks do login/verify com baselines')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    executar = sub.add_parser('executar', help='Executa e grava os resultados em JSON')
+    executar.add_argument('--saida', default='benchmarks/baseline.json')
+    executar.add_argument('--apenas', help=f'Grupos separados por vírgula ({",".join(GRUPOS)})')
+    executar.add_argument('--repeticoes', type=int, default=5)
+    executar.add_argument('--sem-banco', action='store_true', help='Não sobe o PostgreSQL local')
+    comparar = sub.add_parser('comparar', help='Compara dois resultados e falha em regressões')
+    comparar.add_argument('base')
+    comparar.add_argument('atual')
+    comparar.add_argument('--limite', type=float, default=0.10, help='Regressão tolerada (0.10 = 10%%)')
+    args = parser.parse_args()
+    if args.comando == 'executar':
+        return comando_executar(args)
+    return comando_comparar(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+migrate.py - Executor de Migrações de Schema Versionadas
+
+Substitui os scripts ad-hoc (fix_table.py, check_table_structure.py) por
+migrações numeradas em backend/migrations/, registradas na tabela
+schema_migrations. Foi pensado para rodar contra o banco de produção com
+tráfego de login ativo, sem travar usuarios, sessoes e registros_acesso.
+
+Cada migração é um arquivo NNNN_descricao.py com:
+- DESCRICAO (str): Texto curto exibido no status
+- TRANSACIONAL (bool, padrão True): Se False, roda em autocommit
+  (obrigatório para CREATE INDEX CONCURRENTLY e backfills em lotes)
+- upgrade(m): Função que recebe um Migrador e aplica as mudanças
+
+Operações não bloqueantes oferecidas pelo Migrador:
+- m.executar(sql): DDL/DML com lock_timeout curto e novas tentativas
+- m.criar_indice(...): CREATE INDEX CONCURRENTLY (recria se ficou inválido)
+- m.adicionar_coluna(...): ADD COLUMN IF NOT EXISTS com lock_timeout
+- m.backfill(...): UPDATE em lotes com pausa entre lotes (throttling)
+- with m.transacao(): etapa curta e atômica em migração não transacional
+
+Garantias:
+- pg_advisory_lock impede dois executores simultâneos
+- lock_timeout evita que um ALTER TABLE na fila bloqueie os logins
+- statement_timeout opcional limita cada comando
+
+Uso:
+    python migrate.py status               # migrações aplicadas/pendentes
+    python migrate.py up                   # aplica todas as pendentes
+    python migrate.py up --ate 0002        # aplica até a versão informada
+    python migrate.py estrutura usuarios   # colunas e índices reais da tabela
+
+Configuração (.env):
+- MIGRATION_LOCK_TIMEOUT_MS, MIGRATION_STATEMENT_TIMEOUT_MS, MIGRATION_DDL_RETRIES
+"""
+
+import os
+import sys
+import time
+import argparse
+from contextlib import contextmanager
+import importlib.util
+import psycopg2
+from psycopg2 import sql, errors
+from config import Config
+
+DIRETORIO_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Chave arbitrária do advisory lock que serializa executores de migração
+ADVISORY_LOCK_ID = 727001
+
+class Migrador:
+    """
+    Contexto entregue a upgrade(m) de cada migração.
+
+    Em migrações transacionais todos os comandos compartilham a transação
+    aberta pelo executor; em não transacionais cada comando é confirmado
+    individualmente (autocommit).
+    """
+
+    def __init__(self, conn, transacional):
+        self.conn = conn
+        self.transacional = transacional
+
+    def _aplicar_timeouts(self, cur, statement_timeout_ms=None):
+        """Define lock_timeout/statement_timeout para o próximo comando."""
+        if statement_timeout_ms is None:
+            statement_timeout_ms = Config.MIGRATION_STATEMENT_TIMEOUT_MS
+        escopo = 'LOCAL' if self.transacional else 'SESSION'
+        cur.execute(f"SET {escopo} lock_timeout = %s", (f"{Config.MIGRATION_LOCK_TIMEOUT_MS}ms",))
+        cur.execute(f"SET {escopo} statement_timeout = %s", (f"{statement_timeout_ms}ms",))
+
+    def executar(self, comando, params=None, statement_timeout_ms=None):
+        """
+        Executa um comando com lock_timeout e novas tentativas.
+
+        Um DDL que espera por lock na fila bloqueia todas as consultas que
+        chegam depois dele; com lock_timeout curto o comando desiste rápido
+        e tenta de novo com backoff, em vez de parar os logins.
+
+        Em migrações transacionais não há nova tentativa (a transação já
+        foi abortada); o erro sobe para o executor.
+
+        Returns:
+            int: rowcount do comando
+        """
+        tentativas = 1 if self.transacional else max(1, Config.MIGRATION_DDL_RETRIES)
+        for tentativa in range(1, tentativas + 1):
+            cur = self.conn.cursor()
+            try:
+                self._aplicar_timeouts(cur, statement_timeout_ms)
+                cur.execute(comando, params)
+                return cur.rowcount
+            except errors.LockNotAvailable:
+                if tentativa == tentativas:
+                    raise
+                espera = min(2 ** tentativa * 0.1, 5.0)
+                print(f'   ⏳ lock_timeout ({tentativa}/{tentativas}), nova tentativa em {espera:.1f}s')
+                time.sleep(espera)
+            finally:
+                cur.close()
+
+    def adicionar_coluna(self, tabela, coluna, tipo):
+        """
+        ADD COLUMN IF NOT EXISTS protegido por lock_timeout.
+
+        O tipo deve ser nullable ou ter DEFAULT constante: no PostgreSQL 11+
+        isso só altera o catálogo, sem reescrever a tabela.
+        """
+        self.executar(sql.SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS {} {}").format(
+            sql.Identifier(tabela), sql.Identifier(coluna), sql.SQL(tipo)
+        ))
+
+    def criar_indice(self, nome, tabela, expressao, unico=False, where=None):
+        """
+        Cria índice com CREATE INDEX CONCURRENTLY (sem bloquear escritas).
+
+        Requer migração com TRANSACIONAL = False. Se um build anterior foi
+        interrompido e deixou o índice inválido, ele é removido e recriado.
+
+        Args:
+            nome (str): Nome do índice
+            tabela (str): Tabela alvo
+            expressao (str): Colunas/expressões, ex.: "lower(email)"
+            unico (bool): Cria UNIQUE INDEX
+            where (str): Predicado opcional (índice parcial)
+        """
+        if self.transacional:
+            raise RuntimeError('criar_indice requer migração com TRANSACIONAL = False')
+        cur = self.conn.cursor()
+        cur.execute("""
+            SELECT i.indisvalid FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s
+        """, (nome,))
+        row = cur.fetchone()
+        cur.close()
+        if row and row[0]:
+            return
+        if row:
+            print(f'   ⚠️  Índice {nome} inválido, recriando')
+            self.executar(sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(nome)),
+                          statement_timeout_ms=0)
+        comando = sql.SQL("CREATE {unico}INDEX CONCURRENTLY {nome} ON {tabela} ({expr}){where}").format(
+            unico=sql.SQL('UNIQUE ' if unico else ''),
+            nome=sql.Identifier(nome),
+            tabela=sql.Identifier(tabela),
+            expr=sql.SQL(expressao),
+            where=sql.SQL(f" WHERE {where}" if where else ''),
+        )
+        # Build de índice pode levar minutos: sem statement_timeout
+        self.executar(comando, statement_timeout_ms=0)
+
+    @contextmanager
+    def transacao(self):
+        """
+        Bloco transacional dentro de uma migração não transacional.
+
+        Para a etapa curta que precisa ser atômica (ex.: travar, copiar o
+        delta e trocar tabelas) depois de um trabalho longo em lotes. Dentro
+        do bloco os comandos não têm nova tentativa: um LockNotAvailable
+        desfaz o bloco inteiro e sobe para quem chamou repetir.
+        """
+        if self.transacional:
+            raise RuntimeError('transacao requer migração com TRANSACIONAL = False')
+        self.conn.autocommit = False
+        self.transacional = True
+        try:
+            yield
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.transacional = False
+            self.conn.autocommit = True
+
+    def backfill(self, tabela, set_sql, where_sql, lote=1000, pausa=0.05, params=None):
+        """
+        UPDATE em lotes pequenos, cada um em sua própria transação.
+
+        Lotes curtos mantêm locks de linha por pouco tempo e geram WAL em
+        ritmo controlado; a pausa entre lotes deixa espaço para os logins.
+
+        Args:
+            tabela (str): Tabela alvo
+            set_sql (str): Cláusula SET, ex.: "email = lower(btrim(email))"
+            where_sql (str): Predicado das linhas pendentes; deve deixar de
+                casar após o UPDATE, senão o loop não termina
+            lote (int): Linhas por lote
+            pausa (float): Segundos de espera entre lotes
+            params (tuple): Parâmetros de set_sql/where_sql
+
+        Returns:
+            int: Total de linhas atualizadas
+        """
+        if self.transacional:
+            raise RuntimeError('backfill requer migração com TRANSACIONAL = False')
+        comando = sql.SQL(
+            "UPDATE {tabela} SET {set_sql} WHERE ctid = ANY(ARRAY("
+            "SELECT ctid FROM {tabela} WHERE {where_sql} LIMIT {lote}))"
+        ).format(
+            tabela=sql.Identifier(tabela),
+            set_sql=sql.SQL(set_sql),
+            where_sql=sql.SQL(where_sql),
+            lote=sql.Literal(lote),
+        )
+        total = 0
+        while True:
+            atualizadas = self.executar(comando, params)
+            total += atualizadas
+            if atualizadas < lote:
+                return total
+            print(f'   … {total} linha(s) atualizada(s) em {tabela}')
+            time.sleep(pausa)
+
+def conectar():
+    """Abre conexão dedicada do executor de migrações."""
+    return psycopg2.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME
+    )
+
+def garantir_tabela_migracoes(conn):
+    """Cria schema_migrations se ainda não existir."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            versao VARCHAR(32) PRIMARY KEY,
+            descricao VARCHAR(255),
+            aplicado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duracao_ms INT
+        )
+    """)
+    conn.commit()
+    cur.close()
+
+def carregar_migracoes():
+    """
+    Carrega os arquivos NNNN_*.py de migrations/ em ordem de versão.
+
+    Returns:
+        list: Tuplas (versao, modulo)
+    """
+    migracoes = []
+    for arquivo in sorted(os.listdir(DIRETORIO_MIGRACOES)):
+        if not arquivo.endswith('.py') or not arquivo[:4].isdigit():
+            continue
+        versao = arquivo[:4]
+        spec = importlib.util.spec_from_file_location(f'migracao_{arquivo[:-3]}',
+                                                      os.path.join(DIRETORIO_MIGRACOES, arquivo))
+        modulo = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(modulo)
+        migracoes.append((versao, modulo))
+    return migracoes
+
+def versoes_aplicadas(conn):
+    """Retorna dict versao -> (descricao, aplicado_em, duracao_ms)."""
+    cur = conn.cursor()
+    cur.execute("SELECT versao, descricao, aplicado_em, duracao_ms FROM schema_migrations")
+    aplicadas = {row[0]: row[1:] for row in cur.fetchall()}
+    conn.commit()
+    cur.close()
+    return aplicadas
+
+def aplicar(conn, versao, modulo):
+    """
+    Aplica uma migração e registra em schema_migrations.
+
+    Transacionais: upgrade + registro na mesma transação (tudo ou nada).
+    Não transacionais: autocommit; upgrade deve ser idempotente, pois uma
+    falha no meio deixa passos já confirmados e a migração é reexecutada.
+    """
+    transacional = getattr(modulo, 'TRANSACIONAL', True)
+    descricao = getattr(modulo, 'DESCRICAO', '')
+    inicio = time.monotonic()
+    conn.autocommit = not transacional
+    try:
+        modulo.upgrade(Migrador(conn, transacional))
+        duracao_ms = int((time.monotonic() - inicio) * 1000)
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO schema_migrations (versao, descricao, duracao_ms) VALUES (%s, %s, %s)",
+            (versao, descricao, duracao_ms)
+        )
+        cur.close()
+        if transacional:
+            conn.commit()
+        return duracao_ms
+    except Exception:
+        if transacional:
+            conn.rollback()
+        raise
+    finally:
+        conn.autocommit = False
+
+def comando_status(conn):
+    aplicadas = versoes_aplicadas(conn)
+    print('\n📋 Migrações:\n')
+    for versao, modulo in carregar_migracoes():
+        descricao = getattr(modulo, 'DESCRICAO', '')
+        if versao in aplicadas:
+            _, aplicado_em, duracao_ms = aplicadas[versao]
+            print(f'  ✅ {versao} {descricao:<50} {aplicado_em:%Y-%m-%d %H:%M} ({duracao_ms} ms)')
+        else:
+            print(f'  ⏳ {versao} {descricao:<50} pendente')
+    print()
+    return 0
+
+def comando_up(conn, ate=None):
+    cur = conn.cursor()
+    cur.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+    if not cur.fetchone()[0]:
+        print('❌ Outro executor de migrações está rodando')
+        return 1
+    conn.commit()
+    try:
+        aplicadas = versoes_aplicadas(conn)
+        pendentes = [(v, m) for v, m in carregar_migracoes()
+                     if v not in aplicadas and (ate is None or v <= ate)]
+        if not pendentes:
+            print('✅ Nenhuma migração pendente')
+            return 0
+        for versao, modulo in pendentes:
+            print(f'🔧 Aplicando {versao} - {getattr(modulo, "DESCRICAO", "")}')
+            try:
+                duracao_ms = aplicar(conn, versao, modulo)
+            except Exception as e:
+                print(f'❌ Falha na migração {versao}: {e}')
+                return 1
+            print(f'✅ {versao} aplicada em {duracao_ms} ms')
+        return 0
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
+        conn.commit()
+        cur.close()
+
+def comando_estrutura(conn, tabela):
+    """Mostra colunas e índices reais da tabela (substitui check_table_structure.py)."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT column_name, data_type, is_nullable, column_default
+        FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s
+        ORDER BY ordinal_position
+    """, (tabela,))
+    colunas = cur.fetchall()
+    if not colunas:
+        print(f'❌ Tabela {tabela} não encontrada')
+        return 1
+    print(f'\n📋 ESTRUTURA DA TABELA: {tabela}\n')
+    for nome, tipo, nullable, default in colunas:
+        nulo = 'NULL' if nullable == 'YES' else 'NOT NULL'
+        padrao = f' DEFAULT {default}' if default else ''
+        print(f'  - {nome:<20} {tipo:<28} {nulo}{padrao}')
+    cur.execute("""
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE schemaname = 'public' AND tablename = %s
+        ORDER BY indexname
+    """, (tabela,))
+    print('\nÍndices:\n')
+    for nome, definicao in cur.fetchall():
+        print(f'  - {nome}: {definicao}')
+    print()
+    cur.close()
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Executor de migrações de schema')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    sub.add_parser('status', help='Lista migrações aplicadas e pendentes')
+    up = sub.add_parser('up', help='Aplica migrações pendentes')
+    up.add_argument('--ate', help='Aplica somente até esta versão (inclusive)')
+    estrutura = sub.add_parser('estrutura', help='Mostra colunas e índices de uma tabela')
+    estrutura.add_argument('tabela')
+    args = parser.parse_args()
+
+    try:
+        conn = conectar()
+    except psycopg2.Error as e:
+        print(f'❌ Erro ao conectar: {e}')
+        return 1
+
+    try:
+        garantir_tabela_migracoes(conn)
+        if args.comando == 'status':
+            return comando_status(conn)
+        if args.comando == 'up':
+            return comando_up(conn, args.ate)
+        return comando_estrutura(conn, args.tabela)
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
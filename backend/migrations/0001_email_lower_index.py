@@ -0,0 +1,26 @@
+"""
+0001 - Índice único funcional lower(email) em usuarios
+
+Equivalente ao normalize_emails.py: aborta se houver emails que colidem
+após normalização, normaliza os emails gravados em lotes e cria
+idx_usuarios_email_lower sem bloquear os logins.
+"""
+
+from normalize_emails import encontrar_duplicados
+
+DESCRICAO = 'Índice único lower(email) em usuarios'
+TRANSACIONAL = False
+
+def upgrade(m):
+    cur = m.conn.cursor()
+    duplicados = encontrar_duplicados(cur)
+    cur.close()
+    if duplicados:
+        ids = ', '.join(str(grupo[1]) for grupo in duplicados)
+        raise RuntimeError(f'Emails conflitantes após normalização (ids: {ids}). '
+                           f'Execute normalize_emails.py --check para detalhes.')
+
+    m.backfill('usuarios',
+               set_sql="email = lower(btrim(email))",
+               where_sql="email <> lower(btrim(email))")
+    m.criar_indice('idx_usuarios_email_lower', 'usuarios', 'lower(email)', unico=True)
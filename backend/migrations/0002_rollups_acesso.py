@@ -0,0 +1,41 @@
+"""
+0002 - Tabelas de rollup de registros_acesso
+
+Agregados por minuto e por hora, chaveados por usuário, IP, tipo de evento
+e sucesso, mantidos incrementalmente por rollup_acessos.py a partir de uma
+marca d'água (último id de registros_acesso já agregado).
+
+usuario_id = 0 representa tentativas sem usuário encontrado e
+endereco_ip = '' IP ausente (colunas da chave não podem ser NULL).
+"""
+
+DESCRICAO = 'Rollups por minuto/hora de registros_acesso'
+TRANSACIONAL = True
+
+TABELA_ROLLUP = """
+    CREATE TABLE IF NOT EXISTS {nome} (
+        bucket TIMESTAMP NOT NULL,
+        usuario_id INT NOT NULL,
+        endereco_ip VARCHAR(50) NOT NULL,
+        tipo_evento VARCHAR(50) NOT NULL,
+        sucesso BOOLEAN NOT NULL,
+        total BIGINT NOT NULL,
+        PRIMARY KEY (bucket, usuario_id, endereco_ip, tipo_evento, sucesso)
+    )
+"""
+
+def upgrade(m):
+    m.executar(TABELA_ROLLUP.format(nome='acessos_por_minuto'))
+    m.executar(TABELA_ROLLUP.format(nome='acessos_por_hora'))
+    m.executar("""
+        CREATE TABLE IF NOT EXISTS rollup_watermark (
+            nome VARCHAR(64) PRIMARY KEY,
+            ultimo_id BIGINT NOT NULL,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    m.executar("""
+        INSERT INTO rollup_watermark (nome, ultimo_id)
+        VALUES ('registros_acesso', 0)
+        ON CONFLICT (nome) DO NOTHING
+    """)
@@ -0,0 +1,22 @@
+"""
+0003 - Colunas de agregação em registros_acesso
+
+Permite que uma linha represente várias tentativas repetidas (mesmo IP,
+usuário, tipo de evento, resultado e mensagem) agrupadas por
+access_aggregator.py:
+
+- contagem: tentativas representadas pela linha (1 = registro exato)
+- primeiro_em / ultimo_em: primeira e última tentativa do grupo
+  (NULL em registros exatos, que usam criado_em)
+
+Colunas com DEFAULT constante ou nullable: só altera o catálogo, sem
+reescrever a tabela nem os seus índices.
+"""
+
+DESCRICAO = 'Colunas contagem/primeiro_em/ultimo_em em registros_acesso'
+TRANSACIONAL = False
+
+def upgrade(m):
+    m.adicionar_coluna('registros_acesso', 'contagem', 'INT NOT NULL DEFAULT 1')
+    m.adicionar_coluna('registros_acesso', 'primeiro_em', 'TIMESTAMP')
+    m.adicionar_coluna('registros_acesso', 'ultimo_em', 'TIMESTAMP')
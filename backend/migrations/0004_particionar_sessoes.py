@@ -0,0 +1,131 @@
+"""
+0004 - sessoes particionada por hora de expirado_em
+
+Troca sessoes por uma tabela particionada por RANGE (expirado_em), com
+partições horárias mantidas por manutencao_sessoes.py: sessões vencidas
+saem com DROP da partição em vez de DELETE.
+
+Sem travar os logins durante a cópia (migração não transacional):
+1. sessoes_nova é criada com as mesmas colunas e a mesma sequência de
+   ids, e as partições da hora atual até SESSION_PARTITION_PREMAKE_HOURS
+   à frente (ou até a sessão válida mais distante)
+2. as sessões ainda válidas com id até o máximo lido no início são
+   copiadas em lotes de LOTE ids, cada lote em sua própria transação,
+   com os logins gravando normalmente em sessoes
+3. em uma transação curta, com sessoes travada para escrita (leituras
+   continuam): copia o delta (ids acima do máximo, mais a última janela
+   de LOTE ids para cobrir INSERTs que ainda não tinham sido confirmados
+   quando o máximo foi lido), renomeia sessoes para sessoes_legado
+   (índices para *_legado) e sessoes_nova para sessoes. Sem o lock dentro
+   do lock_timeout, a transação é desfeita e repetida
+As vencidas ficam em sessoes_legado para arquivamento (export_acessos.py)
+e DROP manual. Interrompida, a migração pode ser reexecutada: a cópia usa
+ON CONFLICT DO NOTHING.
+
+Restrições de tabelas particionadas: PRIMARY KEY e UNIQUE precisam
+incluir a chave de partição. Ficam PRIMARY KEY (id, expirado_em) e
+UNIQUE (token, expirado_em): o mesmo token só é rejeitado com o mesmo
+expirado_em. db.create_sessions_batch não depende mais do UNIQUE(token)
+para reenvios idempotentes (NOT EXISTS em uma janela de expirado_em).
+Os índices de token e expirado_em deixam de existir: o UNIQUE começa por
+token e expirado_em é a chave de partição.
+"""
+
+import time
+from psycopg2 import sql, errors
+from config import Config
+from manutencao_sessoes import particionada, criar_particoes
+
+DESCRICAO = 'Particiona sessoes por hora de expirado_em'
+TRANSACIONAL = False
+
+LOTE = 5000
+
+INDICES_ANTIGOS = ('sessoes_pkey', 'sessoes_token_key', 'idx_sessoes_token', 'idx_sessoes_usuario_id',
+                   'idx_sessoes_expirado_em', 'idx_sessoes_endereco_ip')
+
+# Índices de sessoes_nova (nomes temporários) -> nomes finais
+INDICES_NOVOS = {
+    'sessoes_nova_pkey': 'sessoes_pkey',
+    'sessoes_nova_token_expirado_em_key': 'sessoes_token_expirado_em_key',
+    'idx_sessoes_nova_usuario_id': 'idx_sessoes_usuario_id',
+    'idx_sessoes_nova_endereco_ip': 'idx_sessoes_endereco_ip',
+}
+
+COPIA = """
+    INSERT INTO sessoes_nova (id, usuario_id, token, endereco_ip, agente_usuario, expirado_em, criado_em)
+    SELECT id, usuario_id, token, endereco_ip, agente_usuario, expirado_em, criado_em
+    FROM sessoes
+    WHERE id > %s AND id <= %s AND expirado_em > LOCALTIMESTAMP
+    ON CONFLICT DO NOTHING
+"""
+
+def consultar(m, comando):
+    cur = m.conn.cursor()
+    cur.execute(comando)
+    valor = cur.fetchone()[0]
+    cur.close()
+    return valor
+
+def upgrade(m):
+    if particionada(m.conn):
+        return
+
+    m.executar("""
+        CREATE TABLE IF NOT EXISTS sessoes_nova (
+            id INT NOT NULL DEFAULT nextval('sessoes_id_seq'),
+            usuario_id INT NOT NULL REFERENCES usuarios(id) ON DELETE CASCADE,
+            token VARCHAR(500) NOT NULL,
+            endereco_ip VARCHAR(50),
+            agente_usuario VARCHAR(255),
+            expirado_em TIMESTAMP NOT NULL,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT token_not_empty CHECK (token != ''),
+            CONSTRAINT sessoes_nova_pkey PRIMARY KEY (id, expirado_em),
+            CONSTRAINT sessoes_nova_token_expirado_em_key UNIQUE (token, expirado_em)
+        ) PARTITION BY RANGE (expirado_em)
+    """)
+    m.executar("CREATE INDEX IF NOT EXISTS idx_sessoes_nova_usuario_id ON sessoes_nova (usuario_id)")
+    m.executar("CREATE INDEX IF NOT EXISTS idx_sessoes_nova_endereco_ip ON sessoes_nova (endereco_ip)")
+
+    horas_validas = consultar(m, """
+        SELECT CEIL(EXTRACT(EPOCH FROM MAX(expirado_em) - date_trunc('hour', LOCALTIMESTAMP)) / 3600)
+        FROM sessoes WHERE expirado_em > LOCALTIMESTAMP
+    """)
+    # Margem de uma hora: sessões criadas até a troca expiram depois de MAX(expirado_em)
+    criar_particoes(m, max(Config.SESSION_PARTITION_PREMAKE_HOURS, int(horas_validas or 0) + 1), 'sessoes_nova')
+
+    # Cópia em lotes, sem lock na tabela
+    ate_id = consultar(m, "SELECT COALESCE(MAX(id), 0) FROM sessoes")
+    inicio = consultar(m, "SELECT COALESCE(MIN(id), 1) - 1 FROM sessoes WHERE expirado_em > LOCALTIMESTAMP")
+    copiadas = 0
+    while inicio < ate_id:
+        fim = min(inicio + LOTE, ate_id)
+        copiadas += m.executar(COPIA, (inicio, fim), statement_timeout_ms=0)
+        inicio = fim
+        print(f'   … {copiadas} sessão(ões) copiada(s), id {fim} de {ate_id}')
+        time.sleep(0.05)
+
+    # Delta e troca sob lock, em uma transação curta
+    tentativas = max(1, Config.MIGRATION_DDL_RETRIES)
+    for tentativa in range(1, tentativas + 1):
+        try:
+            with m.transacao():
+                m.executar("LOCK TABLE sessoes IN EXCLUSIVE MODE")
+                m.executar(COPIA, (max(0, ate_id - LOTE), 2 ** 31 - 1), statement_timeout_ms=0)
+                m.executar("ALTER TABLE sessoes RENAME TO sessoes_legado")
+                for indice in INDICES_ANTIGOS:
+                    m.executar(sql.SQL("ALTER INDEX IF EXISTS {} RENAME TO {}").format(
+                        sql.Identifier(indice), sql.Identifier(indice.replace('sessoes', 'sessoes_legado', 1))))
+                m.executar("ALTER TABLE sessoes_nova RENAME TO sessoes")
+                for temporario, final in INDICES_NOVOS.items():
+                    m.executar(sql.SQL("ALTER INDEX {} RENAME TO {}").format(
+                        sql.Identifier(temporario), sql.Identifier(final)))
+                m.executar("ALTER SEQUENCE sessoes_id_seq OWNED BY sessoes.id")
+            return
+        except errors.LockNotAvailable:
+            if tentativa == tentativas:
+                raise
+            espera = min(2 ** tentativa * 0.1, 5.0)
+            print(f'   ⏳ lock_timeout na troca ({tentativa}/{tentativas}), nova tentativa em {espera:.1f}s')
+            time.sleep(espera)
@@ -0,0 +1,13 @@
+"""
+0005 - Coluna ultimo_acesso em usuarios
+
+Garante usuarios.ultimo_acesso (presente no schema.sql, ausente no banco
+de produção). Gravada apenas em lote por last_access.py, nunca a cada
+login. Nullable: só altera o catálogo, sem reescrever a tabela.
+"""
+
+DESCRICAO = 'Coluna ultimo_acesso em usuarios'
+TRANSACIONAL = False
+
+def upgrade(m):
+    m.adicionar_coluna('usuarios', 'ultimo_acesso', 'TIMESTAMP')
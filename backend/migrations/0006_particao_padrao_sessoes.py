@@ -0,0 +1,24 @@
+"""
+0006 - Partição DEFAULT de sessoes
+
+Sem ela, uma hora sem partição (manutencao_sessoes.py parada por mais de
+SESSION_PARTITION_PREMAKE_HOURS) faz todo INSERT em sessoes falhar, e no
+modo sync cada login bem-sucedido perde a linha da sessão. sessoes_padrao
+recebe essas sessões; manutencao_sessoes.py manter as move para a
+partição da hora quando ela é criada e apaga as vencidas.
+
+Só catálogo: a DEFAULT nasce vazia e as partições existentes não são
+lidas. Sem efeito se sessoes não é particionada (0004 não aplicada).
+"""
+
+from psycopg2 import sql
+from manutencao_sessoes import particionada, PADRAO
+
+DESCRICAO = 'Partição DEFAULT em sessoes'
+TRANSACIONAL = False
+
+def upgrade(m):
+    if not particionada(m.conn):
+        return
+    m.executar(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF sessoes DEFAULT").format(
+        sql.Identifier(PADRAO)))
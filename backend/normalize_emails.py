@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+normalize_emails.py - Migração para Busca de Email Case-Insensitive
+
+Prepara a tabela usuarios para buscas por email sem diferenciar maiúsculas
+e minúsculas, mantendo a consulta do login servida por índice.
+
+A consulta quente do login é:
+    SELECT id, email, senha, criado_em FROM usuarios WHERE lower(email) = %s
+
+Comparar lower(email) sem índice funcional força sequential scan (o índice
+idx_usuarios_email é sobre email, não sobre lower(email)). Este script:
+
+1. Detecta emails conflitantes (iguais após lower/trim) e ABORTA se houver,
+   listando os IDs para resolução manual
+2. Normaliza os emails gravados (lower + trim) em lotes
+3. Cria o índice único funcional idx_usuarios_email_lower com
+   CREATE UNIQUE INDEX CONCURRENTLY (sem bloquear logins)
+4. Verifica via EXPLAIN que a consulta do login usa o índice
+
+Os passos 1-3 também existem como migração versionada
+(migrations/0001_email_lower_index.py, aplicada com migrate.py up).
+
+Uso:
+    python normalize_emails.py            # executa a migração completa
+    python normalize_emails.py --check    # apenas duplicados + EXPLAIN
+
+Requisitos:
+- Variáveis de ambiente configuradas (.env)
+- Usuário do banco com permissão de CREATE INDEX na tabela usuarios
+"""
+
+import sys
+import json
+import argparse
+import psycopg2
+from config import Config
+
+INDICE = 'idx_usuarios_email_lower'
+
+CONSULTA_LOGIN = "SELECT id, email, senha, criado_em FROM usuarios WHERE lower(email) = %s"
+
+def conectar():
+    """Abre conexão em modo autocommit (necessário para CONCURRENTLY)."""
+    conn = psycopg2.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME
+    )
+    conn.autocommit = True
+    return conn
+
+def encontrar_duplicados(cur):
+    """
+    Lista grupos de usuários cujo email colide após normalização.
+
+    Returns:
+        list: Tuplas (email_normalizado, [ids], [emails_originais])
+    """
+    cur.execute("""
+        SELECT lower(btrim(email)) AS normalizado,
+               array_agg(id ORDER BY id),
+               array_agg(email ORDER BY id)
+        FROM usuarios
+        GROUP BY lower(btrim(email))
+        HAVING COUNT(*) > 1
+        ORDER BY normalizado
+    """)
+    return cur.fetchall()
+
+def normalizar_emails(cur, tamanho_lote=1000):
+    """
+    Reescreve emails fora da forma canônica em lotes curtos.
+
+    Cada lote é uma transação própria (autocommit) para não segurar
+    locks de linha por muito tempo em uma tabela quente.
+
+    Returns:
+        int: Total de linhas atualizadas
+    """
+    total = 0
+    while True:
+        cur.execute("""
+            UPDATE usuarios SET email = lower(btrim(email))
+            WHERE id IN (
+                SELECT id FROM usuarios
+                WHERE email <> lower(btrim(email))
+                LIMIT %s
+            )
+        """, (tamanho_lote,))
+        if cur.rowcount == 0:
+            return total
+        total += cur.rowcount
+
+def criar_indice(cur):
+    """
+    Cria o índice único funcional sem bloquear escritas.
+
+    Um CREATE INDEX CONCURRENTLY interrompido deixa um índice inválido;
+    nesse caso ele é removido e recriado.
+    """
+    cur.execute("""
+        SELECT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+    """, (INDICE,))
+    row = cur.fetchone()
+    if row and row[0]:
+        print(f'✅ Índice {INDICE} já existe e é válido')
+        return
+    if row:
+        print(f'⚠️  Índice {INDICE} inválido (build interrompido). Recriando...')
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDICE}")
+    cur.execute(f"CREATE UNIQUE INDEX CONCURRENTLY {INDICE} ON usuarios (lower(email))")
+    cur.execute("ANALYZE usuarios")
+    print(f'✅ Índice {INDICE} criado')
+
+def _nos_do_plano(no):
+    """Percorre recursivamente os nós de um plano EXPLAIN (FORMAT JSON)."""
+    yield no
+    for filho in no.get('Plans', []):
+        yield from _nos_do_plano(filho)
+
+def _explicar(cur):
+    """Executa EXPLAIN (FORMAT JSON) da consulta do login e retorna o nó raiz."""
+    cur.execute("EXPLAIN (FORMAT JSON) " + CONSULTA_LOGIN, ('teste@email.com',))
+    plano = cur.fetchone()[0]
+    if isinstance(plano, str):
+        plano = json.loads(plano)
+    return plano[0]['Plan']
+
+def verificar_plano(cur):
+    """
+    Confirma que a consulta do login pode usar o índice funcional.
+
+    Em tabelas pequenas o planner prefere sequential scan mesmo com índice,
+    por isso a verificação desabilita seqscan na transação para provar que
+    a expressão do índice casa com a consulta. O plano natural também é
+    exibido para referência.
+
+    Returns:
+        bool: True se o plano usa idx_usuarios_email_lower
+    """
+    natural = _explicar(cur)
+    print(f"   Plano natural: {natural['Node Type']}")
+
+    cur.execute("BEGIN")
+    try:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        raiz = _explicar(cur)
+    finally:
+        cur.execute("ROLLBACK")
+
+    usa_indice = any(
+        no.get('Index Name') == INDICE
+        for no in _nos_do_plano(raiz)
+    )
+    if usa_indice:
+        print(f'✅ Consulta do login usa {INDICE} ({raiz["Node Type"]})')
+    else:
+        print(f'❌ Consulta do login NÃO usa {INDICE} ({raiz["Node Type"]})')
+    return usa_indice
+
+def main():
+    parser = argparse.ArgumentParser(description='Normaliza emails e cria índice lower(email)')
+    parser.add_argument('--check', action='store_true',
+                        help='Apenas verifica duplicados e plano de execução')
+    parser.add_argument('--lote', type=int, default=1000,
+                        help='Tamanho do lote de normalização (padrão: 1000)')
+    args = parser.parse_args()
+
+    print('=' * 80)
+    print('📧 NORMALIZAÇÃO DE EMAILS (case-insensitive)')
+    print('=' * 80 + '\n')
+
+    try:
+        conn = conectar()
+    except psycopg2.Error as e:
+        print(f'❌ Erro ao conectar: {e}')
+        return 1
+
+    try:
+        cur = conn.cursor()
+
+        duplicados = encontrar_duplicados(cur)
+        if duplicados:
+            print(f'❌ {len(duplicados)} email(s) conflitante(s) após normalização:\n')
+            for normalizado, ids, emails in duplicados:
+                print(f'  - {normalizado}: ids={ids} emails={emails}')
+            print('\nResolva os conflitos (mesclar ou remover contas) e execute novamente.')
+            return 1
+        print('✅ Nenhum email conflitante')
+
+        if not args.check:
+            total = normalizar_emails(cur, args.lote)
+            print(f'✅ {total} email(s) normalizado(s)')
+            criar_indice(cur)
+
+        return 0 if verificar_plano(cur) else 1
+    except psycopg2.Error as e:
+        print(f'❌ Erro de banco de dados: {e}')
+        return 1
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
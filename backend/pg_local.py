@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+pg_local.py - Cluster PostgreSQL Descartável para Testes
+
+Cria um cluster temporário com initdb, sobe o postgres numa porta livre
+(só em 127.0.0.1 e socket no diretório temporário), cria o banco, aplica
+banco_dados/schema.sql e as migrações (migrate.py up). Ao sair, para o
+servidor e apaga o diretório.
+
+Usado pelo soak_test.py; também serve para desenvolvimento local.
+
+Requisitos:
+- Binários do PostgreSQL (initdb, pg_ctl): PATH, PG_BIN ou
+  /usr/lib/postgresql/<versão>/bin
+- Não pode rodar como root (restrição do próprio postgres)
+
+Uso:
+    python pg_local.py          # sobe, mostra as variáveis DB_* e espera Ctrl+C
+
+    from pg_local import ClusterLocal
+    with ClusterLocal() as cluster:
+        env = {**os.environ, **cluster.variaveis()}
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import socket
+import tempfile
+import subprocess
+import psycopg2
+
+DIRETORIO_BACKEND = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_SCHEMA = os.path.join(DIRETORIO_BACKEND, '..', 'banco_dados', 'schema.sql')
+
+def encontrar_binario(nome):
+    """Procura um binário do PostgreSQL em PG_BIN, PATH e /usr/lib/postgresql."""
+    candidatos = []
+    if os.getenv('PG_BIN'):
+        candidatos.append(os.path.join(os.getenv('PG_BIN'), nome))
+    if shutil.which(nome):
+        candidatos.append(shutil.which(nome))
+    candidatos += sorted(glob.glob(f'/usr/lib/postgresql/*/bin/{nome}'), reverse=True)
+    for caminho in candidatos:
+        if os.access(caminho, os.X_OK):
+            return caminho
+    raise FileNotFoundError(f'{nome} não encontrado (instale o PostgreSQL ou defina PG_BIN)')
+
+def porta_livre():
+    """Porta TCP livre em 127.0.0.1."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+class ClusterLocal:
+    """
+    Cluster PostgreSQL temporário.
+
+    Args:
+        banco (str): Nome do banco criado
+        max_connections (int): max_connections do servidor
+        migracoes (bool): Executa migrate.py up após o schema
+    """
+
+    def __init__(self, banco='auth_db', max_connections=200, migracoes=True):
+        self.banco = banco
+        self.usuario = 'postgres'
+        self.max_connections = max_connections
+        self.migracoes = migracoes
+        self.porta = None
+        self.diretorio = None
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def variaveis(self):
+        """Variáveis DB_* para apontar o backend para este cluster."""
+        return {'DB_HOST': '127.0.0.1', 'DB_PORT': str(self.porta), 'DB_USER': self.usuario,
+                'DB_PASSWORD': '', 'DB_NAME': self.banco, 'DB_REPLICA_HOSTS': ''}
+
+    def conectar(self, banco=None):
+        """Conexão avulsa (autocommit) com o cluster."""
+        conn = psycopg2.connect(host='127.0.0.1', port=self.porta, user=self.usuario,
+                                dbname=banco or self.banco)
+        conn.autocommit = True
+        return conn
+
+    def iniciar(self):
+        self.diretorio = tempfile.mkdtemp(prefix='pg_local_')
+        dados = os.path.join(self.diretorio, 'dados')
+        self.porta = porta_livre()
+        subprocess.run([encontrar_binario('initdb'), '-D', dados, '-U', self.usuario, '-A', 'trust',
+                        '-E', 'UTF8', '--no-sync'], check=True, stdout=subprocess.DEVNULL)
+        opcoes = (f"-p {self.porta} -c listen_addresses=127.0.0.1 -k {self.diretorio} "
+                  f"-c max_connections={self.max_connections} -c fsync=off")
+        subprocess.run([encontrar_binario('pg_ctl'), '-D', dados, '-o', opcoes, '-w',
+                        '-l', os.path.join(self.diretorio, 'postgres.log'), 'start'],
+                       check=True, stdout=subprocess.DEVNULL)
+        try:
+            conn = self.conectar('postgres')
+            conn.cursor().execute(f'CREATE DATABASE {self.banco}')
+            conn.close()
+            conn = self.conectar()
+            with open(ARQUIVO_SCHEMA, 'r', encoding='utf-8') as f:
+                conn.cursor().execute(f.read())
+            conn.close()
+            if self.migracoes:
+                subprocess.run([sys.executable, os.path.join(DIRETORIO_BACKEND, 'migrate.py'), 'up'],
+                               env={**os.environ, **self.variaveis()}, check=True,
+                               stdout=subprocess.DEVNULL)
+        except Exception:
+            self.parar()
+            raise
+
+    def parar(self):
+        if self.diretorio is None:
+            return
+        subprocess.run([encontrar_binario('pg_ctl'), '-D', os.path.join(self.diretorio, 'dados'),
+                        '-m', 'immediate', 'stop'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+        self.diretorio = None
+
+def main():
+    try:
+        with ClusterLocal() as cluster:
+            print('✅ PostgreSQL local iniciado\n')
+            for chave, valor in cluster.variaveis().items():
+                print(f'export {chave}={valor}')
+            print('\nCtrl+C para parar e apagar o cluster')
+            while True:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        print('\n🧹 Cluster removido')
+        return 0
+    except (FileNotFoundError, subprocess.CalledProcessError, psycopg2.Error) as e:
+        print(f'❌ Erro ao criar cluster local: {e}')
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
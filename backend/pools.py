@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+pools.py - Pools de Conexão e Roteamento Primário/Réplicas
+
+Mantém um pool de conexões para o primário e um para cada réplica de
+leitura, e decide para onde cada consulta vai:
+
+- Escritas (sessoes, registros_acesso) → sempre o primário
+- Leituras (get_user_by_email, /health/db) → uma réplica saudável,
+  escolhida por round-robin ou pela menor quantidade de conexões em uso
+- Réplica com circuit breaker aberto ou atraso de replicação acima de
+  REPLICA_MAX_LAG_SECONDS é ignorada; sem réplica saudável → primário
+- A API só escreve em sessoes/registros_acesso/ultimo_acesso, que não
+  são lidos das réplicas; usuários criados por outros processos
+  (create_user.py) ainda não replicados são cobertos por
+  REPLICA_MISS_FALLBACK em db.get_user_by_email
+
+Cada pool tem seu próprio CircuitBreaker. Pools são criados sob demanda
+e recriados após fork (conexões não podem ser compartilhadas entre o
+master e os workers do Gunicorn). As conexões são abertas sob demanda e
+ficam ociosas no pool ao serem devolvidas (até maxconn), reaproveitadas
+pelas próximas consultas sem novo connect/autenticação. Na recarga a
+quente (config_reload.py) Roteador.reconfigurar() ajusta tamanho,
+endereço e credenciais dos pools existentes: as ociosas são fechadas, as
+em uso terminam com os parâmetros antigos e as novas já saem com os
+novos.
+
+Configuração (.env):
+- DB_REPLICA_HOSTS: "host1[:porta],host2[:porta]" (vazio = sem réplicas)
+- DB_POOL_MAX, DB_REPLICA_POOL_MAX (conexões por processo)
+- REPLICA_SELECTION: round_robin | least_loaded
+- REPLICA_MAX_LAG_SECONDS, REPLICA_LAG_CHECK_SECONDS
+"""
+
+import os
+import math
+import time
+import logging
+import itertools
+import threading
+import psycopg2
+from psycopg2 import pool as pg_pool
+from config import Config
+from circuit_breaker import CircuitBreaker, BancoIndisponivel, ABERTO
+from deadline import PrazoEsgotado, esgotado
+import faults
+
+logger = logging.getLogger('pools')
+
+# Atraso de replicação; 0 quando a réplica já aplicou tudo que recebeu
+# (sem isso, um primário sem escritas faria o atraso parecer crescer)
+CONSULTA_ATRASO = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+def parametros_conexao(host, port):
+    """Parâmetros de conexão com connect_timeout e statement_timeout do Config."""
+    return dict(
+        host=host,
+        port=port,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME,
+        connect_timeout=Config.DB_CONNECT_TIMEOUT,
+        options=f'-c statement_timeout={Config.DB_STATEMENT_TIMEOUT_MS}'
+    )
+
+def conectar(host, port):
+    """Abre conexão avulsa (fora do pool)."""
+    return psycopg2.connect(**parametros_conexao(host, port))
+
+class PoolBanco:
+    """
+    Pool de conexões de um servidor (primário ou réplica) com circuit breaker.
+
+    Args:
+        nome (str): Identificação nos logs/diagnóstico
+        host (str), port (str): Endereço do servidor
+        maxconn (int): Máximo de conexões abertas por processo
+    """
+
+    def __init__(self, nome, host, port, maxconn):
+        self.nome = nome
+        self.host = host
+        self.port = port
+        self.maxconn = maxconn
+        self.circuito = CircuitBreaker(nome, sonda=self._sondar)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._atraso = 0.0
+        self._atraso_medido_em = 0.0
+
+    def _sondar(self):
+        conn = conectar(self.host, self.port)
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            return True
+        finally:
+            conn.close()
+
+    def _pool_do_processo(self):
+        """Cria o pool no primeiro uso (e de novo após fork)."""
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # Conexões herdadas do master pertencem a ele: não fechar aqui
+                self._pool = pg_pool.ThreadedConnectionPool(
+                    0, self.maxconn, **parametros_conexao(self.host, self.port)
+                )
+                # Criado com minconn 0 para não conectar tudo de uma vez;
+                # minconn = maxconn faz o putconn guardar as devolvidas
+                self._pool.minconn = self.maxconn
+                self._pid = os.getpid()
+        return self._pool
+
+    @property
+    def em_uso(self):
+        """Conexões emprestadas no momento (critério least_loaded)."""
+        return len(self._pool._used) if self._pool is not None and self._pid == os.getpid() else 0
+
+    def obter(self):
+        """
+        Empresta uma conexão do pool.
+
+        Raises:
+            BancoIndisponivel: Circuito aberto, falha ao conectar ou pool esgotado
+            PrazoEsgotado: Prazo da requisição esgotado (deadline.py)
+        """
+        if esgotado():
+            raise PrazoEsgotado()
+        self.circuito.antes_da_chamada()
+        try:
+            faults.injetar('conexao', limite_ms=Config.DB_CONNECT_TIMEOUT * 1000)
+            pool = self._pool_do_processo()
+            # O ThreadedConnectionPool só recusa com em uso == maxconn;
+            # após reduzir o tamanho podem estar em uso mais que o novo limite
+            if len(pool._used) >= self.maxconn:
+                raise pg_pool.PoolError('connection pool exhausted')
+            conn = pool.getconn()
+            if conn.closed:
+                # Ociosa fechada desde a devolução: descarta e abre outra
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            return conn
+        except pg_pool.PoolError:
+            raise BancoIndisponivel(f'Pool {self.nome} esgotado', retry_after=1)
+        except psycopg2.Error as e:
+            self.circuito.registrar_falha()
+            logger.error("Erro ao conectar ao banco %s: %s", self.nome, e)
+            raise BancoIndisponivel(retry_after=self.circuito.retry_after()) from e
+
+    def devolver(self, conn):
+        """
+        Devolve a conexão ao pool, que a guarda ociosa para reuso.
+
+        O ThreadedConnectionPool faz rollback de transações abertas (as
+        leituras não fazem commit) e descarta conexões fechadas ou com a
+        conexão ao servidor perdida.
+        """
+        try:
+            self._pool_do_processo().putconn(conn)
+        except pg_pool.PoolError:
+            conn.close()
+
+    def atraso_replicacao(self):
+        """
+        Atraso de replicação em segundos (cache de REPLICA_LAG_CHECK_SECONDS).
+
+        Em caso de erro na medição retorna infinito (réplica é ignorada).
+        """
+        agora = time.monotonic()
+        if agora - self._atraso_medido_em < Config.REPLICA_LAG_CHECK_SECONDS:
+            return self._atraso
+        self._atraso_medido_em = agora
+        try:
+            conn = self.obter()
+        except BancoIndisponivel:
+            self._atraso = float('inf')
+            return self._atraso
+        try:
+            cur = conn.cursor()
+            cur.execute(CONSULTA_ATRASO)
+            self._atraso = float(cur.fetchone()[0])
+            cur.close()
+            self.circuito.registrar_sucesso()
+        except psycopg2.Error as e:
+            if isinstance(e, psycopg2.OperationalError):
+                self.circuito.registrar_falha()
+            logger.error("Erro ao medir atraso da réplica %s: %s", self.nome, e)
+            self._atraso = float('inf')
+        finally:
+            self.devolver(conn)
+        return self._atraso
+
+    def reconfigurar(self, host, port, maxconn):
+        """
+        Aplica novo endereço/tamanho e os parâmetros de conexão atuais do Config.
+
+        As conexões ociosas são fechadas; as em uso terminam com os
+        parâmetros antigos e, se o pool encolheu, são fechadas na devolução
+        quando já houver maxconn ociosas. As próximas usam os novos.
+        """
+        with self._lock:
+            self.host, self.port, self.maxconn = host, port, maxconn
+            if self._pool is not None and self._pid == os.getpid():
+                with self._pool._lock:
+                    self._pool.minconn = self._pool.maxconn = maxconn
+                    self._pool._kwargs = parametros_conexao(host, port)
+                    ociosas, self._pool._pool = self._pool._pool, []
+                for conn in ociosas:
+                    conn.close()
+        self.circuito.limite_falhas = Config.CB_FAILURE_THRESHOLD
+        self.circuito.intervalo_sonda = Config.CB_OPEN_SECONDS
+
+    def fechar(self):
+        """Fecha todas as conexões do pool deste processo."""
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+
+    def resumo(self):
+        """Estado para endpoints de diagnóstico."""
+        medido = self._atraso_medido_em and math.isfinite(self._atraso)
+        return {**self.circuito.resumo(), 'host': self.host, 'em_uso': self.em_uso,
+                'atraso_s': self._atraso if medido else None}
+
+class Roteador:
+    """
+    Escolhe o pool de cada consulta: primário para escritas, réplicas para leituras.
+
+    Args:
+        primario (PoolBanco): Pool do servidor primário
+        replicas (list): Pools das réplicas de leitura
+    """
+
+    def __init__(self, primario, replicas=()):
+        self.primario = primario
+        self.replicas = list(replicas)
+        self._rodizio = itertools.count()
+
+    def _replicas_saudaveis(self):
+        return [r for r in self.replicas
+                if r.circuito.estado != ABERTO
+                and r.atraso_replicacao() <= Config.REPLICA_MAX_LAG_SECONDS]
+
+    def pool_leitura(self):
+        """
+        Pool para uma consulta somente leitura.
+
+        Returns:
+            PoolBanco: Réplica escolhida ou o primário (fallback)
+        """
+        if not self.replicas:
+            return self.primario
+        candidatas = self._replicas_saudaveis()
+        if not candidatas:
+            return self.primario
+        if Config.REPLICA_SELECTION == 'least_loaded':
+            return min(candidatas, key=lambda r: r.em_uso)
+        return candidatas[next(self._rodizio) % len(candidatas)]
+
+    def reconfigurar(self):
+        """
+        Aplica DB_HOST, DB_POOL_MAX e DB_REPLICA_* atuais do Config.
+
+        Réplicas que continuam na lista mantêm pool e circuit breaker;
+        réplicas removidas deixam de receber leituras e suas conexões em
+        uso são fechadas ao serem devolvidas.
+        """
+        self.primario.reconfigurar(Config.DB_HOST, Config.DB_PORT, Config.DB_POOL_MAX)
+        existentes = {(r.host, r.port): r for r in self.replicas}
+        replicas = []
+        for nome, host, porta in enderecos_replicas():
+            replica = existentes.get((host, porta))
+            if replica is None:
+                replica = PoolBanco(nome, host, porta, Config.DB_REPLICA_POOL_MAX)
+            else:
+                replica.reconfigurar(host, porta, Config.DB_REPLICA_POOL_MAX)
+            replicas.append(replica)
+        self.replicas = replicas
+
+    def resumo(self):
+        """Estado de todos os pools (diagnóstico)."""
+        return {'primario': self.primario.resumo(), 'replicas': [r.resumo() for r in self.replicas]}
+
+def enderecos_replicas():
+    """Tuplas (nome, host, porta) de DB_REPLICA_HOSTS."""
+    enderecos = []
+    for indice, endereco in enumerate(h.strip() for h in Config.DB_REPLICA_HOSTS.split(',') if h.strip()):
+        host, _, porta = endereco.partition(':')
+        enderecos.append((f'replica-{indice + 1}', host, porta or Config.DB_PORT))
+    return enderecos
+
+def criar_roteador():
+    """Monta o Roteador a partir do Config (DB_HOST + DB_REPLICA_HOSTS)."""
+    primario = PoolBanco('primario', Config.DB_HOST, Config.DB_PORT, Config.DB_POOL_MAX)
+    replicas = [PoolBanco(nome, host, porta, Config.DB_REPLICA_POOL_MAX)
+                for nome, host, porta in enderecos_replicas()]
+    return Roteador(primario, replicas)
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+profiler.py - Profiling por Amostragem nos Workers
+
+Quando a CPU dispara em produção não havia como ver onde o tempo vai
+dentro de um worker. Este módulo perfila uma fração das requisições com
+cProfile e agrega as estatísticas por rota, separando o tempo de bcrypt,
+JSON, Flask/Werkzeug e psycopg2.
+
+Como ligar:
+- PROFILE_ENABLED=True no .env: amostragem desde o início do worker
+- SIGUSR2 para o PID de um WORKER alterna liga/desliga; ao desligar, as
+  estatísticas são gravadas em PROFILE_DIR (não mande SIGUSR2 ao master
+  do Gunicorn: lá o sinal faz upgrade do binário)
+- POST /debug/profile?segundos=30&taxa=0.2 (X-Debug-Token): captura por
+  tempo determinado; ao terminar grava os arquivos
+- GET /debug/profile: funções mais caras e tempo por categoria, por rota
+
+Arquivos: PROFILE_DIR/<pid>-<rota>-<timestamp>.pstats, legíveis com
+    python -m pstats arquivo.pstats    (ou snakeviz / gprof2dot)
+
+Custo: requisições não amostradas pagam só um random(); as amostradas
+ficam ~2x mais lentas em código Python (o bcrypt, em C, quase não muda).
+Só uma requisição por processo é perfilada por vez (cProfile não admite
+dois perfis ativos); as concorrentes seguem sem perfil.
+
+Configuração (.env):
+- PROFILE_ENABLED, PROFILE_SAMPLE_RATE, PROFILE_DIR
+"""
+
+import os
+import re
+import time
+import random
+import signal
+import pstats
+import cProfile
+import logging
+import threading
+from flask import g, request, jsonify
+from config import Config
+from debug_api import debug, parametro_numero
+
+logger = logging.getLogger('profiler')
+
+# Categoria pelo arquivo/nome da função (tempo próprio, tottime)
+CATEGORIAS = (
+    ('bcrypt', re.compile(r'bcrypt')),
+    ('jwt', re.compile(r'[/\\]jwt[/\\]')),
+    ('psycopg2', re.compile(r'psycopg2')),
+    ('json', re.compile(r'[/\\]json[/\\]|json\.dumps|json\.loads|encode_basestring')),
+    ('flask_werkzeug', re.compile(r'[/\\](flask|flask_cors|werkzeug)[/\\]')),
+    ('logging', re.compile(r'[/\\]logging[/\\]')),
+)
+
+def categoria(funcao):
+    """Classifica uma entrada (arquivo, linha, nome) do pstats."""
+    texto = f'{funcao[0]}:{funcao[2]}'
+    for nome, padrao in CATEGORIAS:
+        if padrao.search(texto):
+            return nome
+    return 'app' if os.path.dirname(os.path.abspath(__file__)) in funcao[0] else 'outros'
+
+class Perfilador:
+    """
+    Amostragem de requisições com cProfile e agregação por rota.
+
+    Uso:
+        perfilador.instalar(app)       # hooks before/teardown_request
+        perfilador.ligar(taxa=0.1)
+        perfilador.desligar()          # grava os .pstats
+    """
+
+    def __init__(self):
+        self.ativo = False
+        self.taxa = Config.PROFILE_SAMPLE_RATE
+        self._agregado = {}
+        self._amostras = {}
+        self._lock = threading.Lock()
+        self._em_uso = threading.Lock()
+        self._timer = None
+
+    def instalar(self, app):
+        app.before_request(self._antes)
+        app.teardown_request(self._depois)
+        if Config.PROFILE_ENABLED:
+            self.ligar()
+
+    def _antes(self):
+        if not self.ativo or random.random() >= self.taxa or request.blueprint == 'debug':
+            return
+        if not self._em_uso.acquire(blocking=False):
+            return
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Outro profiler já ativo no processo
+            self._em_uso.release()
+            return
+        g.perfil = perfil
+
+    def _depois(self, exc=None):
+        perfil = g.pop('perfil', None)
+        if perfil is None:
+            return
+        perfil.disable()
+        self._em_uso.release()
+        regra = request.url_rule.rule if request.url_rule else '<sem rota>'
+        rota = f'{request.method} {regra}'
+        with self._lock:
+            if rota in self._agregado:
+                self._agregado[rota].add(perfil)
+            else:
+                self._agregado[rota] = pstats.Stats(perfil)
+            self._amostras[rota] = self._amostras.get(rota, 0) + 1
+
+    def ligar(self, taxa=None, segundos=None):
+        """Liga a amostragem; com `segundos`, desliga e grava ao fim do prazo."""
+        if taxa is not None:
+            self.taxa = taxa
+        self.ativo = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if segundos:
+            self._timer = threading.Timer(segundos, self.desligar)
+            self._timer.daemon = True
+            self._timer.start()
+        logger.warning("Profiler ligado (taxa=%.3f, segundos=%s)", self.taxa, segundos)
+
+    def desligar(self):
+        """Desliga a amostragem e grava o que foi coletado."""
+        self.ativo = False
+        arquivos = self.despejar()
+        logger.warning("Profiler desligado; %d arquivo(s) gravado(s)", len(arquivos))
+        return arquivos
+
+    def despejar(self):
+        """
+        Grava as estatísticas agregadas por rota em PROFILE_DIR e zera o acumulado.
+
+        Returns:
+            list: Caminhos gravados
+        """
+        with self._lock:
+            agregado, self._agregado, self._amostras = self._agregado, {}, {}
+        if not agregado:
+            return []
+        os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+        carimbo = time.strftime('%Y%m%dT%H%M%S')
+        arquivos = []
+        for rota, stats in agregado.items():
+            nome = re.sub(r'[^A-Za-z0-9]+', '_', rota).strip('_')
+            caminho = os.path.join(Config.PROFILE_DIR, f'{os.getpid()}-{nome}-{carimbo}.pstats')
+            stats.dump_stats(caminho)
+            arquivos.append(caminho)
+        return arquivos
+
+    def resumo(self, limite=15):
+        """Funções mais caras (tempo acumulado) e tempo próprio por categoria, por rota."""
+        with self._lock:
+            rotas = {}
+            for rota, stats in self._agregado.items():
+                por_categoria = {}
+                for funcao, (_, chamadas, proprio, acumulado, _) in stats.stats.items():
+                    nome = categoria(funcao)
+                    por_categoria[nome] = por_categoria.get(nome, 0.0) + proprio
+                mais_caras = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limite]
+                rotas[rota] = {
+                    'amostras': self._amostras.get(rota, 0),
+                    'tempo_total_s': round(stats.total_tt, 4),
+                    'por_categoria_s': {k: round(v, 4) for k, v in
+                                        sorted(por_categoria.items(), key=lambda kv: -kv[1])},
+                    'mais_caras': [{'funcao': pstats.func_std_string(funcao), 'chamadas': dados[1],
+                                    'proprio_s': round(dados[2], 4), 'acumulado_s': round(dados[3], 4)}
+                                   for funcao, dados in mais_caras],
+                }
+        return {'pid': os.getpid(), 'ativo': self.ativo, 'taxa': self.taxa, 'rotas': rotas}
+
+    def instalar_sinal(self):
+        """SIGUSR2 alterna o profiler (chamar na thread principal do worker)."""
+        def alternar(signum, frame):
+            if self.ativo:
+                # Gravar fora do handler de sinal
+                threading.Thread(target=self.desligar, daemon=True).start()
+            else:
+                self.ligar()
+        signal.signal(signal.SIGUSR2, alternar)
+
+# Instância única por processo
+perfilador = Perfilador()
+
+@debug.route('/profile', methods=['GET'])
+def profile_resumo():
+    """Estatísticas agregadas do profiler neste worker."""
+    return jsonify(perfilador.resumo(limite=parametro_numero('limite', 15, 1, 200, int))), 200
+
+@debug.route('/profile', methods=['POST'])
+def profile_capturar():
+    """Captura por tempo determinado: ?segundos=30&taxa=0.2."""
+    segundos = parametro_numero('segundos', 30, 1, 3600)
+    taxa = parametro_numero('taxa', Config.PROFILE_SAMPLE_RATE, 0.0, 1.0)
+    perfilador.ligar(taxa=taxa, segundos=segundos)
+    return jsonify({'pid': os.getpid(), 'ativo': True, 'taxa': taxa, 'segundos': segundos,
+                    'diretorio': os.path.abspath(Config.PROFILE_DIR)}), 202
+
+@debug.route('/profile', methods=['DELETE'])
+def profile_parar():
+    """Desliga a captura e grava os arquivos agora."""
+    return jsonify({'pid': os.getpid(), 'arquivos': perfilador.desligar()}), 200
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+query_stats.py - Instrumentação das Consultas SQL
+
+Não havia como ver qual das poucas consultas de db.py piora conforme as
+tabelas crescem. CursorInstrumentado envolve o cursor psycopg2 usado por
+todas as funções de db.py (e pelo /health/db) e, a cada execute:
+
+- mede o tempo e etiqueta com a função chamadora e o FORMATO dos
+  parâmetros (tipos, quantidade de linhas) — nunca os valores
+- acumula estatísticas por consulta no processo: contagem, total, máximo,
+  p50/p99 (reservatório de QUERY_STATS_RESERVOIR amostras)
+- registra no log as consultas acima de SLOW_QUERY_MS
+- aplica o prazo da requisição (deadline.py) via SET LOCAL statement_timeout
+- passa pelo ponto de injeção 'consulta' (faults.py)
+- para uma fração (SLOW_QUERY_EXPLAIN_SAMPLE) dos SELECTs lentos,
+  captura o plano numa thread separada, em conexão própria. Sem ANALYZE:
+  a consulta não é reexecutada (escritas nunca são explicadas, pois
+  mesmo desfeitas tomariam locks, disparariam triggers e gastariam
+  sequências). No PostgreSQL 16+ EXPLAIN (GENERIC_PLAN) com $1, $2...
+  no lugar dos parâmetros; antes disso EXPLAIN simples, com os literais
+  das condições trocados por '?' antes de ir para o log e o /debug.
+  Um EXPLAIN por vez por processo, no máximo um por consulta a cada
+  SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+
+Estatísticas: GET /debug/queries (X-Debug-Token), DELETE zera (rotas em
+debug_api.py; este módulo não depende do Flask, pois db.py também é
+usado pelos scripts).
+
+Custo medido: ~6 µs por execute (normalização do texto, lock, dict e
+reservatório), desprezível perto do round-trip ao banco.
+
+Uso:
+    cur = CursorInstrumentado(conn.cursor(cursor_factory=RealDictCursor))
+    cur.execute("SELECT ... WHERE lower(email) = %s", (email,))
+    cur.execute_values("INSERT ... VALUES %s", linhas, template=...)
+"""
+
+import os
+import re
+import sys
+import time
+import random
+import logging
+import threading
+import psycopg2
+from psycopg2.extras import execute_values
+from config import Config
+import deadline
+from deadline import PrazoEsgotado
+import faults
+
+logger = logging.getLogger('query_stats')
+
+class EstatisticaConsulta:
+    """Agregado de uma consulta (texto normalizado) no processo."""
+
+    __slots__ = ('sql', 'funcoes', 'formatos', 'contagem', 'total_ms', 'maximo_ms',
+                 'lentas', 'amostras', 'ultimo_plano', 'ultimo_explain')
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.funcoes = set()
+        self.formatos = set()
+        self.contagem = 0
+        self.total_ms = 0.0
+        self.maximo_ms = 0.0
+        self.lentas = 0
+        self.amostras = []
+        self.ultimo_plano = None
+        self.ultimo_explain = 0.0
+
+    def registrar(self, funcao, formato, ms):
+        self.contagem += 1
+        self.total_ms += ms
+        self.maximo_ms = max(self.maximo_ms, ms)
+        self.funcoes.add(funcao)
+        if len(self.formatos) < 10:
+            self.formatos.add(formato)
+        # Amostragem por reservatório: percentis sem guardar todas as medições
+        if len(self.amostras) < Config.QUERY_STATS_RESERVOIR:
+            self.amostras.append(ms)
+        else:
+            indice = random.randrange(self.contagem)
+            if indice < Config.QUERY_STATS_RESERVOIR:
+                self.amostras[indice] = ms
+
+    def percentil(self, p):
+        if not self.amostras:
+            return None
+        ordenadas = sorted(self.amostras)
+        return ordenadas[min(len(ordenadas) - 1, int(p / 100 * len(ordenadas)))]
+
+    def resumo(self):
+        return {
+            'sql': self.sql,
+            'funcoes': sorted(self.funcoes),
+            'formatos': sorted(self.formatos),
+            'contagem': self.contagem,
+            'total_ms': round(self.total_ms, 2),
+            'media_ms': round(self.total_ms / self.contagem, 3) if self.contagem else None,
+            'p50_ms': round(self.percentil(50), 3) if self.amostras else None,
+            'p99_ms': round(self.percentil(99), 3) if self.amostras else None,
+            'maximo_ms': round(self.maximo_ms, 3),
+            'lentas': self.lentas,
+            'ultimo_plano': self.ultimo_plano,
+        }
+
+_estatisticas = {}
+_lock = threading.Lock()
+_explain_em_andamento = threading.Lock()
+
+def normalizar_sql(sql):
+    """Texto da consulta em uma linha (chave das estatísticas)."""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    return ' '.join(str(sql).split())
+
+def formato_parametros(params):
+    """Formato dos parâmetros sem os valores: (int, str, NoneType)."""
+    if params is None:
+        return '()'
+    if isinstance(params, dict):
+        return '{' + ', '.join(f'{k}: {type(v).__name__}' for k, v in sorted(params.items())) + '}'
+    return '(' + ', '.join(type(v).__name__ for v in params) + ')'
+
+# Placeholders do psycopg2 (%s, %(nome)s) e o escape %%
+_PLACEHOLDER = re.compile(r'%(?:\((\w+)\))?s|%%')
+# Literais em linhas de condição do plano (Index Cond, Filter, ...)
+_LINHA_CONDICAO = re.compile(r'^\s*(?:->\s*)?[\w ]*(?:Cond|Filter):')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+def placeholders_posicionais(sql):
+    """Troca %s/%(nome)s por $1, $2... (EXPLAIN GENERIC_PLAN)."""
+    nomes = {}
+
+    def trocar(m):
+        if m.group(0) == '%%':
+            return '%'
+        if m.group(1) is None:
+            nomes[len(nomes)] = None
+            return f'${len(nomes)}'
+        if m.group(1) not in nomes:
+            nomes[m.group(1)] = None
+        return f'${list(nomes).index(m.group(1)) + 1}'
+    return _PLACEHOLDER.sub(trocar, sql)
+
+def ocultar_literais(plano):
+    """Plano com os literais das condições trocados por '?' (podem ser emails)."""
+    return '\n'.join(_LITERAL.sub('?', linha) if _LINHA_CONDICAO.match(linha) else linha
+                     for linha in plano.split('\n'))
+
+def registrar(sql, funcao, formato, ms, conn=None, params=None):
+    """Acumula a medição e, se lenta, registra no log e talvez captura o EXPLAIN."""
+    chave = normalizar_sql(sql)
+    with _lock:
+        estatistica = _estatisticas.get(chave)
+        if estatistica is None:
+            estatistica = _estatisticas[chave] = EstatisticaConsulta(chave)
+        estatistica.registrar(funcao, formato, ms)
+        lenta = ms >= Config.SLOW_QUERY_MS
+        if lenta:
+            estatistica.lentas += 1
+    if not lenta:
+        return
+    logger.warning("Consulta lenta (%.1f ms) em %s", ms,
+                   funcao, extra={'sql': chave, 'formato': formato, 'duracao_ms': round(ms, 1)})
+    agora = time.monotonic()
+    if (conn is not None and chave[:7].upper() == 'SELECT '
+            and random.random() < Config.SLOW_QUERY_EXPLAIN_SAMPLE
+            and agora - estatistica.ultimo_explain >= Config.SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS
+            and _explain_em_andamento.acquire(blocking=False)):
+        estatistica.ultimo_explain = agora
+        threading.Thread(target=_capturar_explain, name='explain-consulta-lenta', daemon=True,
+                         args=(estatistica, conn.info.host, conn.info.port, sql, params)).start()
+
+def _capturar_explain(estatistica, host, port, sql, params):
+    """EXPLAIN (sem ANALYZE) de um SELECT em conexão própria, sem os valores no plano."""
+    from pools import conectar
+    conn = None
+    try:
+        conn = conectar(host, port)
+        cur = conn.cursor()
+        if conn.server_version >= 160000:
+            cur.execute('EXPLAIN (GENERIC_PLAN) ' + placeholders_posicionais(sql))
+        else:
+            cur.execute('EXPLAIN ' + sql, params)
+        plano = ocultar_literais('\n'.join(linha[0] for linha in cur.fetchall()))
+        cur.close()
+        estatistica.ultimo_plano = plano
+        logger.warning("Plano da consulta lenta", extra={'sql': estatistica.sql, 'plano': plano})
+    except psycopg2.Error as e:
+        logger.info("EXPLAIN da consulta lenta falhou: %s", e)
+    finally:
+        if conn is not None:
+            conn.close()  # fechar sem commit desfaz a transação
+        _explain_em_andamento.release()
+
+class CursorInstrumentado:
+    """
+    Cursor psycopg2 com medição de execute/execute_values.
+
+    Demais atributos (fetchone, fetchall, rowcount, close...) são
+    repassados ao cursor original.
+    """
+
+    __slots__ = ('_cur',)
+
+    def __init__(self, cur):
+        self._cur = cur
+
+    def __getattr__(self, nome):
+        return getattr(self._cur, nome)
+
+    def execute(self, sql, params=None):
+        funcao = sys._getframe(1).f_code.co_name
+        comando, limitado = sql, False
+        restante = deadline.restante_ms()
+        if restante is not None:
+            # Prazo da requisição (deadline.py): sem orçamento nem executa;
+            # com pouco orçamento, statement_timeout no mesmo round-trip
+            if restante < Config.DEADLINE_MIN_STATEMENT_MS:
+                raise PrazoEsgotado()
+            if restante < Config.DB_STATEMENT_TIMEOUT_MS and isinstance(sql, str):
+                comando, limitado = f'SET LOCAL statement_timeout = {int(restante)}; {sql}', True
+        inicio = time.perf_counter()
+        try:
+            faults.injetar('consulta', restante if limitado else Config.DB_STATEMENT_TIMEOUT_MS or None)
+            return self._cur.execute(comando, params)
+        except psycopg2.errors.QueryCanceled as e:
+            if limitado:
+                raise PrazoEsgotado() from e
+            raise
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            registrar(sql, funcao, formato_parametros(params), ms, self._cur.connection, params)
+
+    def execute_values(self, sql, linhas, template=None, page_size=100):
+        """psycopg2.extras.execute_values medido como uma única consulta."""
+        funcao = sys._getframe(1).f_code.co_name
+        inicio = time.perf_counter()
+        try:
+            faults.injetar('consulta', Config.DB_STATEMENT_TIMEOUT_MS or None)
+            return execute_values(self._cur, sql, linhas, template=template, page_size=page_size)
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            formato = f'{len(linhas)} linha(s) x {formato_parametros(linhas[0]) if linhas else "()"}'
+            registrar(sql, funcao, formato, ms)
+
+def resumo(limite=50):
+    """Consultas ordenadas pelo tempo total."""
+    with _lock:
+        itens = sorted(_estatisticas.values(), key=lambda e: e.total_ms, reverse=True)[:limite]
+        return {'pid': os.getpid(), 'limite_lenta_ms': Config.SLOW_QUERY_MS,
+                'consultas': [e.resumo() for e in itens]}
+
+def zerar():
+    with _lock:
+        _estatisticas.clear()
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+replay_trafego.py - Captura e Reprodução do Tráfego Real de Login
+
+Carga sintética (soak_test.py) não reproduz a mistura real de usuários
+repetidos, emails inexistentes e rajadas. registros_acesso já guarda cada
+tentativa com horário, IP, usuário e resultado; este script transforma uma
+janela dela em um arquivo de reprodução e o reproduz contra uma instância
+local.
+
+Extração (extrair):
+- Tentativas de login da janela [--de, --ate) em ordem de criado_em
+- Linhas agregadas (contagem > 1, access_aggregator.py) são expandidas
+  em `contagem` tentativas distribuídas entre primeiro_em e ultimo_em
+- Credenciais e IPs NUNCA vão para o arquivo: usuários viram índices
+  (replay-N@teste.local nas fixtures) e IPs viram índices
+- Cenário de cada tentativa: login_ok (sucesso), senha_errada (usuário
+  existente, falha) ou email_inexistente (sem usuario_id)
+- Concorrência por IP: maior número de tentativas do IP dentro de
+  --janela-concorrencia segundos (≈ latência de um login)
+
+Fixtures (fixtures): cria replay-N@teste.local com a senha de teste
+(bcrypt de custo --bcrypt-rounds, padrão 12 como create_user.py) no banco
+do .env. Recusa bancos fora de localhost sem --permitir-remoto.
+
+Reprodução (reproduzir):
+- Malha aberta: cada tentativa sai no seu instante original dividido por
+  --velocidade (1 = tempo real, 10 = dez vezes mais rápido), sem esperar
+  as respostas anteriores, como o tráfego real
+- Cada IP tem no máximo a concorrência observada em requisições em voo;
+  o que exceder espera a vez (a espera entra no "atraso de agendamento")
+- O IP pseudônimo vai em X-Forwarded-For apenas para correlação: o
+  backend não confia nesse header e enxerga 127.0.0.1
+- Relatório por cenário: quantidade, códigos HTTP, p50/p95/p99/máx e
+  respostas inesperadas; atraso de agendamento p99 alto indica que o
+  cliente (--clientes) não acompanhou a carga e o formato não foi mantido
+
+Uso:
+    python replay_trafego.py extrair --de 2024-05-01T18:00 --ate 2024-05-01T19:00 --saida pico.jsonl.gz
+    python replay_trafego.py fixtures pico.jsonl.gz
+    python replay_trafego.py reproduzir pico.jsonl.gz --url http://127.0.0.1:3000 --velocidade 4
+"""
+
+import sys
+import json
+import gzip
+import time
+import bisect
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import psycopg2
+from config import Config
+
+SENHA_FIXTURE = 'replay-senha-123'
+SENHA_ERRADA = 'replay-senha-errada'
+STATUS_ESPERADO = {'login_ok': 200, 'senha_errada': 401, 'email_inexistente': 401}
+HOSTS_LOCAIS = ('localhost', '127.0.0.1', '::1')
+
+def conectar():
+    """Abre conexão com o banco usando as credenciais do Config."""
+    return psycopg2.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME
+    )
+
+def abrir(caminho, modo):
+    """Abre o arquivo de reprodução (gzip se terminar em .gz)."""
+    if caminho.endswith('.gz'):
+        return gzip.open(caminho, modo + 't', encoding='utf-8')
+    return open(caminho, modo, encoding='utf-8')
+
+def ler_arquivo(caminho):
+    """Retorna (cabeçalho, eventos) de um arquivo de reprodução."""
+    with abrir(caminho, 'r') as f:
+        cabecalho = json.loads(f.readline())
+        eventos = [json.loads(linha) for linha in f if linha.strip()]
+    return cabecalho, eventos
+
+def cenario(usuario_id, sucesso):
+    if sucesso:
+        return 'login_ok'
+    return 'senha_errada' if usuario_id is not None else 'email_inexistente'
+
+def concorrencia_por_ip(eventos, janela):
+    """Maior número de eventos de cada IP dentro de `janela` segundos."""
+    tempos = {}
+    for evento in eventos:
+        tempos.setdefault(evento['ip'], []).append(evento['t'])
+    maximos = {}
+    for ip, lista in tempos.items():
+        maximo = max(bisect.bisect_right(lista, t + janela) - i for i, t in enumerate(lista))
+        if maximo > 1:
+            maximos[str(ip)] = maximo
+    return maximos
+
+def comando_extrair(args):
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'registros_acesso' AND column_name = 'contagem'
+        """)
+        agregada = cur.fetchone() is not None
+        cur.close()
+        colunas = 'contagem, primeiro_em, ultimo_em' if agregada else '1, NULL::timestamp, NULL::timestamp'
+
+        # Cursor nomeado: linhas chegam em blocos, não todas de uma vez
+        cur = conn.cursor(name='replay_extracao')
+        cur.itersize = 10000
+        cur.execute(f"""
+            SELECT usuario_id, endereco_ip, sucesso, criado_em, {colunas}
+            FROM registros_acesso
+            WHERE tipo_evento = 'login' AND criado_em >= %s AND criado_em < %s
+            ORDER BY criado_em, id
+        """, (args.de, args.ate))
+
+        usuarios, ips, brutos = {}, {}, []
+        for usuario_id, ip, sucesso, criado_em, contagem, primeiro, ultimo in cur:
+            u = None if usuario_id is None else usuarios.setdefault(usuario_id, len(usuarios))
+            i = ips.setdefault(ip or '', len(ips))
+            c = cenario(usuario_id, sucesso)
+            if contagem > 1 and primeiro is not None and ultimo is not None:
+                passo = (ultimo - primeiro) / (contagem - 1)
+                brutos.extend((primeiro + passo * k, i, u, c) for k in range(contagem))
+            else:
+                brutos.append((criado_em, i, u, c))
+        cur.close()
+    finally:
+        conn.close()
+
+    if not brutos:
+        print('❌ Nenhuma tentativa de login na janela')
+        return 1
+    brutos.sort(key=lambda e: e[0])
+    inicio = brutos[0][0]
+    eventos = [{'t': round((quando - inicio).total_seconds(), 6), 'ip': i, 'u': u, 'c': c}
+               for quando, i, u, c in brutos]
+    cabecalho = {
+        'versao': 1,
+        'de': args.de, 'ate': args.ate,
+        'eventos': len(eventos),
+        'duracao_s': eventos[-1]['t'],
+        'usuarios': len(usuarios),
+        'ips': len(ips),
+        'janela_concorrencia_s': args.janela_concorrencia,
+        'concorrencia_por_ip': concorrencia_por_ip(eventos, args.janela_concorrencia),
+    }
+    with abrir(args.saida, 'w') as f:
+        f.write(json.dumps(cabecalho) + '\n')
+        for evento in eventos:
+            f.write(json.dumps(evento, separators=(',', ':')) + '\n')
+
+    por_cenario = {}
+    for evento in eventos:
+        por_cenario[evento['c']] = por_cenario.get(evento['c'], 0) + 1
+    print(f"✅ {len(eventos)} tentativa(s) em {cabecalho['duracao_s']:.0f}s gravada(s) em {args.saida}")
+    print(f"   {len(usuarios)} usuário(s), {len(ips)} IP(s), cenários: {por_cenario}")
+    return 0
+
+def comando_fixtures(args):
+    import bcrypt
+    if Config.DB_HOST not in HOSTS_LOCAIS and not args.permitir_remoto:
+        print(f'❌ DB_HOST={Config.DB_HOST} não é local; use --permitir-remoto se for mesmo uma instância de teste')
+        return 1
+    cabecalho, _ = ler_arquivo(args.arquivo)
+    hash_senha = bcrypt.hashpw(SENHA_FIXTURE.encode('utf-8'), bcrypt.gensalt(args.bcrypt_rounds)).decode('utf-8')
+    conn = conectar()
+    try:
+        cur = conn.cursor()
+        cur.executemany("INSERT INTO usuarios (email, senha) VALUES (%s, %s) ON CONFLICT DO NOTHING",
+                        [(f'replay-{n}@teste.local', hash_senha) for n in range(cabecalho['usuarios'])])
+        conn.commit()
+        cur.close()
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f'❌ Erro ao criar fixtures: {e}')
+        return 1
+    finally:
+        conn.close()
+    print(f"✅ {cabecalho['usuarios']} usuário(s) replay-N@teste.local prontos (bcrypt custo {args.bcrypt_rounds})")
+    return 0
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p / 100 * len(ordenados)))]
+
+class Reproducao:
+    """Dispara os eventos no horário, com limite de requisições em voo por IP."""
+
+    def __init__(self, url, cabecalho, velocidade, clientes, timeout):
+        self.url = url.rstrip('/')
+        self.velocidade = velocidade
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=clientes, thread_name_prefix='replay')
+        self._limites = cabecalho.get('concorrencia_por_ip', {})
+        self._semaforos = {}
+        self._lock = threading.Lock()
+        self.resultados = deque()
+
+    def _semaforo(self, ip):
+        with self._lock:
+            semaforo = self._semaforos.get(ip)
+            if semaforo is None:
+                semaforo = self._semaforos[ip] = threading.BoundedSemaphore(self._limites.get(str(ip), 1))
+            return semaforo
+
+    def _corpo(self, indice, evento):
+        if evento['c'] == 'email_inexistente':
+            return {'email': f'inexistente-{indice}@teste.local', 'senha': SENHA_ERRADA}
+        senha = SENHA_FIXTURE if evento['c'] == 'login_ok' else SENHA_ERRADA
+        return {'email': f"replay-{evento['u']}@teste.local", 'senha': senha}
+
+    def _enviar(self, indice, evento, agendado):
+        with self._semaforo(evento['ip']):
+            inicio = time.monotonic()
+            ip = evento['ip']
+            req = urllib.request.Request(
+                self.url + '/api/auth/login', method='POST',
+                data=json.dumps(self._corpo(indice, evento)).encode('utf-8'),
+                headers={'Content-Type': 'application/json',
+                         'X-Forwarded-For': f'10.{ip >> 16 & 255}.{ip >> 8 & 255}.{ip & 255}'})
+            try:
+                with urllib.request.urlopen(req, timeout=self.timeout) as resposta:
+                    resposta.read()
+                    status = resposta.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except (urllib.error.URLError, OSError):
+                status = 0
+            fim = time.monotonic()
+        self.resultados.append((evento['c'], status, (fim - inicio) * 1000, (inicio - agendado) * 1000))
+
+    def executar(self, eventos):
+        inicio = time.monotonic()
+        for indice, evento in enumerate(eventos):
+            agendado = inicio + evento['t'] / self.velocidade
+            espera = agendado - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            self._executor.submit(self._enviar, indice, evento, agendado)
+        self._executor.shutdown(wait=True)
+        return time.monotonic() - inicio
+
+def relatorio(resultados, duracao):
+    por_cenario = {}
+    for nome, status, latencia, atraso in resultados:
+        item = por_cenario.setdefault(nome, {'latencias': [], 'status': {}, 'inesperadas': 0})
+        item['latencias'].append(latencia)
+        item['status'][status] = item['status'].get(status, 0) + 1
+        if status != STATUS_ESPERADO[nome]:
+            item['inesperadas'] += 1
+    saida = {'duracao_s': round(duracao, 1), 'requisicoes': len(resultados),
+             'atraso_agendamento_p99_ms': round(percentil([r[3] for r in resultados], 99) or 0, 1),
+             'cenarios': {}}
+    for nome, item in sorted(por_cenario.items()):
+        latencias = item['latencias']
+        saida['cenarios'][nome] = {
+            'quantidade': len(latencias),
+            'status': {str(k): v for k, v in sorted(item['status'].items())},
+            'inesperadas': item['inesperadas'],
+            **{f'p{p}_ms': round(percentil(latencias, p), 1) for p in (50, 95, 99)},
+            'max_ms': round(max(latencias), 1),
+        }
+    return saida
+
+def comando_reproduzir(args):
+    cabecalho, eventos = ler_arquivo(args.arquivo)
+    if args.limite:
+        eventos = eventos[:args.limite]
+    duracao_prevista = (eventos[-1]['t'] if eventos else 0) / args.velocidade
+    print(f"🚀 Reproduzindo {len(eventos)} tentativa(s) de {cabecalho['de']} a {cabecalho['ate']} "
+          f"em ~{duracao_prevista:.0f}s ({args.velocidade}x) contra {args.url}")
+    reproducao = Reproducao(args.url, cabecalho, args.velocidade, args.clientes, args.timeout)
+    duracao = reproducao.executar(eventos)
+    resultado = relatorio(list(reproducao.resultados), duracao)
+    print(f"\n📊 {resultado['requisicoes']} requisições, atraso de agendamento p99 "
+          f"{resultado['atraso_agendamento_p99_ms']:.0f} ms\n")
+    print(f"  {'cenário':<18} {'qtd':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}  status")
+    for nome, item in resultado['cenarios'].items():
+        print(f"  {nome:<18} {item['quantidade']:>7} {item['p50_ms']:>8.1f} {item['p95_ms']:>8.1f} "
+              f"{item['p99_ms']:>8.1f} {item['max_ms']:>8.1f}  {item['status']}"
+              f"{'  ⚠️ ' + str(item['inesperadas']) + ' inesperada(s)' if item['inesperadas'] else ''}")
+    if resultado['atraso_agendamento_p99_ms'] > 100:
+        print('\n⚠️  Atraso de agendamento alto: aumente --clientes; o formato da carga não foi preservado')
+    if args.relatorio:
+        with open(args.relatorio, 'w', encoding='utf-8') as f:
+            json.dump({'arquivo': args.arquivo, 'velocidade': args.velocidade, **resultado}, f, indent=2)
+        print(f'\n✅ Relatório gravado em {args.relatorio}')
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Captura e reprodução do tráfego real de login')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    extrair = sub.add_parser('extrair', help='Janela de registros_acesso → arquivo de reprodução')
+    extrair.add_argument('--de', required=True, type=datetime.fromisoformat)
+    extrair.add_argument('--ate', required=True, type=datetime.fromisoformat)
+    extrair.add_argument('--saida', required=True, help='Arquivo .jsonl ou .jsonl.gz')
+    extrair.add_argument('--janela-concorrencia', type=float, default=0.25,
+                         help='Segundos para estimar requisições simultâneas por IP')
+    fixtures = sub.add_parser('fixtures', help='Cria os usuários de teste do arquivo')
+    fixtures.add_argument('arquivo')
+    fixtures.add_argument('--bcrypt-rounds', type=int, default=12)
+    fixtures.add_argument('--permitir-remoto', action='store_true')
+    reproduzir = sub.add_parser('reproduzir', help='Reproduz o arquivo contra uma instância')
+    reproduzir.add_argument('arquivo')
+    reproduzir.add_argument('--url', default=f'http://127.0.0.1:{Config.PORT}')
+    reproduzir.add_argument('--velocidade', type=float, default=1.0, help='1 = tempo real')
+    reproduzir.add_argument('--clientes', type=int, default=256, help='Requisições em voo no total')
+    reproduzir.add_argument('--timeout', type=float, default=30.0)
+    reproduzir.add_argument('--limite', type=int, help='Reproduz só as primeiras N tentativas')
+    reproduzir.add_argument('--relatorio', help='Grava o relatório em JSON')
+    args = parser.parse_args()
+
+    try:
+        if args.comando == 'extrair':
+            args.de, args.ate = args.de.isoformat(), args.ate.isoformat()
+            return comando_extrair(args)
+        if args.comando == 'fixtures':
+            return comando_fixtures(args)
+        return comando_reproduzir(args)
+    except psycopg2.Error as e:
+        print(f'❌ Erro de banco de dados: {e}')
+        return 1
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f'❌ Arquivo de reprodução inválido: {e}')
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+rollup_acessos.py - Rollups Incrementais de Tentativas de Login
+
+Mantém as tabelas acessos_por_minuto e acessos_por_hora (migração 0002)
+a partir de registros_acesso, e responde os relatórios do schema.sql
+("usuários mais ativos", "tentativas falhadas últimas 24h") lendo apenas
+os rollups, em milissegundos, sem varrer o histórico.
+
+Agregação incremental (marca d'água):
+- rollup_watermark guarda o último id de registros_acesso já agregado
+- Cada lote agrega ids (marca, marca + ROLLUP_BATCH_SIZE] com UPSERT
+  (total = total + novo) nas duas tabelas e avança a marca na MESMA
+  transação: cada linha é contada exatamente uma vez
+- Linhas agregadas por access_aggregator.py (migração 0003) valem
+  `contagem` tentativas: os totais somam contagem, não linhas. Antes da
+  0003 (sem a coluna no catálogo) cada linha vale uma tentativa, COUNT(*)
+- O bucket é COALESCE(primeiro_em, criado_em): uma linha agregada é
+  gravada (criado_em) até ACCESS_LOG_WINDOW_SECONDS depois da primeira
+  tentativa, e contá-la no minuto da gravação distorceria o rollup por
+  minuto. criado_em continua sendo o critério da marca d'água
+- Só entram linhas com criado_em anterior a NOW() - ROLLUP_LAG_SECONDS,
+  para não pular ids de transações ainda não confirmadas (ids SERIAL são
+  alocados antes do commit). Transações mais longas que o atraso podem
+  ficar de fora; aumente ROLLUP_LAG_SECONDS se isso for possível
+
+Uso:
+    python rollup_acessos.py agregar                   # processa pendentes e sai
+    python rollup_acessos.py agregar --continuo        # loop (cron/worker)
+    python rollup_acessos.py purgar                    # remove minutos antigos
+    python rollup_acessos.py mais-ativos --dias 30
+    python rollup_acessos.py falhas --horas 24 --minimo 3
+
+Configuração (.env):
+- ROLLUP_LAG_SECONDS, ROLLUP_BATCH_SIZE, ROLLUP_MINUTE_RETENTION_HOURS
+"""
+
+import sys
+import time
+import argparse
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from config import Config
+
+UPSERT_ROLLUP = """
+    INSERT INTO {tabela} (bucket, usuario_id, endereco_ip, tipo_evento, sucesso, total)
+    SELECT date_trunc('{unidade}', {momento}),
+           COALESCE(usuario_id, 0),
+           COALESCE(endereco_ip, ''),
+           COALESCE(tipo_evento, ''),
+           COALESCE(sucesso, FALSE),
+           {total}
+    FROM registros_acesso
+    WHERE id > %(de)s AND id <= %(ate)s
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (bucket, usuario_id, endereco_ip, tipo_evento, sucesso)
+    DO UPDATE SET total = {tabela}.total + EXCLUDED.total
+"""
+
+def conectar():
+    """Abre conexão com o banco usando as credenciais do Config."""
+    return psycopg2.connect(
+        host=Config.DB_HOST,
+        port=Config.DB_PORT,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        database=Config.DB_NAME
+    )
+
+def expressoes_agregacao(cur):
+    """
+    Expressões do total e do momento de cada linha conforme o catálogo.
+
+    Returns:
+        tuple: ('SUM(contagem)', 'COALESCE(primeiro_em, criado_em)') com as
+            colunas da migração 0003; ('COUNT(*)', 'criado_em') antes dela
+    """
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'registros_acesso'
+          AND column_name IN ('contagem', 'primeiro_em')
+    """)
+    colunas = {linha[0] for linha in cur.fetchall()}
+    total = 'SUM(contagem)' if 'contagem' in colunas else 'COUNT(*)'
+    momento = 'COALESCE(primeiro_em, criado_em)' if 'primeiro_em' in colunas else 'criado_em'
+    return total, momento
+
+def agregar_lote(conn):
+    """
+    Agrega um lote de registros_acesso a partir da marca d'água.
+
+    Returns:
+        int: Quantidade de ids cobertos pelo lote (0 = nada pendente)
+    """
+    cur = conn.cursor()
+    try:
+        # FOR UPDATE serializa execuções concorrentes do job
+        cur.execute("SELECT ultimo_id FROM rollup_watermark WHERE nome = 'registros_acesso' FOR UPDATE")
+        de = cur.fetchone()[0]
+        cur.execute("""
+            SELECT MAX(id), COUNT(*) FROM (
+                SELECT id FROM registros_acesso
+                WHERE id > %s AND criado_em < NOW() - make_interval(secs => %s)
+                ORDER BY id
+                LIMIT %s
+            ) lote
+        """, (de, Config.ROLLUP_LAG_SECONDS, Config.ROLLUP_BATCH_SIZE))
+        ate, linhas = cur.fetchone()
+        if ate is None:
+            conn.rollback()
+            return 0
+        params = {'de': de, 'ate': ate}
+        total, momento = expressoes_agregacao(cur)
+        cur.execute(UPSERT_ROLLUP.format(tabela='acessos_por_minuto', unidade='minute',
+                                         total=total, momento=momento), params)
+        cur.execute(UPSERT_ROLLUP.format(tabela='acessos_por_hora', unidade='hour',
+                                         total=total, momento=momento), params)
+        cur.execute(
+            "UPDATE rollup_watermark SET ultimo_id = %s, atualizado_em = NOW() "
+            "WHERE nome = 'registros_acesso'",
+            (ate,)
+        )
+        conn.commit()
+        return linhas
+    except psycopg2.Error:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def agregar_pendentes(conn):
+    """Processa lotes até não haver registros pendentes. Retorna o total agregado."""
+    total = 0
+    while True:
+        linhas = agregar_lote(conn)
+        if linhas == 0:
+            return total
+        total += linhas
+
+def purgar_minutos(conn):
+    """Remove rollups por minuto além da retenção (os por hora são mantidos)."""
+    cur = conn.cursor()
+    cur.execute(
+        "DELETE FROM acessos_por_minuto WHERE bucket < NOW() - make_interval(hours => %s)",
+        (Config.ROLLUP_MINUTE_RETENTION_HOURS,)
+    )
+    removidas = cur.rowcount
+    conn.commit()
+    cur.close()
+    return removidas
+
+def usuarios_mais_ativos(conn, dias=30, limite=10):
+    """
+    Usuários com mais logins na janela, a partir de acessos_por_hora.
+
+    Returns:
+        list: dicts com usuario_id, email, acessos
+    """
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute("""
+        SELECT r.usuario_id, u.email, SUM(r.total) AS acessos
+        FROM acessos_por_hora r
+        LEFT JOIN usuarios u ON u.id = r.usuario_id
+        WHERE r.tipo_evento = 'login'
+          AND r.usuario_id <> 0
+          AND r.bucket >= date_trunc('hour', NOW() - make_interval(days => %s))
+        GROUP BY r.usuario_id, u.email
+        ORDER BY acessos DESC
+        LIMIT %s
+    """, (dias, limite))
+    resultado = cur.fetchall()
+    cur.close()
+    return resultado
+
+def tentativas_falhadas(conn, horas=24, minimo=3):
+    """
+    Usuários/IPs com mais de `minimo` falhas de login na janela,
+    a partir de acessos_por_minuto (precisão de um minuto).
+
+    usuario_id 0 agrupa tentativas com email inexistente, por IP.
+
+    Returns:
+        list: dicts com usuario_id, email, endereco_ip, tentativas
+    """
+    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cur.execute("""
+        SELECT r.usuario_id, u.email, r.endereco_ip, SUM(r.total) AS tentativas
+        FROM acessos_por_minuto r
+        LEFT JOIN usuarios u ON u.id = r.usuario_id
+        WHERE r.tipo_evento = 'login'
+          AND r.sucesso = FALSE
+          AND r.bucket >= date_trunc('minute', NOW() - make_interval(hours => %s))
+        GROUP BY r.usuario_id, u.email, r.endereco_ip
+        HAVING SUM(r.total) > %s
+        ORDER BY tentativas DESC
+    """, (horas, minimo))
+    resultado = cur.fetchall()
+    cur.close()
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description='Rollups incrementais de registros_acesso')
+    sub = parser.add_subparsers(dest='comando', required=True)
+    agregar = sub.add_parser('agregar', help='Agrega registros pendentes')
+    agregar.add_argument('--continuo', action='store_true', help='Repete indefinidamente')
+    agregar.add_argument('--intervalo', type=float, default=10.0, help='Segundos entre ciclos')
+    sub.add_parser('purgar', help='Remove rollups por minuto antigos')
+    ativos = sub.add_parser('mais-ativos', help='Usuários com mais logins')
+    ativos.add_argument('--dias', type=int, default=30)
+    ativos.add_argument('--limite', type=int, default=10)
+    falhas = sub.add_parser('falhas', help='Tentativas falhadas recentes')
+    falhas.add_argument('--horas', type=int, default=24)
+    falhas.add_argument('--minimo', type=int, default=3)
+    args = parser.parse_args()
+
+    try:
+        conn = conectar()
+    except psycopg2.Error as e:
+        print(f'❌ Erro ao conectar: {e}')
+        return 1
+
+    try:
+        if args.comando == 'agregar':
+            while True:
+                inicio = time.monotonic()
+                total = agregar_pendentes(conn)
+                print(f'✅ {total} registro(s) agregado(s) em {(time.monotonic() - inicio) * 1000:.0f} ms')
+                if not args.continuo:
+                    return 0
+                time.sleep(args.intervalo)
+
+        if args.comando == 'purgar':
+            print(f'✅ {purgar_minutos(conn)} rollup(s) por minuto removido(s)')
+            return 0
+
+        inicio = time.monotonic()
+        if args.comando == 'mais-ativos':
+            linhas = usuarios_mais_ativos(conn, args.dias, args.limite)
+            print(f'\n🏆 Usuários mais ativos ({args.dias} dias):\n')
+            for row in linhas:
+                print(f"  {row['usuario_id']:>8}  {row['email'] or '-':<40} {row['acessos']}")
+        else:
+            linhas = tentativas_falhadas(conn, args.horas, args.minimo)
+            print(f'\n🚨 Tentativas falhadas ({args.horas}h, > {args.minimo}):\n')
+            for row in linhas:
+                email = row['email'] or ('(email inexistente)' if row['usuario_id'] == 0 else '-')
+                print(f"  {email:<40} {row['endereco_ip'] or '-':<20} {row['tentativas']}")
+        print(f'\n⏱️  {(time.monotonic() - inicio) * 1000:.1f} ms\n')
+        return 0
+    except psycopg2.Error as e:
+        print(f'❌ Erro de banco de dados: {e}')
+        return 1
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
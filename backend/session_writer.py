@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+session_writer.py - Gravação Write-Behind de Sessões
+
+O login esperava o INSERT em sessoes e o commit antes de devolver o token,
+embora o cliente só precise do JWT (a verificação não consulta sessoes).
+Aqui a sessão é enfileirada e uma thread em segundo plano grava em lotes
+(db.create_sessions_batch), tirando um commit do caminho crítico de cada
+login bem-sucedido.
+
+Modos de durabilidade (SESSION_WRITE_MODE):
+- sync: grava na própria requisição (comportamento anterior)
+- async: enfileira e responde; sessões pendentes se perdem se o processo
+  morrer sem shutdown limpo (SIGKILL, OOM)
+- async_spill: como async, mas lotes que esgotam as tentativas, e
+  sessões que não cabem na fila, são anexados a SESSION_SPILL_FILE
+  (JSON por linha) e regravados quando o worker inicia (post_worker_init
+  do Gunicorn chama iniciar(); fora do Gunicorn, no primeiro login). Na
+  regravação,
+  sessões já vencidas são descartadas (a partição da hora delas pode já
+  ter sido removida); um lote que falha é regravado sessão a sessão e,
+  se outras gravaram, as que falharam sozinhas vão para
+  SESSION_SPILL_FILE.quarentena em vez de voltar ao spill e bloquear os
+  próximos lotes a cada reinício
+
+Exposição do spill: sessoes guarda o JWT completo (db.create_sessions_batch
+deduplica reenvios pelo token), então o spill e a quarentena também
+precisam dele — quem lê esses arquivos pode usar os tokens até expirarem
+(24h). Os arquivos são criados com permissão 0600 (só o usuário do
+processo); mantenha SESSION_SPILL_FILE fora de diretórios compartilhados
+e de backups, e apague a quarentena depois de inspecionada.
+
+Garantias:
+- Novas tentativas com backoff exponencial (SESSION_MAX_RETRIES)
+- Fila cheia nunca bloqueia o login: grava de forma síncrona (async) ou
+  vai para o arquivo de spill (async_spill)
+- Flush no encerramento do worker (atexit / worker_exit do Gunicorn)
+- A thread é iniciada no post_worker_init (ou sob demanda) e recriada
+  após fork; se morrer, a nova thread continua a mesma fila
+
+Configuração (.env):
+- SESSION_WRITE_MODE, SESSION_QUEUE_SIZE, SESSION_BATCH_SIZE,
+  SESSION_FLUSH_INTERVAL_MS, SESSION_MAX_RETRIES, SESSION_SPILL_FILE
+"""
+
+import os
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from config import Config
+import db
+
+logger = logging.getLogger('session_writer')
+
+MODOS = ('sync', 'async', 'async_spill')
+
+# Sessões valem 24h (db.create_sessions_batch)
+VALIDADE_SEGUNDOS = 24 * 3600
+
+class GravadorSessoes:
+    """
+    Fila de sessões com thread de gravação em lotes.
+
+    Uso:
+        gravador = GravadorSessoes()
+        gravador.registrar(usuario_id, token, ip)   # não bloqueia em async
+        gravador.parar()                            # flush final
+    """
+
+    def __init__(self):
+        self._fila = None
+        self._thread = None
+        self._pid = None
+        self._parando = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_spill = threading.Lock()
+
+    @property
+    def modo(self):
+        modo = Config.SESSION_WRITE_MODE
+        return modo if modo in MODOS else 'sync'
+
+    def registrar(self, usuario_id, token, ip_address):
+        """
+        Registra a sessão de um login bem-sucedido.
+
+        Returns:
+            bool: Em sync, se o INSERT teve sucesso; em async, se a sessão
+                  foi aceita (fila, gravação direta ou spill)
+        """
+        if self.modo == 'sync':
+            return db.create_session(usuario_id, token, ip_address)
+
+        self._garantir_thread()
+        sessao = (usuario_id, token, ip_address, time.time())
+        try:
+            self._fila.put_nowait(sessao)
+            return True
+        except queue.Full:
+            logger.warning("Fila de sessões cheia (%d)", Config.SESSION_QUEUE_SIZE)
+            if self.modo == 'async_spill':
+                self._spill([sessao])
+                return True
+            # Pressão de volta: grava na requisição em vez de perder a sessão
+            return db.create_session(usuario_id, token, ip_address)
+
+    def iniciar(self):
+        """Inicia a thread (e a regravação do spill) no início do worker."""
+        if self.modo != 'sync':
+            self._garantir_thread()
+
+    def _garantir_thread(self):
+        """Inicia a thread de gravação neste processo (também após fork)."""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # Fila nova só após fork (a do master pertence a ele); se a
+            # thread morreu neste processo, as sessões na fila continuam
+            if self._fila is None or self._pid != os.getpid():
+                self._fila = queue.Queue(maxsize=Config.SESSION_QUEUE_SIZE)
+            self._parando.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._executar, name='gravador-sessoes', daemon=True)
+            self._thread.start()
+            atexit.register(self.parar)
+
+    def _executar(self):
+        """Loop da thread: reaplica o spill pendente e grava lotes da fila."""
+        if self.modo == 'async_spill':
+            self._reaplicar_spill()
+        while not (self._parando.is_set() and self._fila.empty()):
+            lote = self._coletar_lote(Config.SESSION_FLUSH_INTERVAL_MS / 1000)
+            if lote:
+                self._gravar(lote)
+
+    def _coletar_lote(self, intervalo):
+        """Espera a primeira sessão e junta o que chegar até encher o lote."""
+        try:
+            lote = [self._fila.get(timeout=intervalo)]
+        except queue.Empty:
+            return []
+        while len(lote) < Config.SESSION_BATCH_SIZE:
+            try:
+                lote.append(self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _gravar(self, lote, spill=True):
+        """Grava um lote com novas tentativas; esgotadas, faz spill (se `spill`) ou descarta."""
+        for tentativa in range(Config.SESSION_MAX_RETRIES + 1):
+            agora = time.time()
+            if db.create_sessions_batch([(u, t, ip, max(0.0, agora - ts)) for u, t, ip, ts in lote]):
+                return True
+            if self._parando.is_set():
+                break
+            time.sleep(min(0.1 * 2 ** tentativa, 5.0))
+        if not spill:
+            return False
+        if self.modo == 'async_spill':
+            self._spill(lote)
+        else:
+            logger.error("Lote de %d sessões descartado após %d tentativas",
+                         len(lote), Config.SESSION_MAX_RETRIES + 1)
+        return False
+
+    def _spill(self, sessoes, caminho=None):
+        """Anexa sessões ao arquivo de spill (0600, fsync) para regravação futura."""
+        caminho = caminho or Config.SESSION_SPILL_FILE
+        with self._lock_spill:
+            descritor = os.open(caminho, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+            # Arquivo criado antes (por outra versão ou à mão): restringe também
+            os.fchmod(descritor, 0o600)
+            with os.fdopen(descritor, 'a', encoding='utf-8') as f:
+                for usuario_id, token, ip, ts in sessoes:
+                    f.write(json.dumps({'usuario_id': usuario_id, 'token': token, 'ip': ip, 'ts': ts}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+        logger.warning("%d sessão(ões) gravada(s) em %s", len(sessoes), caminho)
+
+    def _reaplicar_spill(self):
+        """
+        Regrava sessões do arquivo de spill de execuções anteriores.
+
+        O arquivo é renomeado antes da leitura para que vários workers não
+        reapliquem o mesmo conteúdo; falhas voltam para um novo spill.
+        """
+        caminho = Config.SESSION_SPILL_FILE
+        em_processo = f'{caminho}.{os.getpid()}'
+        with self._lock_spill:
+            try:
+                os.replace(caminho, em_processo)
+            except FileNotFoundError:
+                return
+        with open(em_processo, 'r', encoding='utf-8') as f:
+            sessoes = [json.loads(linha) for linha in f if linha.strip()]
+        limite = time.time() - VALIDADE_SEGUNDOS
+        validas = [(s['usuario_id'], s['token'], s['ip'], s['ts']) for s in sessoes if s['ts'] > limite]
+        for inicio in range(0, len(validas), Config.SESSION_BATCH_SIZE):
+            lote = validas[inicio:inicio + Config.SESSION_BATCH_SIZE]
+            if not self._gravar(lote, spill=False):
+                self._gravar_individualmente(lote)
+        os.remove(em_processo)
+        logger.warning("%d sessão(ões) do spill processada(s), %d vencida(s) descartada(s)",
+                       len(validas), len(sessoes) - len(validas))
+
+    def _gravar_individualmente(self, lote):
+        """
+        Regrava um lote do spill sessão a sessão.
+
+        Se nenhuma gravou, o banco provavelmente está fora: tudo volta ao
+        spill. Se algumas gravaram, as que falharam têm problema próprio e
+        vão para a quarentena (inspeção manual), sem bloquear as demais.
+        """
+        falhas = []
+        for usuario_id, token, ip, ts in lote:
+            espera = max(0.0, time.time() - ts)
+            if not db.create_sessions_batch([(usuario_id, token, ip, espera)]):
+                falhas.append((usuario_id, token, ip, ts))
+        if not falhas:
+            return
+        if len(falhas) == len(lote):
+            self._spill(falhas)
+        else:
+            logger.error("%d sessão(ões) do spill em quarentena", len(falhas))
+            self._spill(falhas, f'{Config.SESSION_SPILL_FILE}.quarentena')
+
+    def reconfigurar(self):
+        """Redimensiona a fila para SESSION_QUEUE_SIZE sem perder as sessões pendentes."""
+        fila = self._fila
+        if fila is None or self._pid != os.getpid():
+            return
+        with fila.mutex:
+            fila.maxsize = Config.SESSION_QUEUE_SIZE
+            fila.not_full.notify_all()
+
+    def parar(self, timeout=10.0):
+        """Grava o que estiver na fila e encerra a thread (shutdown do worker)."""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._parando.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error("Gravador de sessões não terminou em %.0fs; %d sessão(ões) pendente(s)",
+                         timeout, self._fila.qsize())
+
+    def resumo(self):
+        """Estado para diagnóstico."""
+        return {'modo': self.modo, 'pendentes': self._fila.qsize() if self._fila else 0}
+
+# Instância única por processo
+gravador_sessoes = GravadorSessoes()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+singleflight.py - Coalescência de Chamadas Idênticas Concorrentes
+
+Duplo clique, retentativas do frontend e clientes insistentes mandam o
+mesmo email e senha várias vezes em poucos milissegundos, e cada cópia
+fazia sua própria busca no banco e seu próprio bcrypt.
+
+Com SingleFlight, a primeira chamada de uma chave (líder) executa a
+função; as chamadas idênticas que chegam enquanto ela está em andamento
+esperam e recebem o mesmo resultado (ou a mesma exceção). Nada fica em
+cache: terminada a chamada, a próxima tentativa executa de novo.
+
+Escopo: por worker (threads do mesmo processo). Cada requisição continua
+gerando a própria sessão e o próprio registro de acesso — só a
+verificação de credenciais é compartilhada.
+
+Seguidores não esperam além do prazo da requisição (deadline.py): sem
+orçamento, PrazoEsgotado (503) em vez de ocupar a vaga de admissão e a
+thread até o timeout do single-flight.
+
+A chave de login é um HMAC-SHA256 de email e senha com segredo aleatório
+do processo: a senha não vira chave de dicionário e o digest não serve
+para nada fora do processo.
+
+Uso:
+    logins_em_voo = SingleFlight('login')
+    resultado = logins_em_voo.executar(chave_credenciais(email, senha),
+                                       lambda: verificar(email, senha))
+"""
+
+import os
+import hmac
+import hashlib
+import logging
+import threading
+import deadline
+from deadline import PrazoEsgotado
+
+logger = logging.getLogger('singleflight')
+
+# Segredo do processo para as chaves (não sai da memória)
+_SEGREDO = os.urandom(32)
+
+def chave_credenciais(email, senha):
+    """Digest com chave de (email, senha); nunca a senha em claro."""
+    mensagem = f'{email}\0{senha}'.encode('utf-8')
+    return hmac.new(_SEGREDO, mensagem, hashlib.sha256).digest()
+
+class _Chamada:
+    """Chamada em andamento: evento de conclusão e resultado/exceção."""
+
+    __slots__ = ('evento', 'resultado', 'erro', 'seguidores')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.seguidores = 0
+
+class SingleFlight:
+    """
+    Executa no máximo uma chamada por chave ao mesmo tempo.
+
+    Args:
+        nome (str): Identificação nos logs/diagnóstico
+        timeout (float): Espera máxima de um seguidor; esgotada, ele
+            executa a função por conta própria. Limitada ao prazo da
+            requisição, se houver
+    """
+
+    def __init__(self, nome, timeout=10.0):
+        self.nome = nome
+        self.timeout = timeout
+        self._em_voo = {}
+        self._lock = threading.Lock()
+        self.executadas = 0
+        self.compartilhadas = 0
+
+    def executar(self, chave, funcao):
+        """
+        Executa `funcao()` ou aguarda a execução idêntica em andamento.
+
+        Returns:
+            Resultado de `funcao()`
+
+        Raises:
+            A exceção levantada por `funcao()` (também para os seguidores)
+            PrazoEsgotado: Seguidor cujo prazo da requisição acabou na espera
+        """
+        with self._lock:
+            chamada = self._em_voo.get(chave)
+            lider = chamada is None
+            if lider:
+                chamada = self._em_voo[chave] = _Chamada()
+                self.executadas += 1
+            else:
+                chamada.seguidores += 1
+                self.compartilhadas += 1
+
+        if not lider:
+            restante = deadline.restante_ms()
+            if restante is not None and restante / 1000 <= self.timeout:
+                if not chamada.evento.wait(max(0.0, restante / 1000)):
+                    raise PrazoEsgotado()
+            elif not chamada.evento.wait(self.timeout):
+                logger.warning("Espera single-flight '%s' esgotada após %.1fs", self.nome, self.timeout)
+                return funcao()
+            if chamada.erro is not None:
+                raise chamada.erro
+            return chamada.resultado
+
+        try:
+            chamada.resultado = funcao()
+            return chamada.resultado
+        except BaseException as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                del self._em_voo[chave]
+            chamada.evento.set()
+            if chamada.seguidores:
+                logger.info("Chamada '%s' compartilhada com %d requisição(ões) idêntica(s)",
+                            self.nome, chamada.seguidores)
+
+    def resumo(self):
+        """Contadores para diagnóstico."""
+        return {'nome': self.nome, 'em_voo': len(self._em_voo),
+                'executadas': self.executadas, 'compartilhadas': self.compartilhadas}
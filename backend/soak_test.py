@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+soak_test.py - Teste de Longa Duração (Vazamento de Conexões e Memória)
+
+Sobe um PostgreSQL descartável (pg_local.py), cria usuários de teste,
+inicia o backend com Gunicorn (gunicorn.conf.py) e dispara tráfego misto
+por horas, medindo periodicamente:
+
+- conexões do backend no PostgreSQL (pg_stat_activity)
+- RSS somado dos workers (/proc/<pid>/status)
+- descritores de arquivo abertos dos workers (/proc/<pid>/fd)
+
+Ao final ajusta uma reta (mínimos quadrados) em cada série, descartando
+o aquecimento, e FALHA (código 1) se alguma cresce acima do limite por
+hora — sinal de conexão não devolvida ao pool, cursor não fechado ou
+memória retida. Também falha se as conexões passam do teto esperado
+(workers x DB_POOL_MAX).
+
+Tráfego (MISTURA): login válido, senha errada, email inexistente,
+verificação de token e /health/db.
+
+Requisitos: Linux (/proc) e binários do PostgreSQL (ver pg_local.py).
+
+Uso:
+    python soak_test.py --duracao 2h
+    python soak_test.py --duracao 10m --clientes 16 --workers 4 --csv soak.csv
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import secrets
+import argparse
+import threading
+import subprocess
+import urllib.request
+import urllib.error
+import bcrypt
+from pg_local import ClusterLocal, porta_livre, DIRETORIO_BACKEND
+
+# (cenário, peso)
+MISTURA = (
+    ('login_ok', 60),
+    ('senha_errada', 15),
+    ('email_inexistente', 10),
+    ('verify', 10),
+    ('health_db', 5),
+)
+
+def duracao_em_segundos(texto):
+    """'90', '45s', '10m', '2h' → segundos."""
+    unidades = {'s': 1, 'm': 60, 'h': 3600}
+    if texto[-1] in unidades:
+        return float(texto[:-1]) * unidades[texto[-1]]
+    return float(texto)
+
+def inclinacao(pontos):
+    """Inclinação da reta de mínimos quadrados de [(t, y), ...] (y por segundo)."""
+    n = len(pontos)
+    if n < 2:
+        return 0.0
+    media_t = sum(t for t, _ in pontos) / n
+    media_y = sum(y for _, y in pontos) / n
+    variancia = sum((t - media_t) ** 2 for t, _ in pontos)
+    if variancia == 0:
+        return 0.0
+    return sum((t - media_t) * (y - media_y) for t, y in pontos) / variancia
+
+def criar_usuarios(cluster, quantidade, rounds):
+    """Insere usuários soak-N@teste.local com a mesma senha (bcrypt de custo `rounds`)."""
+    senha = 'soak-' + secrets.token_hex(4)
+    hash_senha = bcrypt.hashpw(senha.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+    conn = cluster.conectar()
+    cur = conn.cursor()
+    cur.executemany("INSERT INTO usuarios (email, senha) VALUES (%s, %s)",
+                    [(f'soak-{i}@teste.local', hash_senha) for i in range(quantidade)])
+    cur.close()
+    conn.close()
+    return [f'soak-{i}@teste.local' for i in range(quantidade)], senha
+
+def pids_workers(pid_master):
+    """PIDs dos filhos diretos do master do Gunicorn."""
+    try:
+        with open(f'/proc/{pid_master}/task/{pid_master}/children') as f:
+            return [int(p) for p in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+def rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for linha in f:
+                if linha.startswith('VmRSS:'):
+                    return int(linha.split()[1])
+    except FileNotFoundError:
+        pass
+    return 0
+
+def total_fds(pid):
+    try:
+        return len(os.listdir(f'/proc/{pid}/fd'))
+    except FileNotFoundError:
+        return 0
+
+class Trafego:
+    """Clientes HTTP em threads executando a MISTURA até `parar` ser sinalizado."""
+
+    def __init__(self, url, emails, senha, clientes):
+        self.url = url
+        self.emails = emails
+        self.senha = senha
+        self.clientes = clientes
+        self.parar = threading.Event()
+        self.contagem = {}
+        self.erros = {}
+        self._lock = threading.Lock()
+        self._cenarios = [nome for nome, peso in MISTURA for _ in range(peso)]
+
+    def _requisicao(self, metodo, caminho, corpo=None, headers=None):
+        dados = json.dumps(corpo).encode('utf-8') if corpo is not None else None
+        req = urllib.request.Request(self.url + caminho, data=dados, method=metodo,
+                                     headers={'Content-Type': 'application/json', **(headers or {})})
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resposta:
+                return resposta.status, json.loads(resposta.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            return e.code, {}
+
+    def _executar(self, cenario):
+        email = random.choice(self.emails)
+        if cenario == 'login_ok':
+            status, _ = self._requisicao('POST', '/api/auth/login', {'email': email, 'senha': self.senha})
+            return status == 200
+        if cenario == 'senha_errada':
+            status, _ = self._requisicao('POST', '/api/auth/login', {'email': email, 'senha': 'errada'})
+            return status == 401
+        if cenario == 'email_inexistente':
+            status, _ = self._requisicao('POST', '/api/auth/login',
+                                         {'email': f'nao-{secrets.token_hex(4)}@teste.local', 'senha': 'x'})
+            return status == 401
+        if cenario == 'verify':
+            status, corpo = self._requisicao('POST', '/api/auth/login', {'email': email, 'senha': self.senha})
+            if status != 200:
+                return False
+            status, _ = self._requisicao('POST', '/api/auth/verify',
+                                         headers={'Authorization': f"Bearer {corpo['token']}"})
+            return status == 200
+        status, _ = self._requisicao('GET', '/health/db')
+        return status == 200
+
+    def _cliente(self):
+        while not self.parar.is_set():
+            cenario = random.choice(self._cenarios)
+            try:
+                ok = self._executar(cenario)
+            except (urllib.error.URLError, OSError, ValueError):
+                ok = False
+            with self._lock:
+                self.contagem[cenario] = self.contagem.get(cenario, 0) + 1
+                if not ok:
+                    self.erros[cenario] = self.erros.get(cenario, 0) + 1
+
+    def iniciar(self):
+        self._threads = [threading.Thread(target=self._cliente, daemon=True) for _ in range(self.clientes)]
+        for t in self._threads:
+            t.start()
+
+    def finalizar(self):
+        self.parar.set()
+        for t in self._threads:
+            t.join(35)
+
+def aguardar_servidor(url, processo, timeout=30):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if processo.poll() is not None:
+            raise RuntimeError('Gunicorn encerrou durante a inicialização')
+        try:
+            with urllib.request.urlopen(url + '/health', timeout=2):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError('Gunicorn não respondeu a /health')
+
+def main():
+    parser = argparse.ArgumentParser(description='Soak test: conexões, RSS e fds ao longo do tempo')
+    parser.add_argument('--duracao', default='1h', help='Ex.: 600, 10m, 2h (padrão: 1h)')
+    parser.add_argument('--intervalo', type=float, default=10.0, help='Segundos entre medições')
+    parser.add_argument('--clientes', type=int, default=8, help='Threads de tráfego')
+    parser.add_argument('--workers', type=int, default=2, help='Workers do Gunicorn')
+    parser.add_argument('--usuarios', type=int, default=200, help='Usuários de teste')
+    parser.add_argument('--bcrypt-rounds', type=int, default=4, help='Custo do bcrypt dos usuários de teste')
+    parser.add_argument('--aquecimento', type=float, default=0.2, help='Fração inicial ignorada no ajuste')
+    parser.add_argument('--max-rss-kb-hora', type=float, default=5120, help='Crescimento máximo de RSS (KB/h)')
+    parser.add_argument('--max-fds-hora', type=float, default=2, help='Crescimento máximo de fds (por hora)')
+    parser.add_argument('--max-conexoes-hora', type=float, default=1, help='Crescimento máximo de conexões (por hora)')
+    parser.add_argument('--csv', help='Grava as medições neste arquivo')
+    args = parser.parse_args()
+    try:
+        return executar(args)
+    except (FileNotFoundError, RuntimeError, subprocess.CalledProcessError) as e:
+        print(f'❌ {e}')
+        return 1
+
+def executar(args):
+    duracao = duracao_em_segundos(args.duracao)
+    with ClusterLocal(max_connections=max(100, args.workers * 20)) as cluster:
+        emails, senha = criar_usuarios(cluster, args.usuarios, args.bcrypt_rounds)
+        porta = porta_livre()
+        env = {**os.environ, **cluster.variaveis(), 'PORT': str(porta), 'WEB_CONCURRENCY': str(args.workers),
+               'JWT_SECRET': secrets.token_hex(32), 'LOG_LEVEL': 'WARNING'}
+        gunicorn = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                                    cwd=DIRETORIO_BACKEND, env=env, stdout=subprocess.DEVNULL)
+        url = f'http://127.0.0.1:{porta}'
+        monitor = cluster.conectar()
+        cur = monitor.cursor()
+        amostras = []
+        trafego = Trafego(url, emails, senha, args.clientes)
+        try:
+            aguardar_servidor(url, gunicorn)
+            print(f'🚀 Soak test por {duracao:.0f}s: {args.clientes} clientes, {args.workers} workers')
+            trafego.iniciar()
+            inicio = time.monotonic()
+            while time.monotonic() - inicio < duracao:
+                time.sleep(args.intervalo)
+                if gunicorn.poll() is not None:
+                    raise RuntimeError('Gunicorn encerrou durante o teste')
+                cur.execute("""
+                    SELECT count(*) FROM pg_stat_activity
+                    WHERE datname = %s AND backend_type = 'client backend' AND pid <> pg_backend_pid()
+                """, (cluster.banco,))
+                conexoes = cur.fetchone()[0]
+                workers = pids_workers(gunicorn.pid)
+                amostra = {'t': round(time.monotonic() - inicio, 1), 'conexoes': conexoes,
+                           'rss_kb': sum(rss_kb(p) for p in workers),
+                           'fds': sum(total_fds(p) for p in workers), 'workers': len(workers),
+                           'requisicoes': sum(trafego.contagem.values())}
+                amostras.append(amostra)
+                print(f"  t={amostra['t']:>7.0f}s conexões={conexoes:<3} rss={amostra['rss_kb'] / 1024:7.1f}MB "
+                      f"fds={amostra['fds']:<4} req={amostra['requisicoes']}")
+        finally:
+            trafego.finalizar()
+            gunicorn.terminate()
+            gunicorn.wait(30)
+            monitor.close()
+
+    if args.csv:
+        with open(args.csv, 'w', encoding='utf-8') as f:
+            f.write('t,conexoes,rss_kb,fds,workers,requisicoes\n')
+            for a in amostras:
+                f.write(f"{a['t']},{a['conexoes']},{a['rss_kb']},{a['fds']},{a['workers']},{a['requisicoes']}\n")
+
+    print(f'\n📊 Requisições por cenário: {trafego.contagem}')
+    print(f'   Falhas por cenário: {trafego.erros}')
+
+    estaveis = amostras[int(len(amostras) * args.aquecimento):]
+    if len(estaveis) < 3:
+        print('❌ Medições insuficientes: aumente --duracao ou reduza --intervalo')
+        return 1
+    limites = {'conexoes': args.max_conexoes_hora, 'rss_kb': args.max_rss_kb_hora, 'fds': args.max_fds_hora}
+    falhou = False
+    for serie, limite in limites.items():
+        por_hora = inclinacao([(a['t'], a[serie]) for a in estaveis]) * 3600
+        ok = por_hora <= limite
+        falhou |= not ok
+        print(f"{'✅' if ok else '❌'} {serie}: {por_hora:+.2f}/h (limite {limite:+.2f}/h)")
+
+    teto = args.workers * int(env.get('DB_POOL_MAX', 5)) + args.workers
+    maximo = max(a['conexoes'] for a in amostras)
+    if maximo > teto:
+        falhou = True
+        print(f'❌ Pico de {maximo} conexões acima do teto esperado ({teto})')
+    if sum(trafego.erros.values()) > 0.01 * max(1, sum(trafego.contagem.values())):
+        falhou = True
+        print('❌ Mais de 1% das requisições falharam')
+
+    print('\n❌ Tendência de vazamento detectada' if falhou else '\n✅ Conexões, memória e fds estáveis')
+    return 1 if falhou else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+startup.py - Medição do Tempo de Inicialização
+
+Registra quanto cada etapa da inicialização levou (imports, criação do
+app, aquecimento), para o relatório emitido quando o app fica pronto e
+quando cada worker do Gunicorn termina de iniciar.
+
+Deve ser o PRIMEIRO import de app.py: o instante do import marca o início.
+
+Uso:
+    import startup
+    with startup.etapa('import_flask'):
+        from flask import Flask
+    ...
+    logger.info('Inicialização concluída', extra=startup.resumo())
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+_INICIO = time.perf_counter()
+_etapas = {}
+
+@contextmanager
+def etapa(nome):
+    """Cronometra um bloco e acumula o tempo em milissegundos sob `nome`."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _etapas[nome] = _etapas.get(nome, 0.0) + (time.perf_counter() - inicio) * 1000
+
+def resumo():
+    """
+    Tempos por etapa e total desde o import deste módulo.
+
+    Returns:
+        dict: {'pid', 'etapas_ms': {...}, 'total_ms'}
+    """
+    return {
+        'pid': os.getpid(),
+        'etapas_ms': {nome: round(ms, 2) for nome, ms in _etapas.items()},
+        'total_ms': round((time.perf_counter() - _INICIO) * 1000, 2),
+    }
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Testes do registro de acessos agregado (access_aggregator.py), com
+db.log_access e db.log_access_batch substituídos por listas.
+
+Uso:
+    python -m pytest test_access_aggregator.py -q
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+import db
+from config import Config
+from access_aggregator import AgregadorAcessos
+
+IP = '203.0.113.7'
+
+@pytest.fixture
+def gravados(monkeypatch):
+    exatos, lotes = [], []
+    monkeypatch.setattr(db, 'log_access', lambda *registro: exatos.append(registro) or True)
+    monkeypatch.setattr(db, 'log_access_batch', lambda lote: lotes.append(lote) or True)
+    monkeypatch.setattr(Config, 'ACCESS_LOG_MODE', 'agregado')
+    monkeypatch.setattr(Config, 'ACCESS_LOG_WINDOW_SECONDS', 60)
+    monkeypatch.setattr(Config, 'ACCESS_LOG_FLUSH_SECONDS', 3600)
+    monkeypatch.setattr(Config, 'ACCESS_LOG_MAX_KEYS', 100)
+    monkeypatch.setattr(Config, 'ACCESS_LOG_SUCCESS_SAMPLE_RATE', 0)
+    agregador = AgregadorAcessos()
+    yield agregador, exatos, lotes
+    agregador.parar()
+
+def test_primeira_ocorrencia_exata_e_repeticoes_em_uma_linha(gravados):
+    agregador, exatos, lotes = gravados
+    for _ in range(5):
+        agregador.registrar(None, 'login', IP, False, 'Usuário não encontrado')
+    agregador.registrar(None, 'login', '198.51.100.1', False, 'Usuário não encontrado')
+
+    assert exatos == [(None, 'login', IP, False, 'Usuário não encontrado'),
+                      (None, 'login', '198.51.100.1', False, 'Usuário não encontrado')]
+    assert lotes == []
+
+    agregador._descarregar(todas=True)
+    assert len(lotes) == 1 and len(lotes[0]) == 1
+    usuario_id, tipo, ip, sucesso, mensagem, contagem, desde_primeiro, desde_ultimo = lotes[0][0]
+    assert (usuario_id, tipo, ip, sucesso, mensagem, contagem) == (None, 'login', IP, False, 'Usuário não encontrado', 4)
+    assert desde_primeiro >= desde_ultimo >= 0
+    assert agregador.resumo()['exatos'] == 2 and agregador.resumo()['agregados'] == 4
+
+def test_janela_vencida_e_gravada_e_a_proxima_ocorrencia_e_exata(gravados, monkeypatch):
+    agregador, exatos, lotes = gravados
+    agregador.registrar(1, 'login', IP, True, 'Login bem-sucedido')
+    agregador.registrar(1, 'login', IP, True, 'Login bem-sucedido')
+
+    monkeypatch.setattr(Config, 'ACCESS_LOG_WINDOW_SECONDS', 0)
+    agregador._descarregar()
+    assert [registro[5] for registro in lotes[0]] == [1]
+
+    agregador.registrar(1, 'login', IP, True, 'Login bem-sucedido')
+    assert len(exatos) == 2
+    assert agregador.resumo()['janelas_abertas'] == 1
+
+def test_lote_com_falha_e_reenviado_com_os_horarios_originais(gravados, monkeypatch):
+    agregador, exatos, lotes = gravados
+    respostas = [False, True]
+    monkeypatch.setattr(db, 'log_access_batch', lambda lote: lotes.append(lote) or respostas.pop(0))
+    for _ in range(3):
+        agregador.registrar(None, 'login', IP, False, 'Senha inválida')
+
+    agregador._descarregar(todas=True)
+    assert agregador.resumo()['repeticoes_pendentes'] == 2
+    assert agregador.perdidos == 0
+
+    time.sleep(0.05)
+    agregador._descarregar()
+    assert len(lotes) == 2
+    assert lotes[1][0][:6] == lotes[0][0][:6]
+    assert lotes[1][0][6] > lotes[0][0][6]        # primeira tentativa continua no passado
+    assert agregador.resumo()['repeticoes_pendentes'] == 0
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Testes do controle de admissão do login (admission.py): ajuste AIMD do
+limite e rejeição com a fila cheia.
+
+Uso:
+    python -m pytest test_admission.py -q
+"""
+
+import sys
+import os
+import time
+import threading
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from config import Config
+from admission import ControleAdmissao, Sobrecarga
+
+@pytest.fixture
+def config(monkeypatch):
+    valores = {'GUNICORN_THREADS': 8, 'ADMISSION_RESERVED_THREADS': 1,
+               'ADMISSION_MIN_CONCURRENCY': 1, 'ADMISSION_MAX_CONCURRENCY': 4,
+               'ADMISSION_TARGET_LATENCY_MS': 1000, 'ADMISSION_DECREASE_FACTOR': 0.5,
+               'ADMISSION_QUEUE_TIMEOUT_MS': 2000, 'ADMISSION_MAX_QUEUE': 8}
+    for nome, valor in valores.items():
+        monkeypatch.setattr(Config, nome, valor)
+    return Config
+
+def esperar_fila(controle, esperando, timeout=2.0):
+    limite = time.monotonic() + timeout
+    while controle.esperando != esperando and time.monotonic() < limite:
+        time.sleep(0.005)
+    return controle.esperando
+
+def test_aimd_aumenta_por_janela_e_reduz_com_latencia_alta(config):
+    controle = ControleAdmissao('teste')
+    controle.limite = 2.0
+
+    # Aumento aditivo: +1 a cada "limite" conclusões rápidas
+    controle.sair(controle.entrar())
+    assert int(controle.limite) == 2
+    controle.sair(controle.entrar())
+    assert int(controle.limite) == 3
+    for _ in range(3):
+        controle.sair(controle.entrar())
+    assert int(controle.limite) == 4
+    for _ in range(4):
+        controle.sair(controle.entrar())
+    assert int(controle.limite) == 4             # teto ADMISSION_MAX_CONCURRENCY
+
+    # Redução multiplicativa, no máximo uma por janela de latência-alvo
+    lento = time.monotonic() - 5
+    controle.entrar()
+    controle.sair(lento)
+    assert int(controle.limite) == 2
+    controle.entrar()
+    controle.sair(lento)
+    assert int(controle.limite) == 2
+    assert controle.em_uso == 0
+
+def test_fila_cheia_e_sem_thread_livre_rejeitam_na_hora(config, monkeypatch):
+    monkeypatch.setattr(Config, 'ADMISSION_MAX_QUEUE', 1)
+    controle = ControleAdmissao('teste')
+    controle.limite = 1.0
+    admitida_em = controle.entrar()
+
+    admitidas = []
+    na_fila = threading.Thread(target=lambda: admitidas.append(controle.entrar()))
+    na_fila.start()
+    assert esperar_fila(controle, 1) == 1
+
+    inicio = time.monotonic()
+    with pytest.raises(Sobrecarga, match='fila cheia'):
+        controle.entrar()
+    assert time.monotonic() - inicio < 0.5       # sem esperar o prazo da fila
+
+    # Fila maior que as threads livres: o limite passa a ser em_uso + esperando
+    monkeypatch.setattr(Config, 'ADMISSION_MAX_QUEUE', 8)
+    monkeypatch.setattr(Config, 'GUNICORN_THREADS', 3)
+    with pytest.raises(Sobrecarga, match='sem thread livre'):
+        controle.entrar()
+    assert controle.rejeitadas == 2
+
+    controle.sair(admitida_em)
+    na_fila.join(2)
+    assert len(admitidas) == 1
+    assert controle.em_uso == 1 and controle.esperando == 0
@@ -9,14 +9,30 @@ import os
 sys.path.insert(0, os.path.dirname(__file__))
 
 from db import get_user_by_email, create_session, log_access, update_last_access, get_connection
+from circuit_breaker import BancoIndisponivel
 import jwt
 from datetime import datetime, timedelta
 from config import Config
 
+def buscar_usuario_teste():
+    """
+    get_user_by_email('teste@email.com') para os testes: banco indisponível
+    (BancoIndisponivel, circuit breaker) é reportado e vira None.
+    """
+    try:
+        return get_user_by_email('teste@email.com')
+    except BancoIndisponivel as e:
+        print(f"❌ Banco indisponível: {e}")
+        return None
+
 def test_db_connection():
     """Testa conexão com banco de dados"""
     print("🔍 Testando conexão com banco de dados...")
-    conn = get_connection()
+    try:
+        conn = get_connection()
+    except BancoIndisponivel as e:
+        print(f"❌ Banco indisponível: {e}")
+        return False
     if conn:
         print("✅ Conexão estabelecida com sucesso!")
         conn.close()
@@ -28,7 +44,7 @@ def test_db_connection():
 def test_get_user_by_email():
     """Testa busca de usuário por email (sem coluna 'nome')"""
     print("\n🔍 Testando busca de usuário...")
-    usuario = get_user_by_email('teste@email.com')
+    usuario = buscar_usuario_teste()
     
     if usuario:
         print(f"✅ Usuário encontrado!")
@@ -59,7 +75,7 @@ def test_log_access():
         return False
     
     # Teste 2: Login bem-sucedido com usuário
-    usuario = get_user_by_email('teste@email.com')
+    usuario = buscar_usuario_teste()
     if usuario:
         resultado2 = log_access(usuario['id'], 'login', '127.0.0.1', True, 'Teste de sucesso')
         if resultado2:
@@ -74,7 +90,7 @@ def test_create_session():
     """Testa criação de sessão"""
     print("\n🔍 Testando criação de sessão...")
     
-    usuario = get_user_by_email('teste@email.com')
+    usuario = buscar_usuario_teste()
     if not usuario:
         print("❌ Usuário não encontrado para teste de sessão!")
         return False
@@ -99,7 +115,7 @@ def test_update_last_access():
     """Testa atualização de último acesso"""
     print("\n🔍 Testando atualização de último acesso...")
     
-    usuario = get_user_by_email('teste@email.com')
+    usuario = buscar_usuario_teste()
     if not usuario:
         print("❌ Usuário não encontrado para teste de último acesso!")
         return False
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Testes do circuit breaker (circuit_breaker.py), sem banco: a sonda é uma
+função que devolve respostas programadas.
+
+Uso:
+    python -m pytest test_circuit_breaker.py -q
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from circuit_breaker import CircuitBreaker, BancoIndisponivel, FECHADO, ABERTO, SEMI_ABERTO
+
+def esperar_estado(circuito, estado, timeout=2.0):
+    limite = time.monotonic() + timeout
+    while circuito.estado != estado and time.monotonic() < limite:
+        time.sleep(0.005)
+    return circuito.estado
+
+def test_ciclo_fechado_aberto_semi_aberto_fechado():
+    """Falhas abrem, a sonda libera uma requisição de teste e o sucesso fecha."""
+    circuito = CircuitBreaker('teste', sonda=lambda: True, limite_falhas=2, intervalo_sonda=0.01)
+
+    circuito.registrar_falha()
+    assert circuito.estado == FECHADO
+    circuito.registrar_falha()
+    assert circuito.estado == ABERTO
+
+    assert esperar_estado(circuito, SEMI_ABERTO) == SEMI_ABERTO
+    circuito.antes_da_chamada()          # requisição de teste liberada
+    with pytest.raises(BancoIndisponivel):
+        circuito.antes_da_chamada()      # só uma por intervalo
+    circuito.registrar_sucesso()
+    assert circuito.estado == FECHADO
+    assert circuito.resumo()['falhas_consecutivas'] == 0
+
+def test_sonda_com_falha_mantem_aberto_e_teste_com_falha_reabre():
+    """Sonda que falha (ou levanta) mantém o circuito aberto; falha no teste reabre."""
+    respostas = [False, RuntimeError('sem rota'), True]
+
+    def sonda():
+        resposta = respostas.pop(0) if respostas else True
+        if isinstance(resposta, Exception):
+            raise resposta
+        return resposta
+
+    circuito = CircuitBreaker('teste', sonda=sonda, limite_falhas=1, intervalo_sonda=0.01)
+    circuito.registrar_falha()
+    with pytest.raises(BancoIndisponivel) as erro:
+        circuito.antes_da_chamada()
+    assert erro.value.retry_after >= 1
+
+    assert esperar_estado(circuito, SEMI_ABERTO) == SEMI_ABERTO
+    assert respostas == []               # duas sondas falharam antes da bem-sucedida
+
+    circuito.antes_da_chamada()
+    circuito.registrar_falha()
+    assert circuito.estado == ABERTO
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Testes do middleware de preflight CORS (cors_preflight.py).
+
+Uso:
+    python -m pytest test_cors_preflight.py -q
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+from cors_preflight import PreflightCors
+
+ORIGEM = 'http://localhost:3000'
+
+def criar_cliente():
+    chamadas = []
+
+    def app(environ, start_response):
+        chamadas.append(environ['PATH_INFO'])
+        return Response('flask', status=200)(environ, start_response)
+    return Client(PreflightCors(app, [ORIGEM], max_age=7200)), chamadas
+
+def preflight(cliente, origem):
+    return cliente.open('/api/auth/login', method='OPTIONS', headers={
+        'Origin': origem, 'Access-Control-Request-Method': 'POST'})
+
+def test_preflight_permitido_responde_204_sem_chamar_o_flask():
+    cliente, chamadas = criar_cliente()
+    resposta = preflight(cliente, ORIGEM)
+    assert resposta.status_code == 204
+    assert resposta.headers['Access-Control-Allow-Origin'] == ORIGEM
+    assert resposta.headers['Access-Control-Max-Age'] == '7200'
+    assert resposta.headers['Access-Control-Allow-Methods'] == 'GET, POST, PUT, DELETE, OPTIONS'
+    assert resposta.headers['Access-Control-Allow-Credentials'] == 'true'
+    assert chamadas == []
+
+    # Os headers pré-calculados não acumulam entre respostas
+    assert preflight(cliente, ORIGEM).headers.getlist('Access-Control-Allow-Origin') == [ORIGEM]
+
+def test_origem_nao_permitida_e_requisicoes_comuns():
+    cliente, chamadas = criar_cliente()
+    resposta = preflight(cliente, 'http://evil.example')
+    assert resposta.status_code == 204
+    assert 'Access-Control-Allow-Origin' not in resposta.headers
+    assert resposta.headers['Vary'] == 'Origin'
+
+    # OPTIONS sem Access-Control-Request-Method e POST seguem para o Flask
+    assert cliente.open('/api/auth/login', method='OPTIONS', headers={'Origin': ORIGEM}).status_code == 200
+    assert cliente.post('/api/auth/login', headers={'Origin': ORIGEM}).status_code == 200
+    assert chamadas == ['/api/auth/login', '/api/auth/login']
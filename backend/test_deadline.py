@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Testes do prazo por requisição (deadline.py) aplicado pelo cursor
+instrumentado (query_stats.py), com um cursor falso que guarda o SQL.
+
+Uso:
+    python -m pytest test_deadline.py -q
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+import psycopg2.errors
+import deadline
+from config import Config
+from deadline import PrazoEsgotado
+from query_stats import CursorInstrumentado
+
+class CursorFalso:
+    connection = None
+
+    def __init__(self, erro=None):
+        self.comandos = []
+        self.erro = erro
+
+    def execute(self, sql, params=None):
+        self.comandos.append((sql, params))
+        if self.erro is not None:
+            raise self.erro
+
+@pytest.fixture(autouse=True)
+def prazo(monkeypatch):
+    monkeypatch.setattr(Config, 'DB_STATEMENT_TIMEOUT_MS', 5000)
+    monkeypatch.setattr(Config, 'DEADLINE_MIN_STATEMENT_MS', 5)
+    yield
+    deadline.limpar()
+
+def test_statement_timeout_vem_do_prazo_restante(monkeypatch):
+    cursor = CursorFalso()
+    deadline.iniciar('api.login', '1000')
+    CursorInstrumentado(cursor).execute('SELECT id FROM usuarios WHERE email = %s', ('a@b.com',))
+
+    comando, params = cursor.comandos[0]
+    prefixo, _, consulta = comando.partition('; ')
+    assert prefixo.startswith('SET LOCAL statement_timeout = ')
+    assert 900 <= int(prefixo.rsplit(' ', 1)[1]) <= 1000
+    assert consulta == 'SELECT id FROM usuarios WHERE email = %s'
+    assert params == ('a@b.com',)
+
+    # Prazo maior que o statement_timeout da conexão: SQL intacto
+    deadline.iniciar('api.login', '60000')
+    monkeypatch.setattr(Config, 'DB_STATEMENT_TIMEOUT_MS', 500)
+    CursorInstrumentado(cursor).execute('SELECT 1')
+    assert cursor.comandos[1] == ('SELECT 1', None)
+
+def test_prazo_esgotado_nao_executa_e_cancelamento_vira_prazo_esgotado():
+    cursor = CursorFalso()
+    deadline.iniciar('api.login', '1')          # abaixo de DEADLINE_MIN_STATEMENT_MS
+    with pytest.raises(PrazoEsgotado):
+        CursorInstrumentado(cursor).execute('SELECT 1')
+    assert cursor.comandos == []
+
+    deadline.iniciar('api.login', '1000')
+    with pytest.raises(PrazoEsgotado):
+        CursorInstrumentado(CursorFalso(psycopg2.errors.QueryCanceled())).execute('SELECT pg_sleep(2)')
+
+    # Sem prazo, o cancelamento é do statement_timeout da conexão e segue como está
+    deadline.limpar()
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        CursorInstrumentado(CursorFalso(psycopg2.errors.QueryCanceled())).execute('SELECT pg_sleep(2)')
+
+@pytest.mark.parametrize('cabecalho', ['0', '-50', '-0.1'])
+def test_cabecalho_zero_ou_negativo_esgota_o_prazo(cabecalho):
+    deadline.iniciar('api.login', cabecalho)
+    assert deadline.restante_ms() <= 0
+    assert deadline.esgotado()
+    with pytest.raises(PrazoEsgotado):
+        CursorInstrumentado(CursorFalso()).execute('SELECT 1')
+
+@pytest.mark.parametrize('cabecalho', ['nan', 'inf', '-inf', 'abc', '99999999'])
+def test_cabecalho_invalido_ou_maior_nao_alonga_o_prazo(cabecalho):
+    deadline.iniciar('api.login', cabecalho)
+    assert 2900 < deadline.restante_ms() <= 3000
+
+def test_cabecalho_define_prazo_em_rota_sem_prazo(monkeypatch):
+    monkeypatch.setattr(Config, 'DEADLINE_DEFAULT_MS', 0)
+    deadline.iniciar('rota.sem.prazo', '500')
+    assert 400 < deadline.restante_ms() <= 500
+    deadline.iniciar('rota.sem.prazo', 'nan')
+    assert deadline.restante_ms() is None
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Testes do executor de migrações (migrate.py), sem banco: a conexão é um
+objeto falso que registra os comandos e simula lock_timeout e a tabela
+schema_migrations.
+
+Uso:
+    python -m pytest test_migrate.py -q
+"""
+
+import sys
+import os
+import types
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+from psycopg2 import errors
+import migrate
+from migrate import Migrador, aplicar, versoes_aplicadas, comando_up
+
+class CursorFalso:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self._linhas = []
+
+    def execute(self, comando, params=None):
+        texto = str(comando)
+        self.conn.comandos.append(texto)
+        if texto.startswith('SET '):
+            return
+        if self.conn.falhas_lock > 0:
+            self.conn.falhas_lock -= 1
+            raise errors.LockNotAvailable()
+        if 'pg_try_advisory_lock' in texto:
+            self._linhas = [(True,)]
+        elif texto.startswith('SELECT versao'):
+            self._linhas = [(v,) + dados for v, dados in self.conn.aplicadas.items()]
+        elif texto.startswith('INSERT INTO schema_migrations'):
+            versao, descricao, duracao_ms = params
+            self.conn.pendentes[versao] = (descricao, None, duracao_ms)
+            if self.conn.autocommit:
+                self.conn.commit()
+        self.rowcount = 1
+
+    def fetchone(self):
+        return self._linhas[0]
+
+    def fetchall(self):
+        return list(self._linhas)
+
+    def close(self):
+        pass
+
+class ConexaoFalsa:
+    """Confirma inserções em schema_migrations só no commit (ou em autocommit)."""
+
+    def __init__(self, aplicadas=None, falhas_lock=0):
+        self.aplicadas = dict(aplicadas or {})
+        self.pendentes = {}
+        self.falhas_lock = falhas_lock
+        self.comandos = []
+        self.autocommit = False
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def commit(self):
+        self.aplicadas.update(self.pendentes)
+        self.pendentes.clear()
+        self.commits += 1
+
+    def rollback(self):
+        self.pendentes.clear()
+        self.rollbacks += 1
+
+def migracao(comando='ALTER TABLE usuarios ADD COLUMN x INT', transacional=True, falha=None):
+    def upgrade(m):
+        m.executar(comando)
+        if falha:
+            raise falha
+    return types.SimpleNamespace(DESCRICAO=f'migração {comando}', TRANSACIONAL=transacional,
+                                 upgrade=upgrade)
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    esperas = []
+    monkeypatch.setattr(migrate.time, 'sleep', esperas.append)
+    monkeypatch.setattr(migrate.Config, 'MIGRATION_DDL_RETRIES', 3)
+    return esperas
+
+def test_lock_timeout_repete_com_backoff_e_aplica(sem_espera):
+    conn = ConexaoFalsa(falhas_lock=2)
+    assert Migrador(conn, transacional=False).executar('ALTER TABLE usuarios ADD COLUMN x INT') == 1
+    assert sem_espera == [0.2, 0.4]
+    assert conn.comandos.count('ALTER TABLE usuarios ADD COLUMN x INT') == 3
+    # Cada tentativa redefine os timeouts na sessão
+    assert conn.comandos[:2] == ['SET SESSION lock_timeout = %s', 'SET SESSION statement_timeout = %s']
+
+def test_lock_timeout_esgota_tentativas_e_propaga(sem_espera):
+    conn = ConexaoFalsa(falhas_lock=5)
+    with pytest.raises(errors.LockNotAvailable):
+        Migrador(conn, transacional=False).executar('ALTER TABLE usuarios ADD COLUMN x INT')
+    assert len(sem_espera) == 2
+    assert conn.falhas_lock == 2
+
+def test_migracao_transacional_nao_repete(sem_espera):
+    conn = ConexaoFalsa(falhas_lock=1)
+    with pytest.raises(errors.LockNotAvailable):
+        Migrador(conn, transacional=True).executar('ALTER TABLE usuarios ADD COLUMN x INT')
+    assert sem_espera == []
+    assert 'SET LOCAL lock_timeout = %s' in conn.comandos
+
+def test_aplicar_registra_versao_na_mesma_transacao():
+    conn = ConexaoFalsa()
+    aplicar(conn, '0001', migracao())
+    assert set(versoes_aplicadas(conn)) == {'0001'}
+    assert conn.aplicadas['0001'][0] == 'migração ALTER TABLE usuarios ADD COLUMN x INT'
+    assert conn.autocommit is False
+
+def test_falha_transacional_desfaz_e_nao_registra():
+    conn = ConexaoFalsa()
+    with pytest.raises(RuntimeError):
+        aplicar(conn, '0001', migracao(falha=RuntimeError('quebrou')))
+    assert conn.rollbacks == 1
+    assert versoes_aplicadas(conn) == {}
+
+def test_lock_em_migracao_nao_transacional_e_registrada_apos_nova_tentativa():
+    conn = ConexaoFalsa(falhas_lock=1)
+    aplicar(conn, '0002', migracao('CREATE INDEX CONCURRENTLY i ON t (c)', transacional=False))
+    assert '0002' in versoes_aplicadas(conn)
+    assert conn.rollbacks == 0
+
+def test_up_aplica_somente_pendentes_ate_a_versao(monkeypatch):
+    monkeypatch.setattr(migrate, 'carregar_migracoes', lambda: [
+        ('0001', migracao('um')), ('0002', migracao('dois')), ('0003', migracao('tres'))])
+    conn = ConexaoFalsa(aplicadas={'0001': ('um', None, 1)})
+
+    assert comando_up(conn, ate='0002') == 0
+    assert conn.comandos[-1] == 'SELECT pg_advisory_unlock(%s)'
+    assert set(versoes_aplicadas(conn)) == {'0001', '0002'}
+    assert 'um' not in conn.comandos
+
+    assert comando_up(conn) == 0
+    assert set(versoes_aplicadas(conn)) == {'0001', '0002', '0003'}
+    assert conn.comandos.count('dois') == 1
+
+def test_up_para_na_primeira_falha(monkeypatch):
+    monkeypatch.setattr(migrate, 'carregar_migracoes', lambda: [
+        ('0001', migracao('um', falha=RuntimeError('quebrou'))), ('0002', migracao('dois'))])
+    conn = ConexaoFalsa()
+    assert comando_up(conn) == 1
+    assert conn.comandos[-1] == 'SELECT pg_advisory_unlock(%s)'
+    assert 'dois' not in conn.comandos
+    assert versoes_aplicadas(conn) == {}
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Testes da coalescência de logins idênticos (singleflight.py): o líder só
+termina depois que os seguidores entraram na espera.
+
+Uso:
+    python -m pytest test_singleflight.py -q
+"""
+
+import sys
+import os
+import time
+import threading
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+import bcrypt
+import deadline
+from deadline import PrazoEsgotado
+from singleflight import SingleFlight, chave_credenciais
+
+SEGUIDORES = 4
+
+def disparar(voo, chave, funcao):
+    """Executa SEGUIDORES + 1 chamadas concorrentes e devolve (resultados, erros)."""
+    resultados, erros = [], []
+
+    def chamar():
+        try:
+            resultados.append(voo.executar(chave, funcao))
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=chamar) for _ in range(SEGUIDORES + 1)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return resultados, erros
+
+def esperar_seguidores(voo, chave, timeout=2.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        chamada = voo._em_voo.get(chave)
+        if chamada is not None and chamada.seguidores == SEGUIDORES:
+            return
+        time.sleep(0.005)
+
+def test_logins_identicos_compartilham_um_bcrypt():
+    voo = SingleFlight('teste')
+    hash_senha = bcrypt.hashpw(b'senha123', bcrypt.gensalt(rounds=4))
+    chave = chave_credenciais('a@b.com', 'senha123')
+    chamadas = []
+
+    def verificar():
+        chamadas.append(1)
+        esperar_seguidores(voo, chave)
+        return bcrypt.checkpw(b'senha123', hash_senha)
+
+    resultados, erros = disparar(voo, chave, verificar)
+    assert erros == []
+    assert resultados == [True] * (SEGUIDORES + 1)
+    assert len(chamadas) == 1
+    assert voo.resumo() == {'nome': 'teste', 'em_voo': 0, 'executadas': 1, 'compartilhadas': SEGUIDORES}
+    assert chave != chave_credenciais('a@b.com', 'outra')
+
+def test_excecao_do_lider_chega_a_todos_e_nao_fica_em_cache():
+    voo = SingleFlight('teste')
+    chave = chave_credenciais('a@b.com', 'senha123')
+    chamadas = []
+
+    def falhar():
+        chamadas.append(1)
+        esperar_seguidores(voo, chave)
+        raise RuntimeError('banco fora')
+
+    resultados, erros = disparar(voo, chave, falhar)
+    assert resultados == []
+    assert len(erros) == SEGUIDORES + 1
+    assert all(str(e) == 'banco fora' for e in erros)
+    assert len(chamadas) == 1
+
+    # Terminada a chamada, a próxima executa de novo
+    assert voo.executar(chave, lambda: 'ok') == 'ok'
+
+def test_seguidor_respeita_o_prazo_da_requisicao():
+    voo = SingleFlight('teste', timeout=10.0)
+    chave = chave_credenciais('a@b.com', 'senha123')
+    liberar = threading.Event()
+    lider = threading.Thread(target=voo.executar, args=(chave, lambda: liberar.wait(5)))
+    lider.start()
+    while chave not in voo._em_voo:
+        time.sleep(0.001)
+
+    deadline.iniciar('api.login', '50')
+    try:
+        inicio = time.monotonic()
+        with pytest.raises(PrazoEsgotado):
+            voo.executar(chave, lambda: 'não deveria executar')
+        assert time.monotonic() - inicio < 1.0
+    finally:
+        deadline.limpar()
+        liberar.set()
+        lider.join(5)
@@ -26,12 +26,18 @@ sys.path.insert(0, '/app/backend')
 try:
     from config import Config
     from db import get_user_by_email
+    from circuit_breaker import BancoIndisponivel
     import bcrypt
     
     print('\n🔍 VERIFICANDO USUÁRIO teste@email.com\n')
     print('=' * 60)
     
-    usuario = get_user_by_email('teste@email.com')
+    try:
+        usuario = get_user_by_email('teste@email.com')
+    except BancoIndisponivel as e:
+        # Sem banco não dá para dizer se o usuário existe
+        print(f'❌ Banco indisponível: {e}\n')
+        sys.exit(1)
     
     if usuario:
         print('✅ Usuário encontrado!\n')
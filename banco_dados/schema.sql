@@ -31,6 +31,10 @@ CREATE TABLE IF NOT EXISTS usuarios (
 CREATE INDEX IF NOT EXISTS idx_usuarios_email ON usuarios(email);
 CREATE INDEX IF NOT EXISTS idx_usuarios_ativo ON usuarios(ativo);
 
+-- Busca case-insensitive do login: WHERE lower(email) = %s
+-- (emails são gravados normalizados; ver backend/normalize_emails.py)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_usuarios_email_lower ON usuarios(lower(email));
+
 -- =====================================================
 -- Tabela de Sessões/Tokens
 -- =====================================================
@@ -86,14 +90,15 @@ INSERT INTO usuarios (email, nome, senha) VALUES
 -- Exemplos de Queries Úteis (PostgreSQL)
 -- =====================================================
 
--- Buscar usuário por email
--- SELECT * FROM usuarios WHERE email = 'teste@email.com' AND ativo = TRUE;
+-- Buscar usuário por email (usa idx_usuarios_email_lower)
+-- SELECT * FROM usuarios WHERE lower(email) = 'teste@email.com' AND ativo = TRUE;
 
 -- Criar sessão após login
 -- INSERT INTO sessoes (usuario_id, token, endereco_ip, expirado_em) 
 -- VALUES (1, 'token_jwt_aqui', '192.168.1.1', NOW() + INTERVAL '24 hours');
 
--- Validar token
+-- Validar token (o filtro em expirado_em limita a busca às partições
+-- não vencidas; sessoes é particionada por hora pela migração 0004)
 -- SELECT u.* FROM usuarios u 
 -- INNER JOIN sessoes s ON u.id = s.usuario_id 
 -- WHERE s.token = 'token_aqui' AND s.expirado_em > NOW();
@@ -105,6 +110,10 @@ INSERT INTO usuarios (email, nome, senha) VALUES
 -- =====================================================
 -- Relatórios (PostgreSQL)
 -- =====================================================
+-- As consultas abaixo varrem registros_acesso inteira. Em produção use os
+-- rollups incrementais (migração 0002 + backend/rollup_acessos.py):
+--   python rollup_acessos.py mais-ativos --dias 30
+--   python rollup_acessos.py falhas --horas 24 --minimo 3
 
 -- Usuários mais ativos
 -- SELECT email, COUNT(*) as acessos 